@@ -33,6 +33,48 @@ class Settings(BaseSettings):
     anthropic_api_key: str = os.getenv("ANTHROPIC_API_KEY", "")
     groq_api_key: str = os.getenv("GROQ_API_KEY", "")
     
+    # LLM concurrency (max in-flight chunk requests per provider)
+    llm_max_concurrency_openai: int = int(os.getenv("LLM_MAX_CONCURRENCY_OPENAI", "8"))
+    llm_max_concurrency_claude: int = int(os.getenv("LLM_MAX_CONCURRENCY_CLAUDE", "4"))
+    llm_max_concurrency_groq: int = int(os.getenv("LLM_MAX_CONCURRENCY_GROQ", "4"))
+    
+    # LLM HTTP connection pools (one pool per provider and API key)
+    llm_http_max_connections: int = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "20"))
+    llm_http_max_keepalive_connections: int = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS", "10"))
+    llm_http_keepalive_expiry: float = float(os.getenv("LLM_HTTP_KEEPALIVE_EXPIRY", "30"))
+    llm_http_timeout: float = float(os.getenv("LLM_HTTP_TIMEOUT", "60"))
+    
+    # LLM rate limits per provider (requests and tokens per minute; 0 disables a limit)
+    llm_rpm_openai: int = int(os.getenv("LLM_RPM_OPENAI", "500"))
+    llm_tpm_openai: int = int(os.getenv("LLM_TPM_OPENAI", "200000"))
+    llm_rpm_claude: int = int(os.getenv("LLM_RPM_CLAUDE", "50"))
+    llm_tpm_claude: int = int(os.getenv("LLM_TPM_CLAUDE", "40000"))
+    llm_rpm_groq: int = int(os.getenv("LLM_RPM_GROQ", "30"))
+    llm_tpm_groq: int = int(os.getenv("LLM_TPM_GROQ", "6000"))
+    llm_max_retries: int = int(os.getenv("LLM_MAX_RETRIES", "5"))
+    
+    # LLM response cache (deterministic calls only)
+    llm_cache_enabled: bool = os.getenv("LLM_CACHE_ENABLED", "true").lower() == "true"
+    llm_cache_dir: str = os.getenv("LLM_CACHE_DIR", ".llm_cache")
+    llm_cache_max_mb: float = float(os.getenv("LLM_CACHE_MAX_MB", "200"))
+    llm_cache_ttl_hours: float = float(os.getenv("LLM_CACHE_TTL_HOURS", "168"))
+    llm_cache_max_temperature: float = float(os.getenv("LLM_CACHE_MAX_TEMPERATURE", "0.1"))
+    
+    # Hedged requests and failover (backup provider/model default to the primary's)
+    llm_hedge_enabled: bool = os.getenv("LLM_HEDGE_ENABLED", "false").lower() == "true"
+    llm_hedge_percentile: float = float(os.getenv("LLM_HEDGE_PERCENTILE", "0.95"))
+    llm_hedge_min_samples: int = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "10"))
+    llm_hedge_min_delay: float = float(os.getenv("LLM_HEDGE_MIN_DELAY", "2"))
+    llm_hedge_backup_provider: str = os.getenv("LLM_HEDGE_BACKUP_PROVIDER", "")
+    llm_hedge_backup_model: str = os.getenv("LLM_HEDGE_BACKUP_MODEL", "")
+    llm_failover_after: int = int(os.getenv("LLM_FAILOVER_AFTER", "3"))
+    llm_failover_cooldown: float = float(os.getenv("LLM_FAILOVER_COOLDOWN", "60"))
+    
+    # Per-chunk checkpoints for resumable annotation runs
+    llm_checkpoint_enabled: bool = os.getenv("LLM_CHECKPOINT_ENABLED", "true").lower() == "true"
+    llm_checkpoint_dir: str = os.getenv("LLM_CHECKPOINT_DIR", ".llm_checkpoints")
+    llm_checkpoint_ttl_hours: float = float(os.getenv("LLM_CHECKPOINT_TTL_HOURS", "168"))
+    
     # CORS
     allowed_origins: List[str] = [
         "http://localhost:3000",
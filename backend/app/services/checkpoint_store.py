@@ -0,0 +1,92 @@
+"""
+Per-chunk checkpoints for annotation runs.
+Each finished chunk's parsed annotations are written to disk (SQLite) as soon as the chunk
+completes, keyed by document, tagset and pipeline parameters, so a job that dies mid-document
+resumes with only the missing chunks.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Dict, Any, List
+
+
+def make_run_key(text: str, tag_definitions: Dict[str, Any], params: Dict[str, Any]) -> str:
+    """
+    Build the checkpoint key for a run from a hash of the document, a hash of the tagset
+    and the pipeline parameters that affect chunking and LLM output.
+    """
+    document_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    tagset_hash = hashlib.sha256(
+        json.dumps(tag_definitions, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+    key_material = json.dumps([document_hash, tagset_hash, params], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(key_material.encode("utf-8")).hexdigest()
+
+
+class ChunkCheckpointStore:
+    """
+    Disk-backed store of completed chunk results.
+
+    Args:
+        checkpoint_dir: Directory holding the SQLite checkpoint file
+        ttl_seconds: Checkpoints older than this are removed when the store is opened
+    """
+
+    def __init__(self, checkpoint_dir: str = ".llm_checkpoints", ttl_seconds: float = 7 * 24 * 3600):
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        self.path = os.path.join(checkpoint_dir, "checkpoints.sqlite3")
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "run_key TEXT NOT NULL, chunk_index INTEGER NOT NULL, entities TEXT NOT NULL, "
+            "created_at REAL NOT NULL, PRIMARY KEY (run_key, chunk_index))"
+        )
+        if self.ttl_seconds:
+            self._conn.execute("DELETE FROM chunks WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        self._conn.commit()
+
+    def load(self, run_key: str) -> Dict[int, List[Dict[str, Any]]]:
+        """Return the saved annotations of a run, keyed by chunk index"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_index, entities FROM chunks WHERE run_key = ?", (run_key,)
+            ).fetchall()
+        return {chunk_index: json.loads(entities) for chunk_index, entities in rows}
+
+    def save(self, run_key: str, chunk_index: int, entities: List[Dict[str, Any]]):
+        """Persist one completed chunk (committed immediately so it survives a crash)"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO chunks (run_key, chunk_index, entities, created_at) VALUES (?, ?, ?, ?)",
+                (run_key, chunk_index, json.dumps(entities), time.time())
+            )
+            self._conn.commit()
+
+    def clear(self, run_key: str):
+        """Remove every checkpoint of a run"""
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE run_key = ?", (run_key,))
+            self._conn.commit()
+
+
+_checkpoint_store: Optional[ChunkCheckpointStore] = None
+
+
+def get_checkpoint_store() -> Optional[ChunkCheckpointStore]:
+    """Get the shared checkpoint store, or None when checkpointing is disabled in settings"""
+    global _checkpoint_store
+    from app.core.config import settings
+
+    if not settings.llm_checkpoint_enabled:
+        return None
+    if _checkpoint_store is None:
+        _checkpoint_store = ChunkCheckpointStore(
+            checkpoint_dir=settings.llm_checkpoint_dir,
+            ttl_seconds=settings.llm_checkpoint_ttl_hours * 3600,
+        )
+    return _checkpoint_store
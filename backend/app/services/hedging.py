@@ -0,0 +1,138 @@
+"""
+Hedged LLM requests and provider failover.
+Latencies are tracked per provider/model. When a call runs past a configured latency
+percentile, a duplicate request is sent (optionally to a backup provider or model)
+and whichever answers first is used; the slower request is cancelled. Repeated
+failures of the primary route calls straight to the backup for a cool-down period;
+without a distinct backup there is nothing to fail over to, and the primary's failures
+are returned as they happen.
+"""
+import asyncio
+import time
+from collections import deque
+from typing import Optional, Dict, Tuple, Callable, Awaitable
+
+from app.core.config import settings
+
+
+class LatencyTracker:
+    """
+    Rolling window of successful call latencies for one provider/model,
+    plus a count of consecutive failed calls.
+    """
+
+    def __init__(self, window: int = 200):
+        self.latencies = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.failover_until = 0.0
+
+    def record(self, seconds: float, success: bool):
+        """Record the outcome of one call"""
+        if success:
+            self.latencies.append(seconds)
+            self.consecutive_failures = 0
+        else:
+            self.consecutive_failures += 1
+
+    def in_failover(self) -> bool:
+        """True while calls are routed to the backup after repeated failures"""
+        return time.monotonic() < self.failover_until
+
+    def enter_failover(self, failover_after: int, cooldown: float) -> bool:
+        """
+        Start a failover cool-down if at least failover_after calls failed in a row.
+        The failure count restarts, so after the cool-down the primary gets a fresh
+        failover_after attempts before failing over again.
+        """
+        if self.consecutive_failures < failover_after:
+            return False
+        self.consecutive_failures = 0
+        self.failover_until = time.monotonic() + cooldown
+        return True
+
+    def percentile(self, pct: float, min_samples: int = 10) -> Optional[float]:
+        """Latency at the given percentile (0-1), or None until min_samples calls were seen"""
+        if len(self.latencies) < min_samples:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(pct * len(ordered)))]
+
+
+_trackers: Dict[Tuple[str, str], LatencyTracker] = {}
+
+
+def get_latency_tracker(provider: str, model: str) -> LatencyTracker:
+    """Get the shared latency tracker for a provider and model"""
+    tracker = _trackers.get((provider, model))
+    if tracker is None:
+        tracker = LatencyTracker()
+        _trackers[(provider, model)] = tracker
+    return tracker
+
+
+def hedge_delay(tracker: LatencyTracker) -> Optional[float]:
+    """Seconds to wait for the primary before hedging, or None if there is no history yet"""
+    threshold = tracker.percentile(settings.llm_hedge_percentile, settings.llm_hedge_min_samples)
+    if threshold is None:
+        return None
+    return max(settings.llm_hedge_min_delay, threshold)
+
+
+async def run_hedged(
+    primary: Callable[[], Awaitable[Optional[str]]],
+    backup: Callable[[], Awaitable[Optional[str]]],
+    tracker: LatencyTracker,
+    can_fail_over: bool = True,
+    hedge: Optional[Callable[[], Awaitable[Optional[str]]]] = None
+) -> Tuple[Optional[str], bool]:
+    """
+    Await primary() and, if it is slower than the configured percentile, backup() as a hedge.
+    can_fail_over says whether backup() reaches a different provider/model; if not, it is
+    only used for hedges and failures are never failed over. hedge, if given, sends the
+    duplicate request instead of backup() and may return None at once to skip hedging.
+    Returns (response, answered_by_primary); response is None if every request failed.
+    """
+    # Fail over while the primary is in its cool-down after repeated failures
+    if can_fail_over and tracker.in_failover():
+        return await backup(), False
+
+    delay = hedge_delay(tracker)
+    if delay is None:
+        response = await primary()
+        if response is not None:
+            return response, True
+        return await _maybe_fail_over(backup, tracker, can_fail_over)
+
+    primary_task = asyncio.ensure_future(primary())
+    done, _ = await asyncio.wait({primary_task}, timeout=delay)
+    if done:
+        response = primary_task.result()
+        if response is not None:
+            return response, True
+        return await _maybe_fail_over(backup, tracker, can_fail_over)
+
+    hedge_task = asyncio.ensure_future((hedge or backup)())
+    pending = {primary_task, hedge_task}
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                response = task.result()
+                if response is not None:
+                    return response, task is primary_task
+        return None, False
+    finally:
+        for task in pending:
+            task.cancel()
+
+
+async def _maybe_fail_over(
+    backup: Callable[[], Awaitable[Optional[str]]],
+    tracker: LatencyTracker,
+    can_fail_over: bool
+) -> Tuple[Optional[str], bool]:
+    """After a failed primary call, switch to the backup once failures repeat"""
+    # Retrying the same route would only reset the failure count and hide the outage
+    if not can_fail_over or not tracker.enter_failover(settings.llm_failover_after, settings.llm_failover_cooldown):
+        return None, True
+    return await backup(), False
@@ -0,0 +1,156 @@
+"""
+Content-addressed cache for LLM responses.
+Responses are stored on disk (SQLite) with size-bounded LRU eviction and a TTL,
+so re-running the same document with the same tagset does not re-bill every chunk.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Dict, Any
+
+
+def make_cache_key(provider: str, model: str, prompt: str, temperature: float, max_tokens: int) -> str:
+    """
+    Build the cache key from provider, model, a hash of the prompt, temperature and max_tokens.
+    """
+    prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    key_material = json.dumps(
+        [provider, model, prompt_hash, round(float(temperature), 4), int(max_tokens)],
+        separators=(",", ":")
+    )
+    return hashlib.sha256(key_material.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    """
+    Disk-backed LRU cache for LLM responses.
+
+    Args:
+        cache_dir (str): Directory holding the SQLite cache file
+        max_size_mb (float): Total size of cached responses before LRU eviction kicks in
+        ttl_seconds (float): Entries older than this are treated as misses and removed
+        max_temperature (float): Only calls at or below this temperature are cached,
+            since higher temperatures are expected to give different answers on rerun
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = ".llm_cache",
+        max_size_mb: float = 200,
+        ttl_seconds: float = 7 * 24 * 3600,
+        max_temperature: float = 0.1
+    ):
+        os.makedirs(cache_dir, exist_ok=True)
+        self.path = os.path.join(cache_dir, "responses.sqlite3")
+        self.max_size_bytes = int(max_size_mb * 1024 * 1024)
+        self.ttl_seconds = ttl_seconds
+        self.max_temperature = max_temperature
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, value TEXT NOT NULL, size INTEGER NOT NULL, "
+            "created_at REAL NOT NULL, last_access REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_responses_last_access ON responses(last_access)")
+        self._conn.commit()
+
+    def is_cacheable(self, temperature: Optional[float]) -> bool:
+        """Only (near-)deterministic calls are cached."""
+        return temperature is not None and temperature <= self.max_temperature
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response for key, or None on a miss."""
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            value, created_at = row
+            if self.ttl_seconds and now - created_at > self.ttl_seconds:
+                self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+                self._conn.commit()
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_access = ? WHERE key = ?", (now, key))
+            self._conn.commit()
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Optional[str]) -> None:
+        """Store a response and evict least recently used entries if over the size limit."""
+        if value is None:
+            return
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        if size > self.max_size_bytes:
+            return
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, value, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, value, size, now, now)
+            )
+            self._evict_if_needed()
+            self._conn.commit()
+
+    def _evict_if_needed(self) -> None:
+        """Drop least recently used entries until the total size fits (caller holds the lock)."""
+        total_size = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+        if total_size <= self.max_size_bytes:
+            return
+        rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_access ASC").fetchall()
+        for key, size in rows:
+            if total_size <= self.max_size_bytes:
+                break
+            self._conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            total_size -= size
+            self.evictions += 1
+
+    def clear(self) -> None:
+        """Remove all cached responses."""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters plus current entry count and size."""
+        with self._lock:
+            entries, total_size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': self.hits / lookups if lookups else 0.0,
+            'evictions': self.evictions,
+            'entries': entries,
+            'size_bytes': total_size,
+        }
+
+
+_response_cache: Optional[LLMResponseCache] = None
+
+
+def get_response_cache() -> Optional[LLMResponseCache]:
+    """Get the shared response cache, or None when caching is disabled in settings"""
+    global _response_cache
+    from app.core.config import settings
+    
+    if not settings.llm_cache_enabled:
+        return None
+    if _response_cache is None:
+        _response_cache = LLMResponseCache(
+            cache_dir=settings.llm_cache_dir,
+            max_size_mb=settings.llm_cache_max_mb,
+            ttl_seconds=settings.llm_cache_ttl_hours * 3600,
+            max_temperature=settings.llm_cache_max_temperature,
+        )
+    return _response_cache
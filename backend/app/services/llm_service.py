@@ -1,27 +1,134 @@
 import asyncio
+import hashlib
 import json
 import logging
-from typing import Optional, List, Dict, Any
+import time
+from typing import Optional, List, Dict, Any, Tuple, Callable
 import openai
-from anthropic import Anthropic
+import anthropic
+from anthropic import AsyncAnthropic
 import httpx
 from app.core.config import settings
+from app.services.llm_cache import get_response_cache, make_cache_key
+from app.services.rate_limiter import get_governor, call_with_rate_limit
+from app.services.checkpoint_store import get_checkpoint_store, make_run_key
+from app.services.hedging import get_latency_tracker, run_hedged
 
 logger = logging.getLogger(__name__)
 
+GROQ_BASE_URL = "https://api.groq.com/openai/v1"
+
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504, 529}
+
+class LLMClientRegistry:
+    """
+    Long-lived, pooled provider clients shared by every LLMClient.
+    One client (and one keep-alive connection pool) is kept per provider and API key.
+    Opened at app startup and closed on shutdown.
+    """
+    
+    def __init__(self):
+        self._clients: Dict[Tuple[str, str], Any] = {}
+        self._http_clients: Dict[Tuple[str, str], httpx.AsyncClient] = {}
+    
+    @staticmethod
+    def _key(provider: str, api_key: str) -> Tuple[str, str]:
+        """Registry key; the API key is hashed so it is never kept as a dict key"""
+        return provider, hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+    
+    def _new_http_client(self, **kwargs) -> httpx.AsyncClient:
+        """Create a pooled async HTTP client using the configured limits"""
+        limits = httpx.Limits(
+            max_connections=settings.llm_http_max_connections,
+            max_keepalive_connections=settings.llm_http_max_keepalive_connections,
+            keepalive_expiry=settings.llm_http_keepalive_expiry,
+        )
+        return httpx.AsyncClient(limits=limits, timeout=settings.llm_http_timeout, **kwargs)
+    
+    def get_client(self, provider: str, api_key: str) -> Any:
+        """Get (or lazily create) the pooled client for a provider and API key"""
+        key = self._key(provider, api_key)
+        client = self._clients.get(key)
+        if client is not None:
+            return client
+        
+        if provider == "OpenAI":
+            http_client = self._new_http_client()
+            # Retries are handled by the rate-limit governor, not the SDK
+            client = openai.AsyncOpenAI(api_key=api_key, http_client=http_client, max_retries=0)
+        elif provider == "Claude":
+            http_client = self._new_http_client()
+            client = AsyncAnthropic(api_key=api_key, http_client=http_client, max_retries=0)
+        elif provider == "Groq":
+            http_client = self._new_http_client(
+                base_url=GROQ_BASE_URL,
+                headers={
+                    "Authorization": f"Bearer {api_key}",
+                    "Content-Type": "application/json"
+                },
+            )
+            client = http_client
+        else:
+            raise ValueError(f"Unsupported provider: {provider}")
+        
+        self._http_clients[key] = http_client
+        self._clients[key] = client
+        return client
+    
+    async def startup(self):
+        """Pre-create clients for the API keys configured in settings"""
+        default_keys = {
+            "OpenAI": settings.openai_api_key,
+            "Claude": settings.anthropic_api_key,
+            "Groq": settings.groq_api_key,
+        }
+        for provider, api_key in default_keys.items():
+            if api_key:
+                self.get_client(provider, api_key)
+        logger.info(f"LLM client registry started with {len(self._clients)} pooled clients")
+    
+    async def shutdown(self):
+        """Close every pooled connection"""
+        for key, http_client in list(self._http_clients.items()):
+            try:
+                await http_client.aclose()
+            except Exception as e:
+                logger.error(f"Error closing {key[0]} HTTP client: {e}")
+        self._http_clients.clear()
+        self._clients.clear()
+
+# Shared registry instance
+llm_client_registry = LLMClientRegistry()
+
 class LLMClient:
     """
     Async LLM client supporting multiple providers (OpenAI, Claude, Groq)
     Migrated and enhanced from the original Streamlit app
     """
     
-    def __init__(self, provider: str, model: str, api_key: Optional[str] = None):
+    def __init__(
+        self,
+        provider: str,
+        model: str,
+        api_key: Optional[str] = None,
+        hedge_permits: Optional[Callable[[str], asyncio.Semaphore]] = None
+    ):
+        """
+        hedge_permits maps a provider to the semaphore bounding its in-flight requests;
+        hedged duplicates then need a free permit of the provider they are sent to.
+        """
         self.provider = provider
         self.model = model
         self.api_key = api_key or self._get_default_api_key(provider)
         
         if not self.api_key:
             raise ValueError(f"No API key provided for {provider}")
+        
+        self.governor = get_governor(provider, model, self.api_key)
+        self.max_retries = settings.llm_max_retries
+        self.latency_tracker = get_latency_tracker(provider, model)
+        self._backup_client: Optional["LLMClient"] = None
+        self.hedge_permits = hedge_permits
     
     def _get_default_api_key(self, provider: str) -> str:
         """Get default API key from settings"""
@@ -32,40 +139,130 @@ class LLMClient:
         }
         return key_map.get(provider, "")
     
+    def _estimate_request_tokens(self, prompt: str, max_tokens: int) -> int:
+        """Rough token cost of a call (prompt plus completion budget) for the tokens-per-minute bucket"""
+        return len(prompt) // 4 + max_tokens
+    
     async def generate(self, prompt: str, temperature: float = 0.1, max_tokens: int = 1000) -> Optional[str]:
         """
-        Enhanced async generate method with better error handling
+        Enhanced async generate method with better error handling.
+        Deterministic calls are served from the response cache when enabled.
         """
         try:
             if not prompt or prompt.strip() == "":
                 raise ValueError("Empty prompt provided")
             
-            if self.provider == "OpenAI":
-                return await self._call_openai(prompt, temperature, max_tokens)
-            elif self.provider == "Claude":
-                return await self._call_claude(prompt, temperature, max_tokens)
-            elif self.provider == "Groq":
-                return await self._call_groq(prompt, temperature, max_tokens)
+            cache = get_response_cache()
+            cache_key = None
+            if cache is not None and cache.is_cacheable(temperature):
+                cache_key = make_cache_key(self.provider, self.model, prompt, temperature, max_tokens)
+                # The cache is SQLite-backed; keep its I/O off the event loop
+                cached = await asyncio.to_thread(cache.get, cache_key)
+                if cached is not None:
+                    return cached
+            
+            if settings.llm_hedge_enabled:
+                response, answered_by_primary = await self._generate_hedged(prompt, temperature, max_tokens)
             else:
-                raise ValueError(f"Unsupported provider: {self.provider}")
+                response, answered_by_primary = await self._dispatch(prompt, temperature, max_tokens), True
+            
+            # A backup model's answer is cached under the backup's own key, not ours
+            if cache_key is not None and response is not None and answered_by_primary:
+                await asyncio.to_thread(cache.set, cache_key, response)
+            return response
         
         except Exception as e:
             logger.error(f"LLM API call failed: {e}")
             return None
     
+    async def _dispatch(self, prompt: str, temperature: float, max_tokens: int) -> Optional[str]:
+        """Call the configured provider and record the call's latency for hedging"""
+        start = time.monotonic()
+        if self.provider == "OpenAI":
+            response = await self._call_openai(prompt, temperature, max_tokens)
+        elif self.provider == "Claude":
+            response = await self._call_claude(prompt, temperature, max_tokens)
+        elif self.provider == "Groq":
+            response = await self._call_groq(prompt, temperature, max_tokens)
+        else:
+            raise ValueError(f"Unsupported provider: {self.provider}")
+        self.latency_tracker.record(time.monotonic() - start, response is not None)
+        return response
+    
+    def _get_backup_client(self) -> Optional["LLMClient"]:
+        """Backup client from settings, or None to hedge against this provider/model again"""
+        backup_provider = settings.llm_hedge_backup_provider or self.provider
+        backup_model = settings.llm_hedge_backup_model or self.model
+        if (backup_provider, backup_model) == (self.provider, self.model):
+            return None
+        if self._backup_client is None:
+            try:
+                self._backup_client = LLMClient(backup_provider, backup_model)
+            except ValueError as e:
+                logger.warning(f"Hedging backup unavailable, hedging against {self.provider} instead: {e}")
+                return None
+        return self._backup_client
+    
+    async def _generate_hedged(self, prompt: str, temperature: float, max_tokens: int) -> Tuple[Optional[str], bool]:
+        """
+        Run the call under the hedging policy: a slow call is duplicated to the backup
+        client (or to this client again) and the first answer wins.
+        
+        The duplicate is an extra in-flight request, so it only goes out if a permit of
+        its provider is free right now; a saturated provider is not hedged. A failover
+        replaces the primary call, whose permit the caller still holds, so it needs none.
+        """
+        backup_client = self._get_backup_client()
+        backup_provider = self.provider if backup_client is None else backup_client.provider
+        
+        async def backup() -> Optional[str]:
+            if backup_client is None:
+                return await self._dispatch(prompt, temperature, max_tokens)
+            return await backup_client._dispatch(prompt, temperature, max_tokens)
+        
+        async def hedge() -> Optional[str]:
+            if self.hedge_permits is None:
+                return await backup()
+            semaphore = self.hedge_permits(backup_provider)
+            # No await between the check and acquire(), so acquiring cannot block
+            if semaphore.locked():
+                logger.debug(f"Not hedging: no free {backup_provider} request slot")
+                return None
+            await semaphore.acquire()
+            try:
+                return await backup()
+            finally:
+                semaphore.release()
+        
+        response, answered_by_primary = await run_hedged(
+            lambda: self._dispatch(prompt, temperature, max_tokens),
+            backup,
+            self.latency_tracker,
+            can_fail_over=backup_client is not None,
+            hedge=hedge
+        )
+        return response, answered_by_primary or backup_client is None
+    
     async def _call_openai(self, prompt: str, temperature: float, max_tokens: int) -> Optional[str]:
         """Call OpenAI API asynchronously"""
         try:
-            client = openai.AsyncOpenAI(api_key=self.api_key)
+            client = llm_client_registry.get_client("OpenAI", self.api_key)
             
-            response = await client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "You are a scientific text annotation expert. Always respond with valid JSON array format."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=temperature,
-                max_tokens=max_tokens,
+            response = await call_with_rate_limit(
+                self.governor,
+                lambda: client.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": "You are a scientific text annotation expert. Always respond with valid JSON array format."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                ),
+                self._estimate_request_tokens(prompt, max_tokens),
+                lambda e: isinstance(e, (openai.RateLimitError, openai.APITimeoutError,
+                                         openai.APIConnectionError, openai.InternalServerError)),
+                self.max_retries
             )
             
             return response.choices[0].message.content
@@ -74,7 +271,7 @@ class LLMClient:
             logger.error("OpenAI authentication failed - check API key")
             return None
         except openai.RateLimitError:
-            logger.error("OpenAI rate limit exceeded")
+            logger.error(f"OpenAI rate limit exceeded after {self.max_retries} retries")
             return None
         except Exception as e:
             logger.error(f"OpenAI API error: {e}")
@@ -83,12 +280,10 @@ class LLMClient:
     async def _call_claude(self, prompt: str, temperature: float, max_tokens: int) -> Optional[str]:
         """Call Claude API asynchronously"""
         try:
-            client = Anthropic(api_key=self.api_key)
+            client = llm_client_registry.get_client("Claude", self.api_key)
             
-            # Note: Anthropic client doesn't have async support yet, so we run in executor
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
+            response = await call_with_rate_limit(
+                self.governor,
                 lambda: client.messages.create(
                     model=self.model,
                     max_tokens=max_tokens,
@@ -99,11 +294,18 @@ class LLMClient:
                             "content": f"You are a scientific text annotation expert. Always respond with valid JSON array format.\n\n{prompt}"
                         }
                     ]
-                )
+                ),
+                self._estimate_request_tokens(prompt, max_tokens),
+                lambda e: isinstance(e, (anthropic.RateLimitError, anthropic.APITimeoutError,
+                                         anthropic.APIConnectionError, anthropic.InternalServerError)),
+                self.max_retries
             )
             
             return response.content[0].text
             
+        except anthropic.RateLimitError:
+            logger.error(f"Claude rate limit exceeded after {self.max_retries} retries")
+            return None
         except Exception as e:
             logger.error(f"Claude API error: {e}")
             return None
@@ -111,11 +313,7 @@ class LLMClient:
     async def _call_groq(self, prompt: str, temperature: float, max_tokens: int) -> Optional[str]:
         """Call Groq API asynchronously"""
         try:
-            url = "https://api.groq.com/openai/v1/chat/completions"
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
+            client = llm_client_registry.get_client("Groq", self.api_key)
             
             data = {
                 "model": self.model,
@@ -127,12 +325,23 @@ class LLMClient:
                 "max_tokens": max_tokens,
             }
             
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, headers=headers, json=data, timeout=30.0)
+            async def send():
+                response = await client.post("/chat/completions", json=data, timeout=30.0)
                 response.raise_for_status()
-                
-                result = response.json()
-                return result["choices"][0]["message"]["content"]
+                return response
+            
+            response = await call_with_rate_limit(
+                self.governor,
+                send,
+                self._estimate_request_tokens(prompt, max_tokens),
+                lambda e: isinstance(e, httpx.TransportError) or (
+                    isinstance(e, httpx.HTTPStatusError) and e.response.status_code in RETRYABLE_STATUS_CODES
+                ),
+                self.max_retries
+            )
+            
+            result = response.json()
+            return result["choices"][0]["message"]["content"]
                 
         except Exception as e:
             logger.error(f"Groq API error: {e}")
@@ -146,6 +355,18 @@ class AnnotationService:
     
     def __init__(self):
         self.client = None
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+    
+    def _get_provider_semaphore(self, provider: str) -> asyncio.Semaphore:
+        """Get the shared semaphore limiting in-flight requests for a provider"""
+        if provider not in self._semaphores:
+            limit_map = {
+                "OpenAI": settings.llm_max_concurrency_openai,
+                "Claude": settings.llm_max_concurrency_claude,
+                "Groq": settings.llm_max_concurrency_groq,
+            }
+            self._semaphores[provider] = asyncio.Semaphore(max(1, limit_map.get(provider, 1)))
+        return self._semaphores[provider]
     
     async def process_document_annotations(
         self,
@@ -158,28 +379,78 @@ class AnnotationService:
         chunk_size: int = 1000
     ) -> List[Dict[str, Any]]:
         """
-        Process document with LLM to generate annotations
+        Process document with LLM to generate annotations.
+        
+        Chunks are dispatched concurrently; the number of in-flight requests is
+        bounded per provider across all jobs, and results are merged in chunk order.
         """
         try:
-            self.client = LLMClient(provider, model)
+            client = LLMClient(provider, model, hedge_permits=self._get_provider_semaphore)
+            self.client = client
+            semaphore = self._get_provider_semaphore(provider)
             
             # Split text into chunks if needed
             chunks = self._split_text_into_chunks(text, chunk_size)
-            all_annotations = []
             
-            for i, chunk in enumerate(chunks):
-                logger.info(f"Processing chunk {i+1}/{len(chunks)}")
+            # Resume from chunks finished by an earlier, interrupted run
+            checkpoint_store = get_checkpoint_store()
+            run_key = None
+            saved_chunks: Dict[int, List[Dict[str, Any]]] = {}
+            if checkpoint_store is not None:
+                run_key = make_run_key(text, tag_definitions, {
+                    "provider": provider,
+                    "model": model,
+                    "temperature": temperature,
+                    "max_tokens": max_tokens,
+                    "chunk_size": chunk_size,
+                })
+                # SQLite I/O runs in a thread so concurrent chunk tasks are not held up by disk writes
+                saved_chunks = await asyncio.to_thread(checkpoint_store.load, run_key)
+                if saved_chunks:
+                    logger.info(f"Resuming run: {len(saved_chunks)}/{len(chunks)} chunks restored from checkpoint")
+            failed_chunks = 0
+            
+            async def annotate_chunk(i: int, chunk: str) -> List[Dict[str, Any]]:
+                nonlocal failed_chunks
+                if i in saved_chunks:
+                    return saved_chunks[i]
                 
                 # Build prompt for this chunk
                 prompt = self._build_annotation_prompt(chunk, tag_definitions)
                 
                 # Get LLM response
-                response = await self.client.generate(prompt, temperature, max_tokens)
+                async with semaphore:
+                    logger.info(f"Processing chunk {i+1}/{len(chunks)}")
+                    response = await client.generate(prompt, temperature, max_tokens)
+                
+                if not response:
+                    # Not checkpointed, so the next run retries this chunk
+                    failed_chunks += 1
+                    return []
                 
-                if response:
-                    # Parse and validate annotations
-                    chunk_annotations = self._parse_llm_response(response, chunk, i * chunk_size)
-                    all_annotations.extend(chunk_annotations)
+                # Parse and validate annotations
+                annotations = self._parse_llm_response(response, chunk, i * chunk_size)
+                if run_key is not None:
+                    await asyncio.to_thread(checkpoint_store.save, run_key, i, annotations)
+                return annotations
+            
+            # gather preserves input order, so the merge is deterministic
+            chunk_results = await asyncio.gather(
+                *(annotate_chunk(i, chunk) for i, chunk in enumerate(chunks)),
+                return_exceptions=True
+            )
+            
+            all_annotations = []
+            for i, result in enumerate(chunk_results):
+                if isinstance(result, Exception):
+                    logger.error(f"Chunk {i+1}/{len(chunks)} failed: {result}")
+                    failed_chunks += 1
+                    continue
+                all_annotations.extend(result)
+            
+            # A fully successful run no longer needs its checkpoints
+            if run_key is not None and failed_chunks == 0:
+                await asyncio.to_thread(checkpoint_store.clear, run_key)
             
             # Post-process annotations (deduplicate, validate positions, etc.)
             return self._post_process_annotations(all_annotations, text)
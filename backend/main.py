@@ -48,6 +48,7 @@ from app.core.config import settings
 from app.core.database_supabase import get_db_service, DatabaseService
 from app.core.security import verify_token
 from app.dependencies_supabase import get_current_user, get_admin_user
+from app.services.llm_service import llm_client_registry
 # Remove SQLAlchemy imports - we're using Supabase only
 from app.api.auth_supabase import router as auth_router
 # We'll update these other routers to use Supabase too
@@ -75,6 +76,16 @@ app.add_middleware(
 
 # Security is now imported from dependencies_supabase
 
+@app.on_event("startup")
+async def startup_llm_clients():
+    """Open pooled LLM provider clients once for the app lifetime"""
+    await llm_client_registry.startup()
+
+@app.on_event("shutdown")
+async def shutdown_llm_clients():
+    """Close pooled LLM provider connections"""
+    await llm_client_registry.shutdown()
+
 # Include routers
 app.include_router(auth_router, prefix="/api/auth", tags=["authentication"])
 
@@ -0,0 +1,67 @@
+# aho_corasick.py
+"""
+Aho–Corasick automaton for finding many literal patterns in one pass over a text.
+Used to locate every entity string in the document at once instead of one regex scan per entity.
+"""
+from collections import deque
+
+
+class AhoCorasickAutomaton:
+    """
+    Trie of patterns with failure links.
+
+    Args:
+        patterns (list): Literal strings to search for (matched exactly; lowercase both
+            patterns and text beforehand for case-insensitive search)
+    """
+
+    def __init__(self, patterns):
+        self.patterns = list(patterns)
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+
+        for index, pattern in enumerate(self.patterns):
+            node = 0
+            for ch in pattern:
+                next_node = self.goto[node].get(ch)
+                if next_node is None:
+                    next_node = len(self.goto)
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.output.append([])
+                    self.goto[node][ch] = next_node
+                node = next_node
+            if pattern:
+                self.output[node].append(index)
+
+        # Breadth-first pass to set failure links; each node also inherits the
+        # outputs of its failure node so every match ending here is reported
+        queue = deque(self.goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self.goto[node].items():
+                queue.append(child)
+                fallback = self.fail[node]
+                while fallback and ch not in self.goto[fallback]:
+                    fallback = self.fail[fallback]
+                target = self.goto[fallback].get(ch, 0)
+                self.fail[child] = target if target != child else 0
+                self.output[child] = self.output[child] + self.output[self.fail[child]]
+
+    def iter_matches(self, text):
+        """
+        Yield (start, end, pattern_index) for every occurrence of every pattern,
+        including overlapping ones, in order of end position.
+        """
+        goto = self.goto
+        fail = self.fail
+        output = self.output
+        lengths = [len(pattern) for pattern in self.patterns]
+        node = 0
+        for i, ch in enumerate(text):
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for index in output[node]:
+                yield i + 1 - lengths[index], i + 1, index
@@ -1,6 +1,8 @@
 import streamlit as st
 import pandas as pd
 import json
+import os
+import tempfile
 import traceback
 import streamlit as st
 import pandas as pd
@@ -8,10 +10,12 @@ from helper import (
     display_processing_summary,  # Function to show processing summary
     generate_label_colors,  # Function to generate colors for labels
     get_token_recommendations,  # Function to get token recommendations based on chunk size
+    MODEL_CONTEXT_WINDOWS,  # Context window sizes for token-budget chunking
     validate_annotations_streamlit,  # Function to validate annotations
     correct_annotation_positions,  # Enhanced function to correct annotation positions
     debug_annotation_positions,  # Debug function for position analysis
     run_annotation_pipeline,  # Function to run the annotation pipeline
+    get_checkpoint_store,  # Shared per-chunk checkpoint store for resumable runs
     clear_all_previous_data,  # Function to clear all previous data
     evaluate_annotations_with_llm,  # Function to evaluate annotations with LLM
     apply_evaluation_recommendations, # Function to apply evaluation recommendations
@@ -22,7 +26,11 @@ from helper import (
     identify_duplicate_llm_annotations,  # Function to identify which LLM annotations to delete
 )
 from enhanced_validation import validate_annotations_enhanced, auto_fix_annotations  # Enhanced validation with phantom detection
-from llm_clients import LLMClient
+from llm_clients import LLMClient, get_response_cache
+from rate_limiter import DEFAULT_RATE_LIMITS
+from hedging import HedgingPolicy
+from entity_index import EntityKeyIndex
+from corpus_export import EXPORT_EXTENSIONS, EXPORT_FORMATS, export_corpus, iter_uploaded_annotations, json_download
 
 
 # ----- Page Setup -----
@@ -107,6 +115,50 @@ temperature = st.sidebar.slider("Temperature", 0.0, 1.0, 0.1, step=0.05,
 chunk_size = st.sidebar.slider("Chunk size (characters)", 200, 4000, 1000, step=100,
                               help="Size of text chunks to process separately")
 
+max_workers = st.sidebar.slider("Parallel requests", 1, 8, 4,
+                                help="Number of chunks sent to the LLM at the same time. Lower this if you hit provider rate limits.")
+
+use_checkpoints = st.sidebar.checkbox("Resume interrupted runs", value=True,
+                                      help="Save each finished chunk so rerunning the same document, tagset and settings only processes the missing chunks.")
+
+stream_responses = st.sidebar.checkbox("Stream responses", value=False, disabled=max_workers > 1,
+                                       help="Show entities as the model generates them. Only available when 'Parallel requests' is 1.")
+if max_workers > 1:
+    # A disabled checkbox keeps its last value, so streaming is switched off explicitly
+    stream_responses = False
+    st.sidebar.caption("ℹ️ Streaming is off while 'Parallel requests' is above 1; set it to 1 to stream responses.")
+
+default_rpm, default_tpm = DEFAULT_RATE_LIMITS.get(model_provider, (500, 200000))
+with st.sidebar.expander("⏱️ Rate limits", expanded=False):
+    requests_per_minute = st.number_input(
+        "Requests per minute", min_value=1, value=default_rpm, step=10,
+        help="Your provider quota for this model. Calls are queued to stay under it."
+    )
+    tokens_per_minute = st.number_input(
+        "Tokens per minute", min_value=1000, value=default_tpm, step=1000,
+        help="Prompt + response tokens allowed per minute. Rate-limited calls are retried with backoff instead of being dropped."
+    )
+
+with st.sidebar.expander("🛡️ Hedging & failover", expanded=False):
+    use_hedging = st.checkbox(
+        "Hedge slow requests", value=False,
+        help="If a call runs longer than usual, send a duplicate request and use whichever answers first."
+    )
+    hedge_percentile = st.slider(
+        "Hedge after latency percentile", 0.50, 0.99, 0.95, step=0.01,
+        help="A duplicate is sent once a call is slower than this share of recent calls to the same model."
+    )
+    backup_provider = st.selectbox("Backup provider", ["Same model", "OpenAI", "Claude"],
+                                   help="Where hedges go, and where calls fail over after repeated timeouts.")
+    backup_model = None
+    backup_api_key = api_key
+    if backup_provider == "OpenAI":
+        backup_model = st.selectbox("Backup OpenAI model", ["gpt-4o-mini", "gpt-4o", "gpt-4", "gpt-3.5-turbo"])
+    elif backup_provider == "Claude":
+        backup_model = st.selectbox("Backup Claude model", ["claude-3-7-sonnet-20250219", "claude-3-5-haiku-20241022"])
+    if backup_provider not in ("Same model", model_provider):
+        backup_api_key = st.text_input("Backup provider API key", type="password")
+
 
 min_tokens, max_tokens_limit, default_tokens = get_token_recommendations(chunk_size)
 
@@ -133,6 +185,49 @@ if max_tokens > chunk_size // 2:
 elif max_tokens < chunk_size // 20:
     st.sidebar.warning("⚠️ Max tokens might be too low - responses may get cut off")
 
+chunking_mode = st.sidebar.radio(
+    "Chunking mode",
+    ["Characters", "Token budget"],
+    help="Characters: split on the chunk size above. Token budget: pack each request (prompt + chunk + response) up to a token budget for the selected model, giving fewer, fuller chunks"
+)
+
+token_budget = None
+if chunking_mode == "Token budget":
+    context_window = MODEL_CONTEXT_WINDOWS.get(model, 8192)
+    token_budget = st.sidebar.slider(
+        "Token budget per request",
+        1000,
+        min(context_window, 32000),
+        min(4000, context_window),
+        step=500,
+        help=f"Prompt + chunk + response tokens per LLM call ({model} context window: {context_window:,} tokens)"
+    )
+
+use_response_cache = st.sidebar.checkbox(
+    "Cache LLM responses",
+    value=True,
+    help="Reuse stored responses for identical chunks when temperature is 0.1 or lower, so reruns cost nothing"
+)
+
+if use_response_cache:
+    cache_stats = get_response_cache().stats()
+    st.sidebar.caption(
+        f"💾 Cache: {cache_stats['entries']} responses ({cache_stats['size_bytes'] / 1024 / 1024:.1f} MB) | "
+        f"{cache_stats['hits']} hits / {cache_stats['misses']} misses"
+    )
+
+hedging_policy = None
+if use_hedging:
+    backup_client = None
+    if backup_model is not None:
+        backup_client = LLMClient(
+            api_key=backup_api_key,
+            provider=backup_provider,
+            model=backup_model,
+            cache=get_response_cache() if use_response_cache else None,
+        )
+    hedging_policy = HedgingPolicy(backup_client=backup_client, percentile=hedge_percentile)
+
 st.sidebar.markdown("---")
 clean_text = st.sidebar.checkbox("Clean text input (remove weird characters)", value=True)
 
@@ -238,7 +333,8 @@ if st.session_state.text_data and st.session_state.tag_df is not None:
         temperature, 
         max_tokens, 
         model_provider, 
-        model
+        model,
+        token_budget=token_budget,
     )
 
 # === Streamlit UI ===
@@ -260,6 +356,10 @@ if st.button("🔍 Run Annotation", key="run_annotation_btn"):
                 api_key=st.session_state.api_key,
                 provider=st.session_state.model_provider,
                 model=model,
+                cache=get_response_cache() if use_response_cache else None,
+                requests_per_minute=requests_per_minute,
+                tokens_per_minute=tokens_per_minute,
+                hedging_policy=hedging_policy,
             )
             entities = run_annotation_pipeline(
                 text=st.session_state.text_data,
@@ -268,8 +368,15 @@ if st.button("🔍 Run Annotation", key="run_annotation_btn"):
                 temperature=temperature,
                 max_tokens=max_tokens,
                 chunk_size=chunk_size,
+                max_workers=max_workers,
+                token_budget=token_budget,
+                stream=stream_responses,
+                checkpoint_store=get_checkpoint_store() if use_checkpoints else None,
             )
             
+            if hedging_policy is not None and (hedging_policy.hedges_sent or hedging_policy.failovers):
+                st.caption(f"🛡️ Hedged {hedging_policy.hedges_sent} slow requests ({hedging_policy.hedges_won} answered first by the hedge), {hedging_policy.failovers} failovers")
+            
             # Store results in session state
             st.session_state.annotated_entities = entities
             st.session_state.annotation_complete = True
@@ -500,8 +607,15 @@ if st.session_state.get("annotation_complete"):
                     text_to_annotate = st.session_state.selected_text_for_annotation.strip()
                 
                 if text_to_annotate and selected_tag:
-                    # Find the text in the original document
-                    start_pos = st.session_state.text_data.find(text_to_annotate)
+                    selected_start = st.session_state.get('selected_start_pos', -1)
+                    selected_end = st.session_state.get('selected_end_pos', -1)
+                    if (not manual_text_input.strip() and selected_start >= 0
+                            and st.session_state.text_data[selected_start:selected_end] == text_to_annotate):
+                        # Use the document offsets reported with the selection
+                        start_pos = selected_start
+                    else:
+                        # Find the text in the original document
+                        start_pos = st.session_state.text_data.find(text_to_annotate)
                     
                     if start_pos != -1:
                         end_pos = start_pos + len(text_to_annotate)
@@ -521,16 +635,8 @@ if st.session_state.get("annotation_complete"):
                                     overlap_found = True
                                     break
                         else:
-                            # In nested mode, only prevent identical annotations
-                            for existing in all_existing:
-                                existing_start = existing.get('start_char', 0)
-                                existing_end = existing.get('end_char', 0)
-                                
-                                # Only prevent exact duplicates
-                                if (start_pos == existing_start and end_pos == existing_end and 
-                                    selected_tag == existing.get('label', '')):
-                                    overlap_found = True
-                                    break
+                            # In nested mode, only prevent exact duplicates
+                            overlap_found = EntityKeyIndex(all_existing).has_span(start_pos, end_pos, selected_tag)
                         
                         if not overlap_found:
                             # Create manual annotation for the first occurrence
@@ -550,13 +656,14 @@ if st.session_state.get("annotation_complete"):
                             if auto_detect_similar:
                                 # Get all current annotations to check for overlaps
                                 all_current = st.session_state.annotated_entities + st.session_state.manual_annotations + st.session_state.auto_detected_entities
+                                current_index = EntityKeyIndex(all_current)
                                 
                                 # Find and create annotations for similar words
                                 similar_annotations = create_annotations_for_similar_words(
                                     st.session_state.text_data,
                                     text_to_annotate,
                                     selected_tag,
-                                    all_current
+                                    current_index
                                 )
                                 
                                 # Add similar annotations, respecting annotation mode
@@ -578,18 +685,12 @@ if st.session_state.get("annotation_complete"):
                                                 break
                                     else:
                                         # In nested mode, only prevent exact duplicates
-                                        for existing in all_current:
-                                            existing_start = existing.get('start_char', 0)
-                                            existing_end = existing.get('end_char', 0)
-                                            
-                                            if (sim_start == existing_start and sim_end == existing_end and 
-                                                selected_tag == existing.get('label', '')):
-                                                sim_overlap_found = True
-                                                break
+                                        sim_overlap_found = current_index.has_span(sim_start, sim_end, selected_tag)
                                     
                                     if not sim_overlap_found:
                                         st.session_state.manual_annotations.append(similar_annotation)
                                         all_current.append(similar_annotation)  # Update current list for next iteration
+                                        current_index.add(similar_annotation)
                                         similar_annotations_added += 1
                             
                             # Clear selection
@@ -1414,6 +1515,10 @@ if st.session_state.get("annotation_complete"):
                             api_key=st.session_state.api_key,
                             provider=st.session_state.model_provider,
                             model=model,
+                            cache=get_response_cache() if use_response_cache else None,
+                            requests_per_minute=requests_per_minute,
+                            tokens_per_minute=tokens_per_minute,
+                            hedging_policy=hedging_policy,
                         )
                         
                         # FIXED: Combine ALL annotations for evaluation (LLM + auto-detected + manual)
@@ -1983,9 +2088,9 @@ if st.session_state.get("annotation_complete"):
             }
         
         
-        # Convert to JSON strings
-        simple_json_str = json.dumps(output_json, indent=2, ensure_ascii=False)
-        comprehensive_json_str = json.dumps(comprehensive_output_json, indent=2, ensure_ascii=False)
+        # Encode the JSON exports straight into byte buffers for the download buttons
+        simple_json_data = json_download(output_json)
+        comprehensive_json_data = json_download(comprehensive_output_json)
         
         # Define annotation mode string for exports
         annotation_mode_str = "nested" if is_nested_mode else "flat"
@@ -2007,7 +2112,7 @@ if st.session_state.get("annotation_complete"):
         with col1:
             st.download_button(
                 f"📥 Download JSON", 
-                data=simple_json_str, 
+                data=simple_json_data, 
                 file_name=f"annotations_{annotation_mode_str}_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.json", 
                 mime="application/json",
                 key="download_simple_json_btn",
@@ -2027,7 +2132,7 @@ if st.session_state.get("annotation_complete"):
         with col3:
             st.download_button(
                 "📥 Comprehensive Export", 
-                data=comprehensive_json_str, 
+                data=comprehensive_json_data, 
                 file_name=f"annotations_comprehensive_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}.json", 
                 mime="application/json",
                 key="download_comprehensive_json_btn",
@@ -2066,6 +2171,81 @@ if st.session_state.get("annotation_complete"):
             
             st.code('\n'.join(preview_lines), language='text')
             
+        # Corpus export: many documents streamed into a temporary file, then offered for download
+        with st.expander("📚 Corpus Export (multiple documents)", expanded=False):
+            st.markdown("Combine this document and/or previously exported annotation JSON files into a single "
+                        "training file. Records are written one document at a time, so large corpora "
+                        "do not need to fit in memory.")
+            corpus_uploads = st.file_uploader(
+                "Annotation JSON files",
+                type=["json"],
+                accept_multiple_files=True,
+                key="corpus_export_uploads",
+                help="JSON files downloaded from this app (each with 'text' and 'entities')"
+            )
+            include_current_document = st.checkbox(
+                "Include the current document", value=True, key="corpus_export_include_current"
+            )
+            corpus_col1, corpus_col2 = st.columns(2)
+            with corpus_col1:
+                corpus_format = st.selectbox(
+                    "Format", EXPORT_FORMATS, key="corpus_export_format",
+                    format_func=lambda fmt: {"conll": "CoNLL", "jsonl": "JSONL", "spacy": "spaCy (JSONL)"}[fmt]
+                )
+            with corpus_col2:
+                corpus_workers = st.number_input(
+                    "Worker processes", min_value=1, max_value=os.cpu_count() or 1, value=1,
+                    key="corpus_export_workers",
+                    help="Convert documents in parallel. Mainly useful for CoNLL, where tokenization dominates."
+                )
+            
+            if st.button("📚 Build Corpus", key="corpus_export_btn"):
+                def corpus_documents():
+                    """Current document first, then the uploaded files, read lazily."""
+                    if include_current_document and st.session_state.get("text_data"):
+                        yield {"id": "current", "text": st.session_state.get("text_data", ""), "entities": organized_entities}
+                    yield from iter_uploaded_annotations(corpus_uploads or [])
+                
+                # Replace the file of a previous export in this session
+                previous_export = st.session_state.pop("corpus_export_file", None)
+                if previous_export and os.path.exists(previous_export["path"]):
+                    os.remove(previous_export["path"])
+                
+                output_file = tempfile.NamedTemporaryFile(
+                    mode="w", encoding="utf-8", newline="", prefix="corpus_",
+                    suffix=EXPORT_EXTENSIONS[corpus_format], delete=False
+                )
+                try:
+                    with output_file, st.spinner("Exporting corpus..."):
+                        corpus_stats = export_corpus(
+                            corpus_documents(), output_file, corpus_format, workers=int(corpus_workers)
+                        )
+                    st.session_state.corpus_export_file = {
+                        "path": output_file.name,
+                        "file_name": f"corpus_{annotation_mode_str}_{pd.Timestamp.now().strftime('%Y%m%d_%H%M%S')}{EXPORT_EXTENSIONS[corpus_format]}",
+                        "format": corpus_format,
+                        "stats": corpus_stats
+                    }
+                except Exception as e:
+                    os.remove(output_file.name)
+                    st.error(f"❌ Corpus export failed: {e}")
+            
+            corpus_export_file = st.session_state.get("corpus_export_file")
+            if corpus_export_file and os.path.exists(corpus_export_file["path"]):
+                corpus_stats = corpus_export_file["stats"]
+                st.success(
+                    f"✅ Corpus ready: {corpus_stats['documents']} documents and {corpus_stats['entities']} entities"
+                    + (f" ({corpus_stats['tokens']} tokens)" if corpus_export_file["format"] == "conll" else "")
+                )
+                with open(corpus_export_file["path"], "rb") as corpus_data:
+                    st.download_button(
+                        "📥 Download Corpus",
+                        data=corpus_data,
+                        file_name=corpus_export_file["file_name"],
+                        mime="application/x-ndjson" if corpus_export_file["format"] != "conll" else "text/plain",
+                        key="download_corpus_btn"
+                    )
+            
         # Show preview of nested structure if there are nested entities
         # nested_count = len([e for e in organized_entities if 'nested_entities' in e and e['nested_entities']])
         # if nested_count > 0:
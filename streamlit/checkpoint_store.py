@@ -0,0 +1,92 @@
+# checkpoint_store.py
+"""
+Per-chunk checkpoints for annotation runs.
+Each finished chunk's parsed entities are written to disk (SQLite) as soon as the chunk
+completes, keyed by document, tagset and pipeline parameters, so an interrupted run
+resumes with only the missing chunks.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+def make_run_key(text, tag_df, params):
+    """
+    Build the checkpoint key for a run from a hash of the document, a hash of the tagset
+    and the pipeline parameters that affect chunking and LLM output.
+
+    Args:
+        text (str): Full document text
+        tag_df (DataFrame): Tagset used to build the prompts
+        params (dict): Provider, model, temperature, chunking settings, annotation mode, ...
+    """
+    document_hash = hashlib.sha256(text.encode("utf-8")).hexdigest()
+    tagset_hash = hashlib.sha256(tag_df.to_json(orient="records").encode("utf-8")).hexdigest()
+    key_material = json.dumps([document_hash, tagset_hash, params], sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(key_material.encode("utf-8")).hexdigest()
+
+
+class ChunkCheckpointStore:
+    """
+    Disk-backed store of completed chunk results.
+
+    Args:
+        checkpoint_dir (str): Directory holding the SQLite checkpoint file
+        ttl_seconds (float): Checkpoints older than this are removed when the store is opened
+    """
+
+    def __init__(self, checkpoint_dir=".llm_checkpoints", ttl_seconds=7 * 24 * 3600):
+        os.makedirs(checkpoint_dir, exist_ok=True)
+        self.path = os.path.join(checkpoint_dir, "checkpoints.sqlite3")
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS chunks ("
+            "run_key TEXT NOT NULL, chunk_index INTEGER NOT NULL, start_offset INTEGER NOT NULL, "
+            "end_offset INTEGER NOT NULL, entities TEXT NOT NULL, created_at REAL NOT NULL, "
+            "PRIMARY KEY (run_key, chunk_index))"
+        )
+        if self.ttl_seconds:
+            self._conn.execute("DELETE FROM chunks WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        self._conn.commit()
+
+    def load(self, run_key):
+        """
+        Return the saved chunks of a run.
+
+        Returns:
+            dict: chunk_index -> {'start_offset', 'end_offset', 'entities'}
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT chunk_index, start_offset, end_offset, entities FROM chunks WHERE run_key = ?",
+                (run_key,)
+            ).fetchall()
+        return {
+            chunk_index: {
+                'start_offset': start_offset,
+                'end_offset': end_offset,
+                'entities': json.loads(entities),
+            }
+            for chunk_index, start_offset, end_offset, entities in rows
+        }
+
+    def save(self, run_key, chunk_index, start_offset, end_offset, entities):
+        """Persist one completed chunk (committed immediately so it survives a crash)."""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO chunks (run_key, chunk_index, start_offset, end_offset, entities, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (run_key, chunk_index, start_offset, end_offset, json.dumps(entities), time.time())
+            )
+            self._conn.commit()
+
+    def clear(self, run_key):
+        """Remove every checkpoint of a run."""
+        with self._lock:
+            self._conn.execute("DELETE FROM chunks WHERE run_key = ?", (run_key,))
+            self._conn.commit()
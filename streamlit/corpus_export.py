@@ -0,0 +1,405 @@
+# corpus_export.py
+"""
+Streaming export of annotated documents as training data.
+Documents are converted one at a time and each record is written to the destination as soon
+as it is ready, so memory stays bounded by the largest single document rather than the corpus.
+Formats are CoNLL (token per line with IOB tags), JSONL (one compact document per line) and
+spaCy-style JSONL ([text, {"entities": [[start, end, label], ...]}], with non-overlapping
+entities and any nested spans under "spans"). The conversion stage can optionally run in a
+process pool with a bounded number of documents in flight.
+"""
+import glob
+import heapq
+import io
+import json
+import multiprocessing
+import os
+from bisect import bisect_left, bisect_right, insort
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+EXPORT_FORMATS = ('conll', 'jsonl', 'spacy')
+EXPORT_EXTENSIONS = {'conll': '.conll', 'jsonl': '.jsonl', 'spacy': '.jsonl'}
+
+# spaCy span group holding every span, including the nested ones left out of "entities"
+SPACY_SPAN_KEY = 'sc'
+
+# Documents queued per worker; bounds memory while keeping the pool busy
+DOCUMENTS_IN_FLIGHT_PER_WORKER = 2
+
+SENTENCE_END_TOKENS = ('.', '!', '?')
+
+
+@lru_cache(maxsize=1)
+def get_conll_tokenizer():
+    """
+    Process-wide spaCy English pipeline used to tokenize text for CoNLL export.
+    """
+    from spacy.lang.en import English
+
+    # Only the tokenizer is used; sentence breaks are derived from the tokens
+    return English()
+
+
+def flatten_entities_for_conll(entities):
+    """
+    Flatten nested entities structure for CoNLL format export.
+    
+    Args:
+        entities (list): List of entities that may contain nested_entities
+    
+    Returns:
+        list: Flat list of entities with start, end, label, text fields
+    """
+    flattened_entities = []
+    
+    def extract_flat_entity(entity):
+        """Extract basic entity information for CoNLL format."""
+        if not isinstance(entity, dict):
+            return None
+            
+        # Handle different field naming conventions
+        start_field = None
+        end_field = None
+        
+        # Check for different start/end field names
+        if 'start' in entity and 'end' in entity:
+            start_field = 'start'
+            end_field = 'end'
+        elif 'start_char' in entity and 'end_char' in entity:
+            start_field = 'start_char'
+            end_field = 'end_char'
+        else:
+            # Check if entity has required fields
+            return None
+            
+        if 'label' not in entity:
+            return None
+            
+        # Create basic entity structure for CoNLL
+        flat_entity = {
+            'start': entity[start_field],
+            'end': entity[end_field],
+            'label': entity['label'],
+            'text': entity.get('text', '')
+        }
+        
+        return flat_entity
+    
+    def process_entity_recursively(entity):
+        """Recursively process entity and its nested entities."""
+        # Add the main entity
+        flat_entity = extract_flat_entity(entity)
+        if flat_entity:
+            flattened_entities.append(flat_entity)
+        
+        # Process nested entities if they exist
+        nested_entities = entity.get('nested_entities', [])
+        if isinstance(nested_entities, list):
+            for nested_entity in nested_entities:
+                if isinstance(nested_entity, dict):
+                    process_entity_recursively(nested_entity)
+    
+    # Process all entities
+    for entity in entities:
+        if isinstance(entity, dict):
+            process_entity_recursively(entity)
+    
+    return flattened_entities
+
+
+def assign_conll_labels(tokens, spans):
+    """
+    IOB label for each token given entity spans, in one sweep.
+    
+    A token takes the longest span that contains it; if none does, the span it overlaps
+    most. Ties go to the span that sorts first by (start, end, label).
+    
+    Args:
+        tokens (list): (start, end) offsets of the tokens, in text order
+        spans (list): Sorted, unique (start, end, label) entity spans
+    
+    Returns:
+        list: "O", "B-LABEL" or "I-LABEL" per token
+    """
+    span_starts = [span[0] for span in spans]
+    by_end = sorted(spans, key=lambda span: (span[1], span))
+    span_ends = [span[1] for span in by_end]
+    
+    # Spans that started at or before the current token, longest first
+    started = []
+    next_span = 0
+    labels = []
+    
+    for start, end in tokens:
+        while next_span < len(spans) and spans[next_span][0] <= start:
+            ent_start, ent_end, ent_label = spans[next_span]
+            heapq.heappush(started, (ent_start - ent_end, ent_start, ent_end, ent_label))
+            next_span += 1
+        # A span ending before this token's end cannot contain this or any later token
+        while started and started[0][2] < end:
+            heapq.heappop(started)
+        
+        if started:
+            best_match = started[0][1:]
+        else:
+            # Partial overlaps: spans starting or ending strictly inside the token
+            candidates = spans[bisect_right(span_starts, start):bisect_left(span_starts, end)]
+            candidates += by_end[bisect_right(span_ends, start):bisect_left(span_ends, end)]
+            best_match = min(
+                candidates,
+                key=lambda span: (max(span[0], start) - min(span[1], end), span),
+                default=None
+            )
+        
+        if best_match:
+            ent_start, ent_end, ent_label = best_match
+            # Determine if this is the beginning of the entity
+            if start == ent_start:
+                labels.append(f"B-{ent_label.strip().upper()}")
+            else:
+                labels.append(f"I-{ent_label.strip().upper()}")
+        else:
+            labels.append("O")
+    
+    return labels
+
+
+def conll_spans(text, entities):
+    """
+    Sorted, unique (start, end, label) spans of the entities and their nested entities that
+    lie inside text.
+    """
+    spans = set()
+    for entity in flatten_entities_for_conll(entities):
+        if 0 <= entity['start'] < entity['end'] <= len(text):
+            spans.add((entity['start'], entity['end'], entity['label']))
+    return sorted(spans)
+
+
+def filter_overlapping_spans(spans):
+    """
+    Largest set of non-overlapping spans picked like spacy.util.filter_spans: longest first,
+    then earliest start, skipping any span that overlaps one already picked.
+
+    Args:
+        spans (list): (start, end, label) spans
+
+    Returns:
+        list: The picked spans, sorted
+    """
+    picked = []
+    for span in sorted(spans, key=lambda span: (span[0] - span[1], span[0])):
+        i = bisect_left(picked, span)
+        if i > 0 and picked[i - 1][1] > span[0]:
+            continue
+        if i < len(picked) and picked[i][0] < span[1]:
+            continue
+        insort(picked, span)
+    return picked
+
+
+def iter_conll_lines(text, spans, tokenizer=None):
+    """
+    Yield the CoNLL lines of one document: "token\tLABEL" per token, and an empty line after
+    sentence-ending punctuation.
+
+    Args:
+        text (str): The document text
+        spans (list): Spans from conll_spans
+        tokenizer: spaCy pipeline whose make_doc tokenizes text; defaults to get_conll_tokenizer()
+    """
+    doc = (tokenizer or get_conll_tokenizer()).make_doc(text)
+    token_offsets = [(token.idx, token.idx + len(token.text)) for token in doc]
+    labels = assign_conll_labels(token_offsets, spans)
+    for token, label in zip(doc, labels):
+        yield f"{token.text}\t{label}"
+        if token.text in SENTENCE_END_TOKENS:
+            yield ""
+
+
+def annotation_document(data, document_id=None):
+    """
+    Document dict for an exported annotation JSON value, or None if it has no text.
+    """
+    if not isinstance(data, dict) or not data.get('text'):
+        return None
+    return {'id': document_id, 'text': data['text'], 'entities': data.get('entities', [])}
+
+
+def iter_annotation_files(paths):
+    """
+    Yield the documents of exported annotation JSON files one at a time.
+    Paths are used as given; callers serving untrusted users should pass uploaded
+    files to iter_uploaded_annotations instead.
+
+    Args:
+        paths (iterable): File paths, directories (every *.json inside) or glob patterns
+
+    Yields:
+        dict: {'id', 'text', 'entities'} per file that has a text
+    """
+    for path in paths:
+        if os.path.isdir(path):
+            matches = sorted(glob.glob(os.path.join(path, '*.json')))
+        else:
+            matches = sorted(glob.glob(path)) or [path]
+        for file_path in matches:
+            with open(file_path, encoding='utf-8') as f:
+                document = annotation_document(json.load(f), os.path.splitext(os.path.basename(file_path))[0])
+            if document is not None:
+                yield document
+
+
+def iter_uploaded_annotations(files):
+    """
+    Yield the documents of uploaded annotation JSON files (binary file-like objects with
+    a name, e.g. Streamlit UploadedFile) one at a time.
+    """
+    for uploaded in files:
+        uploaded.seek(0)
+        document = annotation_document(
+            json.loads(uploaded.read().decode('utf-8')),
+            os.path.splitext(os.path.basename(uploaded.name))[0]
+        )
+        if document is not None:
+            yield document
+
+
+def render_document(document, export_format, tokenizer=None):
+    """
+    Convert one document into its exported text.
+
+    Args:
+        document (dict): {'text', 'entities'} and optionally 'id'
+        export_format (str): One of EXPORT_FORMATS
+        tokenizer: spaCy pipeline for CoNLL; defaults to get_conll_tokenizer()
+
+    Returns:
+        tuple: (record, stats) where record is the text to write, ending with a newline
+            (CoNLL documents are followed by an empty line), and stats counts its
+            'entities' and 'tokens'
+    """
+    text = document.get('text') or ''
+    entities = document.get('entities') or []
+
+    if export_format == 'conll':
+        spans = conll_spans(text, entities)
+        lines = list(iter_conll_lines(text, spans, tokenizer)) if text else []
+        tokens = sum(1 for line in lines if line)
+        record = '\n'.join(lines).rstrip('\n') + '\n\n' if lines else ''
+        return record, {'entities': len(spans), 'tokens': tokens}
+
+    if export_format == 'spacy':
+        # Doc.ents cannot overlap; nested and overlapping spans are kept in a span group
+        spans = conll_spans(text, entities)
+        entity_spans = filter_overlapping_spans(spans)
+        annotations = {'entities': [list(span) for span in entity_spans]}
+        if len(entity_spans) < len(spans):
+            annotations['spans'] = {SPACY_SPAN_KEY: [list(span) for span in spans]}
+        record = [text, annotations]
+        return json.dumps(record, ensure_ascii=False) + '\n', {'entities': len(spans), 'tokens': 0}
+
+    if export_format == 'jsonl':
+        record = {'text': text, 'entities': entities}
+        if document.get('id') is not None:
+            record = {'id': document['id'], **record}
+        return json.dumps(record, ensure_ascii=False) + '\n', {'entities': len(entities), 'tokens': 0}
+
+    raise ValueError(f"Unknown export format: {export_format}")
+
+
+def _render_in_worker(document, export_format):
+    """Process-pool task: render one document with the worker's own tokenizer."""
+    return render_document(document, export_format)
+
+
+def iter_export_records(documents, export_format, workers=1):
+    """
+    Render documents lazily, in input order.
+
+    With workers > 1 documents are rendered in a process pool, with at most
+    DOCUMENTS_IN_FLIGHT_PER_WORKER documents per worker submitted ahead of the one being
+    yielded, so a long corpus is never held in memory at once.
+
+    Args:
+        documents (iterable): Document dicts, e.g. from iter_annotation_files
+        export_format (str): One of EXPORT_FORMATS
+        workers (int): Number of worker processes; 1 renders in this process
+
+    Yields:
+        tuple: (record, stats) per document, as returned by render_document
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"Unknown export format: {export_format}")
+
+    if workers <= 1:
+        for document in documents:
+            yield render_document(document, export_format)
+        return
+
+    max_in_flight = workers * DOCUMENTS_IN_FLIGHT_PER_WORKER
+    # Spawned, not forked: this may run inside the multi-threaded Streamlit server
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('spawn'))
+    try:
+        pending = deque()
+        for document in documents:
+            pending.append(pool.submit(_render_in_worker, document, export_format))
+            if len(pending) >= max_in_flight:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        # Also reached when the caller stops early (generator closed or an error)
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def export_corpus(documents, destination, export_format='jsonl', workers=1):
+    """
+    Write documents to a file or stream one record at a time.
+
+    Args:
+        documents (iterable): Document dicts with 'text' and 'entities' (and optionally 'id')
+        destination (str or file): Output path, or a text stream with a write method
+        export_format (str): 'conll', 'jsonl' or 'spacy'
+        workers (int): Worker processes for the conversion stage
+
+    Returns:
+        dict: Counts of 'documents', 'entities' and 'tokens' written (tokens for CoNLL only)
+    """
+    totals = {'documents': 0, 'entities': 0, 'tokens': 0}
+    records = iter_export_records(documents, export_format, workers)
+
+    if hasattr(destination, 'write'):
+        _write_records(records, destination, totals)
+    else:
+        with open(destination, 'w', encoding='utf-8', newline='') as f:
+            _write_records(records, f, totals)
+    return totals
+
+
+def _write_records(records, stream, totals):
+    """Write each record as it is produced and accumulate its counts."""
+    for record, stats in records:
+        stream.write(record)
+        totals['documents'] += 1
+        totals['entities'] += stats['entities']
+        totals['tokens'] += stats['tokens']
+
+
+def json_download(value, indent=2):
+    """
+    Encode value as UTF-8 JSON for a download, written piece by piece into a byte buffer
+    rather than built as one str and then encoded.
+
+    Returns:
+        io.BytesIO: The encoded JSON, rewound
+    """
+    buffer = io.BytesIO()
+    writer = io.TextIOWrapper(buffer, encoding='utf-8')
+    json.dump(value, writer, indent=indent, ensure_ascii=False)
+    writer.flush()
+    writer.detach()
+    buffer.seek(0)
+    return buffer
@@ -0,0 +1,314 @@
+# document_index.py
+"""
+Per-document substring lookups used by the annotation position-correction helpers.
+Occurrences are found with str.find (a C-speed scan) and cached per pattern, so
+repeated lookups of the same string no longer rescan the text, and "nearest
+occurrence of s to offset k" is a binary search over the cached occurrence list.
+Case- and whitespace-insensitive searches run against a normalized view of the text,
+built only when first needed, that maps every offset back to the original, so they
+return exact original positions. Per-pattern results are kept in a bounded LRU, and
+cached indexes are bounded by their total size, per-pattern results included.
+"""
+import re
+import threading
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+NON_WHITESPACE_RUN = re.compile(r'\S+')
+WORD_TOKEN = re.compile(r'\w+')
+# Measured cost of one token in WordIndex (token string, list slot, position entry)
+WORD_INDEX_BYTES_PER_TOKEN = 110
+# Measured cost of one cached (start, end) span (tuple, two ints, list slot)
+SPAN_BYTES = 125
+# Patterns whose results are kept per document, least recently used evicted first
+MAX_CACHED_PATTERNS = 4096
+
+
+def tokenize_words(text):
+    """Lowercased word tokens of text, as indexed by WordIndex."""
+    return WORD_TOKEN.findall(text.lower())
+
+
+class WordIndex:
+    """
+    Token -> token positions map over one text, for word-level (case-insensitive) lookups.
+    Unlike substring checks, 'cat' does not match inside 'catalyst'.
+
+    Args:
+        text (str): The document text
+    """
+
+    def __init__(self, text):
+        self.tokens = tokenize_words(text)
+        self.positions = {}
+        for position, token in enumerate(self.tokens):
+            positions = self.positions.get(token)
+            if positions is None:
+                self.positions[token] = [position]
+            else:
+                positions.append(position)
+
+    def has_all(self, tokens):
+        """True if every token occurs somewhere in the text."""
+        return all(token in self.positions for token in tokens)
+
+    def phrase_positions(self, tokens):
+        """Token positions where tokens occur as a contiguous phrase."""
+        if not tokens or not self.has_all(tokens):
+            return []
+        # Anchor on the rarest token and check its neighbours
+        anchor = min(range(len(tokens)), key=lambda j: len(self.positions[tokens[j]]))
+        n = len(tokens)
+        return [
+            position - anchor for position in self.positions[tokens[anchor]]
+            if position >= anchor and self.tokens[position - anchor:position - anchor + n] == tokens
+        ]
+
+    def contains_phrase(self, tokens):
+        """True if tokens occur as a contiguous phrase."""
+        return bool(self.phrase_positions(tokens))
+
+
+class NormalizedView:
+    """
+    The text with whitespace runs collapsed to single spaces and/or lowercased,
+    plus a compact integer array mapping each offset in the view to the original text.
+
+    Args:
+        text (str): The document text
+        collapse_whitespace (bool): Collapse whitespace like ' '.join(text.split())
+        fold_case (bool): Lowercase the text
+    """
+
+    def __init__(self, text, collapse_whitespace=True, fold_case=False):
+        self.original_length = len(text)
+        self.offsets = None
+
+        if not collapse_whitespace:
+            lowered = text.lower() if fold_case else text
+            if len(lowered) == len(text):
+                # Same length: offsets are the identity, no map needed
+                self.text = lowered
+                return
+            segments = [(0, len(text))]
+        else:
+            segments = [match.span() for match in NON_WHITESPACE_RUN.finditer(text)]
+
+        pieces = []
+        offsets = array('I' if len(text) < 2 ** 32 else 'Q')
+        previous_end = None
+        for start, end in segments:
+            if previous_end is not None:
+                # The single space stands for the whole whitespace run
+                pieces.append(' ')
+                offsets.append(previous_end)
+            segment = text[start:end]
+            folded = segment.lower() if fold_case else segment
+            if len(folded) == len(segment):
+                pieces.append(folded)
+                offsets.extend(range(start, end))
+            else:
+                # Some characters lowercase to several (e.g. 'İ'); map each back to its source
+                for position, ch in enumerate(segment, start):
+                    lowered_ch = ch.lower()
+                    pieces.append(lowered_ch)
+                    offsets.extend([position] * len(lowered_ch))
+            previous_end = end
+
+        self.text = ''.join(pieces)
+        self.offsets = offsets
+
+    def to_original(self, start, end):
+        """Map a [start, end) span of the view to the span of the original text it covers."""
+        offsets = self.offsets
+        if offsets is None:
+            return start, end
+        original_start = offsets[start] if start < len(offsets) else self.original_length
+        if end <= start:
+            return original_start, original_start
+        return original_start, offsets[end - 1] + 1
+
+
+class DocumentIndex:
+    """
+    Cached substring lookups over one text.
+
+    Args:
+        text (str): The document text
+    """
+
+    def __init__(self, text):
+        self.text = text
+        self._views = {}
+        self._spans_cache = OrderedDict()
+        self._word_index = None
+        self._occurrences_cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _cached(self, cache, key):
+        """Look up key in a per-pattern cache, marking it recently used."""
+        with self._lock:
+            value = cache.get(key)
+            if value is not None:
+                cache.move_to_end(key)
+            return value
+
+    def _store(self, cache, key, value):
+        """Store a per-pattern result, evicting the least recently used beyond MAX_CACHED_PATTERNS."""
+        with self._lock:
+            cache[key] = value
+            cache.move_to_end(key)
+            while len(cache) > MAX_CACHED_PATTERNS:
+                cache.popitem(last=False)
+
+    def _view(self, ignore_case, ignore_whitespace):
+        """(view text, NormalizedView or None) for one normalization, built on first use."""
+        if not (ignore_case or ignore_whitespace):
+            return self.text, None
+        key = (ignore_case, ignore_whitespace)
+        with self._lock:
+            view = self._views.get(key)
+            if view is None:
+                normalized = NormalizedView(self.text, ignore_whitespace, ignore_case)
+                view = (normalized.text, normalized)
+                self._views[key] = view
+        return view
+
+    def find_all(self, pattern, ignore_case=False, ignore_whitespace=False):
+        """
+        Sorted (start, end) spans of every (possibly overlapping) occurrence of pattern.
+        With ignore_case and/or ignore_whitespace the search runs in the normalized view,
+        and the spans are mapped back to exact positions in the original text.
+        """
+        key = (pattern, ignore_case, ignore_whitespace)
+        spans = self._cached(self._spans_cache, key)
+        if spans is not None:
+            return spans
+
+        needle = ' '.join(pattern.split()) if ignore_whitespace else pattern
+        if ignore_case:
+            needle = needle.lower()
+
+        positions = []
+        if needle or not ignore_whitespace:
+            view_text, normalized = self._view(ignore_case, ignore_whitespace)
+            find = view_text.find
+            pos = find(needle)
+            while pos != -1:
+                positions.append(pos)
+                pos = find(needle, pos + 1)
+        else:
+            normalized = None
+
+        length = len(needle)
+        if normalized is None:
+            spans = [(pos, pos + length) for pos in positions]
+        else:
+            spans = [normalized.to_original(pos, pos + length) for pos in positions]
+        self._store(self._spans_cache, key, spans)
+        return spans
+
+    def words(self):
+        """Word-level index of the text, built on first use."""
+        with self._lock:
+            if self._word_index is None:
+                self._word_index = WordIndex(self.text)
+        return self._word_index
+
+    def contains(self, pattern):
+        """True if pattern occurs in the text (exact match)."""
+        return bool(self.find_all(pattern))
+
+    def occurrences(self, pattern):
+        """
+        (start, end) of every occurrence of pattern, trying in turn an exact match,
+        a case-insensitive match, a whitespace-insensitive match and a match ignoring both.
+        """
+        cached = self._cached(self._occurrences_cache, pattern)
+        if cached is not None:
+            return cached
+
+        # Every stricter match is also a match ignoring both, so a miss there ends the search
+        # after one scan instead of four (a blank pattern has no loosest form to check)
+        loosest = self.find_all(pattern, ignore_case=True, ignore_whitespace=True)
+        if not loosest and pattern.split():
+            occurrences = []
+        else:
+            occurrences = (
+                self.find_all(pattern)
+                or self.find_all(pattern, ignore_case=True)
+                or self.find_all(pattern, ignore_whitespace=True)
+                or loosest
+            )
+
+        self._store(self._occurrences_cache, pattern, occurrences)
+        return occurrences
+
+    def nearest_occurrence(self, pattern, offset):
+        """
+        The occurrence (as returned by occurrences) whose start is closest to offset;
+        on a tie the earlier one. None if pattern does not occur.
+        """
+        return nearest_span(self.occurrences(pattern), offset)
+
+    def memory_estimate(self):
+        """
+        Approximate bytes held by the normalized views, the word index and the cached
+        per-pattern results (not the text itself).
+        """
+        with self._lock:
+            views = list(self._views.values())
+            results = list(self._spans_cache.items()) + list(self._occurrences_cache.items())
+        size = 0
+        seen = set()
+        for key, spans in results:
+            size += len(key[0] if isinstance(key, tuple) else key)
+            # occurrences() returns lists held by the spans cache; count each list once
+            if id(spans) not in seen:
+                seen.add(id(spans))
+                size += len(spans) * SPAN_BYTES
+        for view_text, normalized in views:
+            size += len(view_text)
+            if normalized.offsets is not None:
+                size += len(normalized.offsets) * normalized.offsets.itemsize
+        if self._word_index is not None:
+            size += len(self._word_index.tokens) * WORD_INDEX_BYTES_PER_TOKEN
+        return size
+
+
+def nearest_span(spans, offset):
+    """The span from a sorted list whose start is closest to offset; on a tie the earlier one."""
+    if not spans:
+        return None
+    i = bisect_left(spans, (offset,))
+    if i == 0:
+        return spans[0]
+    if i == len(spans):
+        return spans[-1]
+    before, after = spans[i - 1], spans[i]
+    return before if offset - before[0] <= after[0] - offset else after
+
+
+_recent_indexes = OrderedDict()
+_recent_indexes_lock = threading.Lock()
+# Total size of the cached indexes, including their texts; the most recent one is always kept
+MAX_CACHED_INDEX_BYTES = 64 * 1024 * 1024
+
+
+def get_document_index(text):
+    """Get the index for text, reusing it across calls for the most recently used documents."""
+    key = hash(text)
+    with _recent_indexes_lock:
+        index = _recent_indexes.get(key)
+        if index is not None and index.text == text:
+            _recent_indexes.move_to_end(key)
+        else:
+            index = DocumentIndex(text)
+            _recent_indexes[key] = index
+        # Views are built lazily, so sizes are re-checked on every call
+        total = sum(len(cached.text) + cached.memory_estimate() for cached in _recent_indexes.values())
+        while total > MAX_CACHED_INDEX_BYTES and len(_recent_indexes) > 1:
+            _, evicted = _recent_indexes.popitem(last=False)
+            total -= len(evicted.text) + evicted.memory_estimate()
+        return index
@@ -0,0 +1,81 @@
+# document_pages.py
+"""
+Paged view of large documents.
+Page boundaries are precomputed on sentence breaks, and entities are looked up per page
+with a bisect over their sorted start offsets, so only the visible pages are rendered.
+"""
+import re
+from bisect import bisect_left
+
+# Documents longer than this are shown page by page by default
+PAGED_VIEW_MIN_CHARS = 200_000
+DEFAULT_PAGE_CHARS = 20_000
+
+# Whitespace after a sentence end, or a paragraph break
+SENTENCE_BREAK = re.compile(r'(?<=[.!?])\s+|\n\s*\n')
+
+
+def compute_page_bounds(text, page_chars=DEFAULT_PAGE_CHARS):
+    """
+    Split text into pages of roughly page_chars characters.
+
+    Each page ends after the first sentence break past page_chars; if there is none within
+    another half page, at the last space before it, and otherwise at exactly page_chars.
+
+    Args:
+        text (str): The document text
+        page_chars (int): Target page length
+
+    Returns:
+        tuple: (start, end) offsets of consecutive pages covering the whole text
+    """
+    bounds = []
+    start = 0
+    text_length = len(text)
+    while start < text_length:
+        target = start + page_chars
+        if target >= text_length:
+            bounds.append((start, text_length))
+            break
+        match = SENTENCE_BREAK.search(text, target, min(text_length, target + page_chars // 2))
+        if match:
+            end = match.end()
+        else:
+            space = text.rfind(' ', start + 1, target)
+            end = space + 1 if space != -1 else target
+        bounds.append((start, end))
+        start = end
+    return tuple(bounds)
+
+
+class EntityPager:
+    """
+    Entities sorted by start offset, for looking up the entities of one page.
+
+    Args:
+        entities (list): Entity dicts with valid 'start_char'/'end_char'
+    """
+
+    def __init__(self, entities):
+        self.entities = sorted(entities, key=lambda ent: ent['start_char'])
+        self.starts = [ent['start_char'] for ent in self.entities]
+        self.max_length = max((ent['end_char'] - ent['start_char'] for ent in self.entities), default=0)
+
+    def entities_in(self, start, end):
+        """
+        Entities overlapping [start, end), clipped to it (clipped ones are copies).
+        Entities are returned in their original relative order within equal starts.
+        """
+        # Nothing starting earlier than the longest entity can reach into the range
+        lo = bisect_left(self.starts, start - self.max_length)
+        hi = bisect_left(self.starts, end)
+        page_entities = []
+        for ent in self.entities[lo:hi]:
+            start_char = ent['start_char']
+            end_char = ent['end_char']
+            if end_char <= start and start_char < start:
+                continue
+            if start_char < start or end_char > end:
+                ent = dict(ent, start_char=max(start_char, start), end_char=min(end_char, end))
+            page_entities.append(ent)
+        return page_entities
@@ -5,6 +5,7 @@ This module provides improved validation capabilities for LLM-generated annotati
 
 import streamlit as st
 from helper import find_all_occurrences, try_advanced_fuzzy_match, detect_phantom_annotations
+from document_index import nearest_span
 
 def validate_annotations_enhanced(text, entities):
     """
@@ -25,6 +26,7 @@ def validate_annotations_enhanced(text, entities):
         'warnings': [],
         'phantom_annotations': [],
         'detailed_analysis': [],
+        'analysis_by_index': {},
         'phantom_analysis': None
     }
     
@@ -35,7 +37,7 @@ def validate_annotations_enhanced(text, entities):
     phantom_analysis = detect_phantom_annotations(text, entities)
     validation_results['phantom_analysis'] = phantom_analysis
     
-    phantom_indices = {item['index'] for item in phantom_analysis['phantom_annotations']}
+    phantom_by_index = {item['index']: item for item in phantom_analysis['phantom_annotations']}
     
     # Display phantom detection results
     if phantom_analysis['phantom_annotations']:
@@ -54,10 +56,13 @@ def validate_annotations_enhanced(text, entities):
     # Step 2: Regular validation with phantom awareness
     validation_progress = st.progress(0)
     validation_status = st.empty()
+    # Redrawing the progress bar for every entity dominates large runs
+    progress_step = max(1, len(entities) // 100)
     
     for i, entity in enumerate(entities):
-        validation_progress.progress((i + 1) / len(entities))
-        validation_status.text(f"Validating entity {i+1}/{len(entities)}: '{entity.get('text', 'N/A')[:30]}...'")
+        if i % progress_step == 0 or i == len(entities) - 1:
+            validation_progress.progress((i + 1) / len(entities))
+            validation_status.text(f"Validating entity {i+1}/{len(entities)}: '{entity.get('text', 'N/A')[:30]}...'")
         
         start_char = entity.get('start_char')
         end_char = entity.get('end_char')
@@ -70,12 +75,13 @@ def validate_annotations_enhanced(text, entities):
             'end_char': end_char,
             'label': entity.get('label', 'Unknown'),
             'status': 'unknown',
-            'is_phantom': i in phantom_indices
+            'is_phantom': i in phantom_by_index
         }
+        validation_results['analysis_by_index'][i] = analysis
         
         # Handle phantom annotations
-        if i in phantom_indices:
-            phantom_info = next((p for p in phantom_analysis['phantom_annotations'] if p['index'] == i), {})
+        if i in phantom_by_index:
+            phantom_info = phantom_by_index[i]
             analysis['status'] = 'phantom'
             analysis['phantom_reason'] = phantom_info.get('issues', [])
             analysis['phantom_type'] = phantom_info.get('status', 'unknown')
@@ -139,7 +145,7 @@ def validate_annotations_enhanced(text, entities):
                 analysis['found_positions'] = correct_positions
                 
                 if correct_positions:
-                    closest_pos = min(correct_positions, key=lambda x: abs(x[0] - start_char))
+                    closest_pos = nearest_span(correct_positions, start_char)
                     analysis['suggested_position'] = closest_pos
                     analysis['position_offset'] = closest_pos[0] - start_char
                     analysis['status'] = 'position_fixable'
@@ -264,6 +270,16 @@ def display_enhanced_results(validation_results):
     if validation_results['correct_entities'] == total:
         st.success("✅ All annotations have correct positions!")
 
+def get_analysis_by_index(validation_results):
+    """
+    Map entity index -> analysis for validation results.
+    Results stored before the index was added are re-keyed from detailed_analysis.
+    """
+    analysis_by_index = validation_results.get('analysis_by_index')
+    if analysis_by_index is None:
+        analysis_by_index = {a['entity_index']: a for a in validation_results['detailed_analysis']}
+    return analysis_by_index
+
 def auto_fix_annotations(text, entities, validation_results):
     """
     Automatically fix annotations based on validation results.
@@ -276,56 +292,48 @@ def auto_fix_annotations(text, entities, validation_results):
     Returns:
         tuple: (fixed_entities, fix_summary)
     """
-    fixed_entities = []
-    fix_summary = {
-        'total_fixed': 0,
-        'position_fixes': 0,
-        'fuzzy_fixes': 0,
-        'phantoms_flagged': 0,
-        'unfixable': 0
+    analysis_by_index = get_analysis_by_index(validation_results)
+    
+    # Entities are matched to their analysis by position, never by value, so equal dicts stay distinct
+    statuses = [analysis_by_index.get(i, {}).get('status') for i in range(len(entities))]
+    fixable_statuses = ('position_fixable', 'fuzzy_fixable')
+    fix_positions = {
+        i: analysis_by_index[i]['suggested_position']
+        for i, status in enumerate(statuses)
+        if status in fixable_statuses and analysis_by_index[i].get('suggested_position')
     }
     
-    for entity in entities:
-        entity_index = entities.index(entity)
-        
-        # Find corresponding analysis
-        analysis = next((a for a in validation_results['detailed_analysis'] 
-                        if a['entity_index'] == entity_index), {})
-        
-        if analysis.get('status') == 'correct':
+    # Apply all fixes in one pass
+    fixed_entities = []
+    for i, (entity, status) in enumerate(zip(entities, statuses)):
+        if status == 'correct':
             fixed_entities.append(entity)
-        elif analysis.get('status') == 'phantom':
+            continue
+        
+        fixed_entity = entity.copy()
+        if status == 'phantom':
             # Flag phantom but keep for user review
-            phantom_entity = entity.copy()
-            phantom_entity['validation_flag'] = 'PHANTOM'
-            phantom_entity['phantom_reason'] = analysis.get('phantom_reason', [])
-            fixed_entities.append(phantom_entity)
-            fix_summary['phantoms_flagged'] += 1
-        elif analysis.get('status') in ['position_fixable', 'fuzzy_fixable']:
-            # Fix position
-            fixed_entity = entity.copy()
-            suggested_pos = analysis.get('suggested_position')
-            if suggested_pos:
-                fixed_entity['start_char'] = suggested_pos[0]
-                fixed_entity['end_char'] = suggested_pos[1]
-                fixed_entity['validation_flag'] = 'AUTO_FIXED'
-                fixed_entities.append(fixed_entity)
-                fix_summary['total_fixed'] += 1
-                if analysis.get('status') == 'position_fixable':
-                    fix_summary['position_fixes'] += 1
-                else:
-                    fix_summary['fuzzy_fixes'] += 1
-            else:
-                # Keep original but flag as unfixable
-                unfixable_entity = entity.copy()
-                unfixable_entity['validation_flag'] = 'UNFIXABLE'
-                fixed_entities.append(unfixable_entity)
-                fix_summary['unfixable'] += 1
+            fixed_entity['validation_flag'] = 'PHANTOM'
+            fixed_entity['phantom_reason'] = analysis_by_index[i].get('phantom_reason', [])
+        elif i in fix_positions:
+            fixed_entity['start_char'], fixed_entity['end_char'] = fix_positions[i][:2]
+            fixed_entity['validation_flag'] = 'AUTO_FIXED'
+        elif status in fixable_statuses:
+            # Keep original but flag as unfixable
+            fixed_entity['validation_flag'] = 'UNFIXABLE'
         else:
             # Keep original but flag as problematic
-            problem_entity = entity.copy()
-            problem_entity['validation_flag'] = 'NEEDS_REVIEW'
-            fixed_entities.append(problem_entity)
-            fix_summary['unfixable'] += 1
+            fixed_entity['validation_flag'] = 'NEEDS_REVIEW'
+        fixed_entities.append(fixed_entity)
+    
+    position_fixes = sum(1 for i in fix_positions if statuses[i] == 'position_fixable')
+    phantoms_flagged = statuses.count('phantom')
+    fix_summary = {
+        'total_fixed': len(fix_positions),
+        'position_fixes': position_fixes,
+        'fuzzy_fixes': len(fix_positions) - position_fixes,
+        'phantoms_flagged': phantoms_flagged,
+        'unfixable': len(entities) - statuses.count('correct') - phantoms_flagged - len(fix_positions)
+    }
     
     return fixed_entities, fix_summary
@@ -0,0 +1,48 @@
+# entity_index.py
+"""
+Hash index over entity keys for constant-time duplicate checks.
+Used wherever LLM, auto-detected and manual annotations are compared against each other.
+"""
+
+
+def text_label_key(entity):
+    """(lowercased, stripped text, label) key used to match the same term across annotations."""
+    return (entity.get('text', '').strip().lower(), entity.get('label', ''))
+
+
+def span_key(entity):
+    """(start, end, label) key used to match annotations at the same position."""
+    return (entity.get('start_char', 0), entity.get('end_char', 0), entity.get('label', ''))
+
+
+class EntityKeyIndex:
+    """
+    Hash sets over a list of entities, keyed by (text, label) and by (start, end, label).
+    Entities can be added as they are created, so a growing list stays indexed.
+    """
+
+    def __init__(self, entities=None):
+        self.text_labels = set()
+        # (start, end, label) -> lowercased texts annotated at that span
+        self.spans = {}
+        for entity in entities or []:
+            if isinstance(entity, dict):
+                self.add(entity)
+
+    def add(self, entity):
+        """Index one entity."""
+        self.text_labels.add(text_label_key(entity))
+        self.spans.setdefault(span_key(entity), set()).add(entity.get('text', '').lower())
+
+    def has_text_label(self, entity):
+        """True if an indexed entity has the same text (case-insensitive) and label."""
+        return text_label_key(entity) in self.text_labels
+
+    def has_span(self, start_char, end_char, label):
+        """True if an indexed entity has this exact span and label."""
+        return (start_char, end_char, label) in self.spans
+
+    def has_exact(self, start_char, end_char, label, text):
+        """True if an indexed entity has this span, label and text (case-insensitive)."""
+        texts = self.spans.get((start_char, end_char, label))
+        return texts is not None and text.lower() in texts
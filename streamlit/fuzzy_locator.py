@@ -0,0 +1,120 @@
+# fuzzy_locator.py
+"""
+Approximate string location for annotations whose text differs slightly from the document
+(OCR errors, hyphenation, a dropped or doubled letter).
+Uses Myers' bit-parallel edit-distance algorithm (Hyyrö's formulation): the pattern's
+DP column is held in the bits of two integers, so each text character costs a handful of
+integer operations regardless of the pattern length.
+"""
+
+# Shorter patterns are too likely to match something unrelated once an edit is allowed
+MIN_FUZZY_LENGTH = 5
+DEFAULT_WINDOW = 200
+
+
+def default_max_distance(pattern_length):
+    """Edit budget for a pattern: one edit per eight characters, at least one."""
+    if pattern_length < MIN_FUZZY_LENGTH:
+        return 0
+    return max(1, pattern_length // 8)
+
+
+def _pattern_masks(pattern, ignore_case):
+    """Bit mask per character: bit i is set if pattern[i] matches that character."""
+    masks = {}
+    for i, ch in enumerate(pattern):
+        bit = 1 << i
+        variants = {ch, ch.lower(), ch.upper()} if ignore_case else {ch}
+        for variant in variants:
+            if len(variant) == 1:
+                masks[variant] = masks.get(variant, 0) | bit
+    return masks
+
+
+def _edit_distances(masks, pattern_length, text, anchored):
+    """
+    Edit distance of the pattern against text after each character.
+
+    With anchored=False the match may start anywhere (score j is the best distance of the
+    pattern to any substring ending at j); with anchored=True it must start at text[0]
+    (score j is the distance to text[:j + 1]).
+    """
+    full = (1 << pattern_length) - 1
+    high_bit = 1 << (pattern_length - 1)
+    pv = full
+    mv = 0
+    score = pattern_length
+    scores = []
+    append = scores.append
+    get_mask = masks.get
+    for ch in text:
+        eq = get_mask(ch, 0)
+        xv = eq | mv
+        xh = (((eq & pv) + pv) ^ pv) | eq
+        ph = mv | (~(xh | pv) & full)
+        mh = pv & xh
+        if ph & high_bit:
+            score += 1
+        elif mh & high_bit:
+            score -= 1
+        ph = (ph << 1) & full
+        mh = (mh << 1) & full
+        if anchored:
+            ph |= 1
+        pv = mh | (~(xv | ph) & full)
+        mv = ph & xv
+        append(score)
+    return scores
+
+
+def locate_approximate(text, pattern, approximate_start, max_distance=None, window=DEFAULT_WINDOW, ignore_case=True):
+    """
+    Find the span of text closest to pattern in edit distance, near an approximate position.
+
+    Args:
+        text (str): The full source text
+        pattern (str): The annotation text to locate
+        approximate_start (int): Where the annotation is expected to start
+        max_distance (int): Maximum number of edits (insertions, deletions, substitutions);
+            defaults to default_max_distance(len(pattern))
+        window (int): Characters searched on each side of the expected span
+        ignore_case (bool): Whether case differences count as edits
+
+    Returns:
+        tuple: (start, end, distance) of the best match, or None if nothing is within max_distance.
+            Ties are broken by closeness to approximate_start.
+    """
+    pattern_length = len(pattern)
+    if max_distance is None:
+        max_distance = default_max_distance(pattern_length)
+    if not pattern_length or max_distance < 0:
+        return None
+
+    region_start = max(0, approximate_start - window)
+    region_end = min(len(text), approximate_start + pattern_length + window)
+    region = text[region_start:region_end]
+    if not region:
+        return None
+
+    # Forward pass: best distance for every possible end position
+    masks = _pattern_masks(pattern, ignore_case)
+    end_scores = _edit_distances(masks, pattern_length, region, anchored=False)
+    best = min(end_scores)
+    if best > max_distance:
+        return None
+    expected_end = approximate_start + pattern_length - region_start
+    end = min(
+        (j + 1 for j, score in enumerate(end_scores) if score == best),
+        key=lambda j: abs(j - expected_end)
+    )
+
+    # Backward pass anchored at that end: distance for every possible start
+    reversed_masks = _pattern_masks(pattern[::-1], ignore_case)
+    lookback = region[max(0, end - pattern_length - best):end][::-1]
+    start_scores = _edit_distances(reversed_masks, pattern_length, lookback, anchored=True)
+    length = min(
+        (i + 1 for i, score in enumerate(start_scores) if score == best),
+        key=lambda n: abs(n - pattern_length)
+    )
+
+    return (region_start + end - length, region_start + end, best)
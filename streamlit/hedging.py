@@ -0,0 +1,191 @@
+# hedging.py
+"""
+Hedged LLM requests and provider failover.
+Latencies are tracked per provider/model. When a call runs past a chosen latency
+percentile, a duplicate request is sent (optionally to a backup provider or model)
+and whichever answers first is used. Repeated failures of the primary route calls
+straight to the backup for a cool-down period; without a distinct backup there is
+nothing to fail over to, and the primary's failures are returned as they happen.
+"""
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+
+class LatencyTracker:
+    """
+    Rolling window of successful call latencies for one provider/model,
+    plus a count of consecutive failed calls.
+    """
+
+    def __init__(self, window=200):
+        self.latencies = deque(maxlen=window)
+        self.consecutive_failures = 0
+        self.failover_until = 0.0
+        self._lock = threading.Lock()
+
+    def record(self, seconds, success):
+        """Record the outcome of one call."""
+        with self._lock:
+            if success:
+                self.latencies.append(seconds)
+                self.consecutive_failures = 0
+            else:
+                self.consecutive_failures += 1
+
+    def in_failover(self):
+        """True while calls are routed to the backup after repeated failures."""
+        with self._lock:
+            return time.monotonic() < self.failover_until
+
+    def enter_failover(self, failover_after, cooldown):
+        """
+        Start a failover cool-down if at least failover_after calls failed in a row.
+        The failure count restarts, so after the cool-down the primary gets a fresh
+        failover_after attempts before failing over again.
+
+        Returns:
+            bool: Whether failover was entered
+        """
+        with self._lock:
+            if self.consecutive_failures < failover_after:
+                return False
+            self.consecutive_failures = 0
+            self.failover_until = time.monotonic() + cooldown
+            return True
+
+    def percentile(self, pct, min_samples=10):
+        """Latency at the given percentile (0-1), or None until min_samples calls were seen."""
+        with self._lock:
+            if len(self.latencies) < min_samples:
+                return None
+            ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(pct * len(ordered)))
+        return ordered[index]
+
+
+_trackers = {}
+_trackers_lock = threading.Lock()
+
+
+def get_latency_tracker(provider, model):
+    """Get the shared latency tracker for a provider and model."""
+    with _trackers_lock:
+        tracker = _trackers.get((provider, model))
+        if tracker is None:
+            tracker = LatencyTracker()
+            _trackers[(provider, model)] = tracker
+        return tracker
+
+
+class HedgingPolicy:
+    """
+    When and where to send duplicate requests.
+
+    Args:
+        backup_client: LLMClient for hedges and failover (None hedges against the primary itself)
+        percentile (float): Hedge once a call runs longer than this latency percentile
+        min_samples (int): Calls to observe before hedging starts
+        min_delay (float): Never hedge earlier than this many seconds
+        failover_after (int): Consecutive primary failures before failing over to the backup
+        failover_cooldown (float): Seconds to route calls to the backup after a failover
+    """
+
+    def __init__(self, backup_client=None, percentile=0.95, min_samples=10, min_delay=2.0,
+                 failover_after=3, failover_cooldown=60.0):
+        self.backup_client = backup_client
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.failover_after = failover_after
+        self.failover_cooldown = failover_cooldown
+        self.hedges_sent = 0
+        self.hedges_won = 0
+        self.failovers = 0
+        self._lock = threading.Lock()
+
+    def hedge_delay(self, tracker):
+        """Seconds to wait for the primary before hedging, or None if there is no history yet."""
+        threshold = tracker.percentile(self.percentile, self.min_samples)
+        if threshold is None:
+            return None
+        return max(self.min_delay, threshold)
+
+    def count(self, counter):
+        """Increment one of the hedges_sent / hedges_won / failovers counters."""
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+
+# Hedged calls run here; a losing call is left to finish in the background
+_hedge_executor = ThreadPoolExecutor(max_workers=16, thread_name_prefix="llm-hedge")
+
+
+def _submit_with_script_ctx(fn):
+    """Run fn on the hedge pool with the caller's Streamlit script context attached."""
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+    script_ctx = get_script_run_ctx()
+
+    def run():
+        add_script_run_ctx(threading.current_thread(), script_ctx)
+        return fn()
+
+    return _hedge_executor.submit(run)
+
+
+def run_hedged(primary, backup, policy, tracker, can_fail_over=True):
+    """
+    Run primary() and, if it is slower than the policy allows, backup() as a hedge.
+
+    Args:
+        primary: Zero-argument callable for the primary request (returns None on failure)
+        backup: Zero-argument callable for the hedge/failover request
+        policy (HedgingPolicy): Hedging settings and counters
+        tracker (LatencyTracker): Latency history of the primary provider/model
+        can_fail_over (bool): Whether backup() reaches a different provider/model;
+            if not, it is only used for hedges and failures are never failed over
+
+    Returns:
+        tuple: (response, answered_by_primary); response is None if every request failed
+    """
+    # Fail over while the primary is in its cool-down after repeated failures
+    if can_fail_over and tracker.in_failover():
+        return backup(), False
+
+    delay = policy.hedge_delay(tracker)
+    if delay is None:
+        response = primary()
+        if response is not None:
+            return response, True
+        return _maybe_fail_over(backup, policy, tracker, can_fail_over)
+
+    primary_future = _submit_with_script_ctx(primary)
+    done, _ = wait([primary_future], timeout=delay)
+    if done:
+        response = primary_future.result()
+        if response is not None:
+            return response, True
+        return _maybe_fail_over(backup, policy, tracker, can_fail_over)
+
+    policy.count("hedges_sent")
+    hedge_future = _submit_with_script_ctx(backup)
+    pending = {primary_future, hedge_future}
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            response = future.result()
+            if response is not None:
+                if future is hedge_future:
+                    policy.count("hedges_won")
+                return response, future is primary_future
+    return None, False
+
+
+def _maybe_fail_over(backup, policy, tracker, can_fail_over):
+    """After a failed primary call, switch to the backup once failures repeat."""
+    # Retrying the same route would only reset the failure count and hide the outage
+    if not can_fail_over or not tracker.enter_failover(policy.failover_after, policy.failover_cooldown):
+        return None, True
+    policy.count("failovers")
+    return backup(), False
@@ -6,10 +6,26 @@ import pandas as pd
 from prompts_nested import build_annotation_prompt, build_nested_annotation_prompt
 from evaluation_prompt import build_evaluation_prompt
 from entity_length_validator import validate_entity_length, filter_entities_by_length
+from checkpoint_store import ChunkCheckpointStore, make_run_key
+from incremental_json import extract_json_values
+from entity_index import EntityKeyIndex
+from span_renderer import render_highlighted_spans
+from render_cache import HighlightRenderCache, entity_set_fingerprint
+from document_pages import PAGED_VIEW_MIN_CHARS, EntityPager, compute_page_bounds
+from document_index import get_document_index, tokenize_words
+from corpus_export import conll_spans, flatten_entities_for_conll, iter_conll_lines
+from position_corrector import (
+    correct_positions,
+    default_workers,
+    find_best_position_match,
+    try_advanced_fuzzy_match,
+    try_fuzzy_fix,
+)
 import time
 import streamlit.components.v1 as components
 import colorsys
 import html
+import os
 import re
 
 def calculate_dynamic_height(text):
@@ -25,25 +41,111 @@ def calculate_dynamic_height(text):
     
     return base_height + additional_height
 
-def display_annotated_entities_with_selection(entities_list):
+def get_highlight_render_cache():
     """
-    Display annotated entities with highlighting, tooltips, and text selection capability.
+    Render cache of the highlighted document for the current session.
+    """
+    if 'highlight_render_cache' not in st.session_state:
+        st.session_state.highlight_render_cache = HighlightRenderCache()
+    return st.session_state.highlight_render_cache
+
+def wrap_document_page(page_html, start_offset):
+    """
+    Wrap the HTML of one page of the document; start_offset lets the selection script
+    report offsets in the whole document.
+    """
+    return f'<div class="doc-page" data-offset="{start_offset}">{page_html}</div>'
+
+def render_document_pages(text, entities, label_colors, page_window, view_key):
+    """
+    Highlighted HTML of a window of consecutive pages.
     
     Args:
-        entities_list: List of entities with 'source' field indicating 'llm' or 'manual'
-    """
-    import streamlit as st
-    import streamlit.components.v1 as components
+        text (str): The full document text
+        entities (list): Entities to display
+        label_colors (dict): Label -> colour
+        page_window (tuple): (start, end) offsets of the pages to render
+        view_key (tuple): Identifies text, entities, colours and mode, to reuse the entity pager
     
-    if entities_list:
-        highlighted_html = highlight_text_with_entities_and_selection(
-            st.session_state.text_data,
-            entities_list,
-            st.session_state.label_colors
+    Returns:
+        str: The pages' HTML, each wrapped with its start offset
+    """
+    # Display entities are prepared and sorted once, then looked up per page
+    cached_pager = st.session_state.get('document_entity_pager')
+    if cached_pager is None or cached_pager[0] != view_key:
+        cached_pager = (view_key, EntityPager(prepare_display_entities(text, entities)))
+        st.session_state.document_entity_pager = cached_pager
+    pager = cached_pager[1]
+    
+    def render_open(ent):
+        return selection_open_tag(ent, label_colors)
+    
+    pages_html = []
+    for start, end in page_window:
+        page_html = render_highlighted_spans(
+            text, pager.entities_in(start, end), render_open, close_tag=SELECTION_CLOSE_TAG, bounds=(start, end)
         )
-        
-        # Create a complete HTML document with inline CSS and JavaScript for selection
-        full_html = f"""
+        pages_html.append(wrap_document_page(page_html, start))
+    return ''.join(pages_html)
+
+def remember_selection_offsets(selection_result):
+    """
+    Store the document offsets reported with a text selection, if they match the selected text.
+    """
+    start_offset = selection_result.get('startOffset')
+    end_offset = selection_result.get('endOffset')
+    text = st.session_state.text_data
+    if (isinstance(start_offset, int) and isinstance(end_offset, int)
+            and 0 <= start_offset < end_offset <= len(text)
+            and text[start_offset:end_offset] == selection_result.get('selectedText', '').strip()):
+        st.session_state.selected_start_pos = start_offset
+        st.session_state.selected_end_pos = end_offset
+    else:
+        st.session_state.selected_start_pos = -1
+        st.session_state.selected_end_pos = -1
+
+def handle_selection_message(selection_result):
+    """
+    Take a new selection posted by the document view.
+    
+    The component keeps returning its last message on every rerun, so a message is only taken
+    once. Messages are told apart by text, offsets and timestamp, so selecting the same words
+    at another place in the document still updates the stored offsets.
+    
+    Returns:
+        bool: True if the selection was new and has been stored
+    """
+    selected_text = selection_result.get('selectedText', '').strip()
+    message_key = (
+        selected_text,
+        selection_result.get('startOffset'),
+        selection_result.get('endOffset'),
+        selection_result.get('timestamp')
+    )
+    if not selected_text or message_key == st.session_state.get('last_selection_message'):
+        return False
+    st.session_state.last_selection_message = message_key
+    st.session_state.selected_text_for_annotation = selected_text
+    remember_selection_offsets(selection_result)
+    return True
+
+def get_page_bounds(text):
+    """
+    Page bounds of the current document, kept in session state so only this session's
+    document is held (not a process-wide cache of whole texts).
+    """
+    key = (hash(text), len(text))
+    cached = st.session_state.get('document_page_bounds')
+    if cached is None or cached[0] != key:
+        cached = (key, compute_page_bounds(text))
+        st.session_state.document_page_bounds = cached
+    return cached[1]
+
+def build_selection_page_html(highlighted_html):
+    """
+    Wrap highlighted document HTML in the page with the tooltip CSS and text-selection script.
+    """
+    return f"""
         <!DOCTYPE html>
         <html>
         <head>
@@ -134,7 +236,7 @@ def display_annotated_entities_with_selection(entities_list):
                     border-color: #333 transparent transparent transparent;
                 }}
                
-                .annotation-container span[data-tooltip]:hover .tooltip {{
+                .annotation-container span[data-tooltip]:hover > .tooltip {{
                     visibility: visible;
                     opacity: 1;
                 }}
@@ -161,7 +263,7 @@ def display_annotated_entities_with_selection(entities_list):
                 document.addEventListener('DOMContentLoaded', function() {{
                     const spans = document.querySelectorAll('span[data-tooltip]');
                     spans.forEach(span => {{
-                        const tooltip = span.querySelector('.tooltip');
+                        const tooltip = span.querySelector(':scope > .tooltip');
                         if (tooltip) {{
                             const label = span.getAttribute('data-tooltip');
                             const source = span.getAttribute('data-source') || 'LLM';
@@ -174,6 +276,22 @@ def display_annotated_entities_with_selection(entities_list):
                     const selectionInfo = document.getElementById('selectionInfo');
                     const selectedTextSpan = document.getElementById('selectedText');
                     
+                    // Offset in the whole document of a selection boundary: the page's start
+                    // offset plus the page text before the boundary, tooltips excluded
+                    function documentOffset(node, offset) {{
+                        const element = node.nodeType === Node.ELEMENT_NODE ? node : node.parentElement;
+                        const page = element ? element.closest('.doc-page') : null;
+                        if (!page) {{
+                            return null;
+                        }}
+                        const range = document.createRange();
+                        range.setStart(page, 0);
+                        range.setEnd(node, offset);
+                        const before = range.cloneContents();
+                        before.querySelectorAll('.tooltip').forEach(tooltip => tooltip.remove());
+                        return parseInt(page.getAttribute('data-offset'), 10) + before.textContent.length;
+                    }}
+                    
                     document.addEventListener('mouseup', function() {{
                         const selection = window.getSelection();
                         if (selection.toString().trim().length > 0) {{
@@ -181,9 +299,21 @@ def display_annotated_entities_with_selection(entities_list):
                             selectedTextSpan.textContent = selectedText;
                             selectionInfo.style.display = 'block';
                             
+                            // Global offsets of the trimmed selection
+                            const range = selection.getRangeAt(0);
+                            const rawText = selection.toString();
+                            let startOffset = documentOffset(range.startContainer, range.startOffset);
+                            let endOffset = documentOffset(range.endContainer, range.endOffset);
+                            if (startOffset !== null && endOffset !== null) {{
+                                startOffset += rawText.length - rawText.trimStart().length;
+                                endOffset -= rawText.length - rawText.trimEnd().length;
+                            }}
+                            
                             // FIXED: Proper message format for Streamlit
                             const message = {{
                                 selectedText: selectedText,
+                                startOffset: startOffset,
+                                endOffset: endOffset,
                                 timestamp: Date.now()
                             }};
                             
@@ -199,9 +329,67 @@ def display_annotated_entities_with_selection(entities_list):
         </body>
         </html>
         """
+
+def display_annotated_entities_with_selection(entities_list):
+    """
+    Display annotated entities with highlighting, tooltips, and text selection capability.
+    
+    Args:
+        entities_list: List of entities with 'source' field indicating 'llm' or 'manual'
+    """
+    import streamlit as st
+    import streamlit.components.v1 as components
+    
+    if entities_list:
+        text = st.session_state.text_data
+        
+        # Large documents are shown a few pages at a time
+        paged = len(text) > PAGED_VIEW_MIN_CHARS and st.checkbox(
+            "📄 Paged view",
+            value=True,
+            key="paged_document_view",
+            help="Render only the current page and its neighbours; recommended for large documents"
+        )
+        page_window = None
+        if paged:
+            page_bounds = get_page_bounds(text)
+            page_number = st.number_input(
+                f"Page (of {len(page_bounds)})", min_value=1, max_value=len(page_bounds), value=1, step=1,
+                key="document_view_page"
+            )
+            first_page = max(0, page_number - 2)
+            last_page = min(len(page_bounds), page_number + 1)
+            page_window = page_bounds[first_page:last_page]
+            st.caption(f"Showing characters {page_window[0][0]:,}–{page_window[-1][1]:,} of {len(text):,}")
+        
+        # Reruns that changed neither the text, the entities, the colours nor the mode reuse the page
+        render_cache = get_highlight_render_cache()
+        view_key = (
+            hash(text),
+            entity_set_fingerprint(entities_list),
+            tuple(sorted(st.session_state.label_colors.items())),
+            st.session_state.get('annotation_mode', 'Nested (Hierarchical)')
+        )
+        page_key = view_key + (page_window,)
+        full_html = render_cache.get_page(page_key)
+        if full_html is None:
+            if page_window is None:
+                highlighted_html = highlight_text_with_entities_and_selection(
+                    text,
+                    entities_list,
+                    st.session_state.label_colors,
+                    render_cache=render_cache
+                )
+                full_html = build_selection_page_html(wrap_document_page(highlighted_html, 0))
+            else:
+                full_html = build_selection_page_html(
+                    render_document_pages(text, entities_list, st.session_state.label_colors, page_window, view_key)
+                )
+            render_cache.set_page(page_key, full_html)
        
-        # Calculate dynamic height based on text length
-        dynamic_height = calculate_dynamic_height(st.session_state.text_data)
+        # Calculate dynamic height based on the length of the text shown
+        shown_text = text[page_window[0][0]:page_window[-1][1]] if page_window else text
+        dynamic_height = calculate_dynamic_height(shown_text)
         
         # Use Streamlit's HTML component to render the complete HTML - FIXED KEY
         selection_result = components.html(
@@ -214,34 +402,24 @@ def display_annotated_entities_with_selection(entities_list):
         # FIXED: Handle selection result properly
         if selection_result:
             if isinstance(selection_result, dict) and 'selectedText' in selection_result:
-                selected_text = selection_result.get('selectedText', '').strip()
-                if selected_text and selected_text != st.session_state.get('selected_text_for_annotation', ''):
-                    st.session_state.selected_text_for_annotation = selected_text
+                if handle_selection_message(selection_result):
                     st.rerun()  # Force rerun to update the input field
             elif isinstance(selection_result, str):
                 # Sometimes the result comes as a string
                 try:
                     import json
                     result_dict = json.loads(selection_result)
-                    selected_text = result_dict.get('selectedText', '').strip()
-                    if selected_text and selected_text != st.session_state.get('selected_text_for_annotation', ''):
-                        st.session_state.selected_text_for_annotation = selected_text
+                    if handle_selection_message(result_dict):
                         st.rerun()
                 except:
                     pass  # Ignore parsing errors
 
 
-def highlight_text_with_entities_and_selection(text: str, entities: list, label_colors: dict) -> str:
+def prepare_display_entities(text: str, entities: list) -> list:
     """
-    Enhanced version that handles both LLM and manual annotations with different styling.
-    Also properly handles nested entities when in nested mode.
-    Uses character positions instead of text search for accuracy.
+    Entities to display, with verified (or corrected) character positions.
+    In nested mode, nested entities are added as separate display entities.
     """
-    import html
-    used_positions = set()
-    highlighted = []
-    last_pos = 0
-    
     # Check annotation mode to determine how to handle entities
     is_nested_mode = st.session_state.get('annotation_mode', 'Nested (Hierarchical)') == "Nested (Hierarchical)"
 
@@ -305,78 +483,84 @@ def highlight_text_with_entities_and_selection(text: str, entities: list, label_
                         ent_copy["end_char"] = corrected_positions[1]
                         valid_entities.append(ent_copy)
 
-    sorted_entities = sorted(valid_entities, key=lambda x: x.get("start_char", 0))
+    return valid_entities
 
-    for ent in sorted_entities:
-        start_char = ent["start_char"]
-        end_char = ent["end_char"]
-        span = ent["text"]
-        label = ent["label"]
-        source = ent.get("source", "llm")
-        is_nested = ent.get("is_nested", False)
-        color = label_colors.get(label, "#e0e0e0")  # fallback if missing
-
-        # Check for overlapping positions
-        if any(i in used_positions for i in range(start_char, end_char)):
-            continue
-
-        # Add text before this entity
-        highlighted.append(html.escape(text[last_pos:start_char]))
-        
-        # Different styling for different types of annotations
-        additional_class = ""
-        border_style = ""
-        
-        if source == "manual":
-            additional_class = "manual-annotation"
-            manual_color = "#ffeb3b"  # Yellow for manual
-            border_style = "2px solid #f57f17"
-        elif source == "manual_auto":
-            additional_class = "manual-annotation auto-detected"
-            manual_color = "#ff9800"  # Orange for auto-detected from manual
-            border_style = "2px dashed #e65100"
-        elif source == "auto_detected":
-            additional_class = "llm-annotation auto-detected"
-            manual_color = "#4caf50"  # Green for auto-detected from LLM
-            border_style = "2px dashed #2e7d32"
-        else:
-            # LLM annotations - use tag-based colors and differentiate nested vs parent
-            manual_color = color  # Use the tag-based color from label_colors
-            if is_nested:
-                additional_class = "nested-entity"
-                border_style = "2px dotted #666"
-            else:
-                additional_class = "parent-entity"
-                border_style = f"2px solid {color}"
-        
-        # Create tooltip text with additional info
-        tooltip_text = label
+def selection_open_tag(ent: dict, label_colors: dict) -> str:
+    """
+    Opening HTML of an entity highlight in the selectable document view.
+    """
+    import html
+    
+    label = ent["label"]
+    source = ent.get("source", "llm")
+    is_nested = ent.get("is_nested", False)
+    color = label_colors.get(label, "#e0e0e0")  # fallback if missing
+
+    # Different styling for different types of annotations
+    additional_class = ""
+    border_style = ""
+    
+    if source == "manual":
+        additional_class = "manual-annotation"
+        manual_color = "#ffeb3b"  # Yellow for manual
+        border_style = "2px solid #f57f17"
+    elif source == "manual_auto":
+        additional_class = "manual-annotation auto-detected"
+        manual_color = "#ff9800"  # Orange for auto-detected from manual
+        border_style = "2px dashed #e65100"
+    elif source == "auto_detected":
+        additional_class = "llm-annotation auto-detected"
+        manual_color = "#4caf50"  # Green for auto-detected from LLM
+        border_style = "2px dashed #2e7d32"
+    else:
+        # LLM annotations - use tag-based colors and differentiate nested vs parent
+        manual_color = color  # Use the tag-based color from label_colors
         if is_nested:
-            parent_text = ent.get('parent_text', 'Unknown')
-            tooltip_text += f" (nested in: {parent_text[:30]}...)" if len(parent_text) > 30 else f" (nested in: {parent_text})"
-        elif source == "manual":
-            tooltip_text += " (Manual)"
-        elif source == "manual_auto":
-            tooltip_text += " (Auto-detected from manual)"
-        elif source == "auto_detected":
-            tooltip_text += " (Auto-detected from LLM)"
-        
-        # Add the highlighted entity
-        highlighted.append(
-            f'<span class="{additional_class}" style="background-color: {manual_color}; font-weight: bold; padding: 2px 4px; '
-            f'border-radius: 3px; cursor: help; display: inline-block; '
-            f'border: {border_style};" '
-            f'data-tooltip="{html.escape(tooltip_text)}" data-source="{source.upper()}">'
-            f'{html.escape(span)}<span class="tooltip"></span></span>'
-        )
-        
-        used_positions.update(range(start_char, end_char))
-        last_pos = end_char
+            additional_class = "nested-entity"
+            border_style = "2px dotted #666"
+        else:
+            additional_class = "parent-entity"
+            border_style = f"2px solid {color}"
+    
+    # Create tooltip text with additional info
+    tooltip_text = label
+    if is_nested:
+        parent_text = ent.get('parent_text', 'Unknown')
+        tooltip_text += f" (nested in: {parent_text[:30]}...)" if len(parent_text) > 30 else f" (nested in: {parent_text})"
+    elif source == "manual":
+        tooltip_text += " (Manual)"
+    elif source == "manual_auto":
+        tooltip_text += " (Auto-detected from manual)"
+    elif source == "auto_detected":
+        tooltip_text += " (Auto-detected from LLM)"
+    
+    return (
+        f'<span class="{additional_class}" style="background-color: {manual_color}; font-weight: bold; padding: 2px 4px; '
+        f'border-radius: 3px; cursor: help; display: inline-block; '
+        f'border: {border_style};" '
+        f'data-tooltip="{html.escape(tooltip_text)}" data-source="{source.upper()}">'
+    )
+
+SELECTION_CLOSE_TAG = '<span class="tooltip"></span></span>'
+
+def highlight_text_with_entities_and_selection(text: str, entities: list, label_colors: dict, render_cache=None) -> str:
+    """
+    Enhanced version that handles both LLM and manual annotations with different styling.
+    Also properly handles nested entities when in nested mode.
+    Uses character positions instead of text search for accuracy.
+    Overlapping annotations (e.g. nested entities) are rendered inside the span they start in.
+    With a render_cache, only the parts of the document whose entities changed are re-rendered.
+    """
+    is_nested_mode = st.session_state.get('annotation_mode', 'Nested (Hierarchical)') == "Nested (Hierarchical)"
+    valid_entities = prepare_display_entities(text, entities)
 
-    # Append any remaining text after all entities
-    highlighted.append(html.escape(text[last_pos:]))
+    def render_open(ent):
+        return selection_open_tag(ent, label_colors)
 
-    return ''.join(highlighted)
+    if render_cache is not None:
+        context = (tuple(sorted(label_colors.items())), is_nested_mode)
+        return render_cache.render(text, valid_entities, render_open, SELECTION_CLOSE_TAG, context)
+    return render_highlighted_spans(text, valid_entities, render_open, close_tag=SELECTION_CLOSE_TAG)
 
 def generate_label_colors(tag_list):
     """
@@ -404,16 +588,81 @@ def estimate_tokens(text):
     """
     return len(text) // 4
 
-def display_processing_summary(text, tag_df, chunk_size, temperature, max_tokens, model_provider, model):
+# Context window (prompt + completion tokens) for the models offered in the sidebar
+MODEL_CONTEXT_WINDOWS = {
+    "gpt-4o-mini": 128000,
+    "gpt-4o": 128000,
+    "gpt-4": 8192,
+    "gpt-3.5-turbo": 16385,
+    "claude-3-7-sonnet-20250219": 200000,
+    "claude-3-5-haiku-20241022": 200000,
+}
+
+# Custom token counters registered per model name (callable: text -> int)
+TOKEN_COUNTERS = {}
+
+def register_token_counter(model, count_tokens):
+    """
+    Register a custom tokenizer for a model. count_tokens must take a string and return an int.
+    """
+    TOKEN_COUNTERS[model] = count_tokens
+
+_tiktoken_counters = {}
+
+def get_token_counter(provider, model):
+    """
+    Get a function that counts tokens for the selected model.
+    
+    Uses a registered custom counter if one exists, otherwise tiktoken (exact for OpenAI
+    models, a close approximation for Claude). Falls back to the estimate_tokens heuristic
+    when tiktoken or its encoding files are not available (e.g. offline).
+    """
+    if model in TOKEN_COUNTERS:
+        return TOKEN_COUNTERS[model]
+    
+    if model in _tiktoken_counters:
+        return _tiktoken_counters[model]
+    
+    count_tokens = estimate_tokens
+    try:
+        import tiktoken
+        try:
+            encoding = tiktoken.encoding_for_model(model) if provider == "OpenAI" else tiktoken.get_encoding("cl100k_base")
+        except KeyError:
+            encoding = tiktoken.get_encoding("cl100k_base")
+        count_tokens = lambda text: len(encoding.encode(text, disallowed_special=()))
+    except Exception:
+        # tiktoken not installed or encoding files could not be downloaded
+        pass
+    
+    _tiktoken_counters[model] = count_tokens
+    return count_tokens
+
+def get_chunk_token_budget(tag_df, token_budget, max_tokens, count_tokens):
+    """
+    Number of tokens left for the chunk text once the prompt template and the completion
+    (max_tokens) are taken out of the total per-request token budget.
+    """
+    prompt_overhead = count_tokens(build_chunk_prompt(tag_df, ""))
+    return max(100, token_budget - prompt_overhead - max_tokens)
+
+def display_processing_summary(text, tag_df, chunk_size, temperature, max_tokens, model_provider, model, token_budget=None):
     """
     Display a comprehensive summary of processing parameters
     """
+    count_tokens = get_token_counter(model_provider, model)
+    
     # Use overlapping chunks for processing
-    chunks_with_overlap = chunk_text(text, chunk_size)
-    simple_chunks = chunk_text_simple(text, chunk_size)
+    chunks_with_overlap = plan_chunks(text, tag_df, chunk_size, max_tokens, token_budget, count_tokens)
     
     # Calculate overlap statistics
-    overlap_size = max(50, chunk_size // 10)
+    if token_budget:
+        chunk_tokens = get_chunk_token_budget(tag_df, token_budget, max_tokens, count_tokens)
+        chunk_size_label = f"{chunk_tokens:,} tokens"
+        overlap_size_label = f"~{max(12, chunk_tokens // 10):,} tokens"
+    else:
+        chunk_size_label = f"{chunk_size:,} chars"
+        overlap_size_label = f"{max(50, chunk_size // 10):,} chars"
     total_chunk_chars = sum(len(chunk[0]) for chunk in chunks_with_overlap)
     overlap_chars = total_chunk_chars - len(text) if total_chunk_chars > len(text) else 0
     
@@ -424,14 +673,14 @@ def display_processing_summary(text, tag_df, chunk_size, temperature, max_tokens
     
     with col1:
         st.metric("Text Length", f"{len(text):,} chars", help="Total number of characters in the input text")
-        st.metric("Estimated Tokens", f"{estimate_tokens(text):,}", help="Approximate number of tokens (1 token ≈ 4 characters)")
+        st.metric("Estimated Tokens", f"{count_tokens(text):,}", help="Number of tokens for the selected model (1 token ≈ 4 characters when no tokenizer is available)")
     
     with col2:
         st.metric("Number of Chunks", len(chunks_with_overlap), help="Text will be split into this many overlapping chunks")
-        st.metric("Chunk Size", f"{chunk_size:,} chars", help="Target characters per chunk")
+        st.metric("Chunk Size", chunk_size_label, help="Target size of the text in each chunk")
     
     with col3:
-        st.metric("Overlap Size", f"{overlap_size:,} chars", help="Characters overlapping between adjacent chunks")
+        st.metric("Overlap Size", overlap_size_label, help="Text overlapping between adjacent chunks")
         st.metric("Total Tags", len(tag_df), help="Number of annotation tags available")
     
     with col4:
@@ -466,7 +715,7 @@ def display_processing_summary(text, tag_df, chunk_size, temperature, max_tokens
                 "Start": start_offset,
                 "End": end_offset,
                 "Characters": len(chunk_text_content),
-                "Est. Tokens": estimate_tokens(chunk_text_content),
+                "Est. Tokens": count_tokens(chunk_text_content),
                 "Preview": chunk_text_content[:100] + "..." if len(chunk_text_content) > 100 else chunk_text_content
             })
         
@@ -567,22 +816,37 @@ def display_chunk_progress_with_overlap(current_chunk, total_chunks, chunk_text,
     preview = chunk_text[:200] + "..." if len(chunk_text) > 200 else chunk_text
     st.caption(f"📝 **Chunk Preview:** {preview}")
 
-def remove_overlapping_duplicates(all_entities, processed_chunks):
+def remove_overlapping_duplicates(all_entities, processed_chunks, tolerance=5, return_stats=False):
     """
     Remove duplicate entities that appear in overlapping regions between chunks.
     
+    An entity is a duplicate of an already kept entity with the same normalized text
+    and label whose start and end are both within tolerance characters. Entities are
+    swept in (start, end) order with one sliding window per (text, label) bucket, so
+    only kept entities starting within tolerance of the current one are compared.
+    
     Args:
         all_entities (list): All entities from all chunks
         processed_chunks (list): Information about each processed chunk
+        tolerance (int): Maximum start/end difference for near-duplicates
+        return_stats (bool): Also return removal counters
     
     Returns:
         list: Deduplicated entities
+        (with return_stats) tuple: (deduplicated entities, stats) where stats has
+            'removed' and 'per_boundary' {chunk index: duplicates removed in its overlap
+            with the previous chunk}; duplicates outside any overlap count as 'other'
     """
+    stats = {'removed': 0, 'per_boundary': {}, 'other': 0}
     if len(processed_chunks) <= 1:
-        return all_entities
+        return (all_entities, stats) if return_stats else all_entities
+    
+    from bisect import bisect_right
+    from collections import deque
     
+    chunk_starts = [chunk['start_offset'] for chunk in processed_chunks]
     deduplicated = []
-    seen_entities = set()
+    windows = {}
     
     # Sort entities by start position for consistent processing
     sorted_entities = sorted(all_entities, key=lambda x: (x.get('start_char', 0), x.get('end_char', 0)))
@@ -590,29 +854,29 @@ def remove_overlapping_duplicates(all_entities, processed_chunks):
     for entity in sorted_entities:
         start_char = entity.get('start_char', 0)
         end_char = entity.get('end_char', 0)
-        text = entity.get('text', '').strip().lower()
-        label = entity.get('label', '')
-        
-        # Create a unique identifier for this entity
-        entity_id = (start_char, end_char, text, label)
-        
-        # Skip if we've already seen this exact entity
-        if entity_id in seen_entities:
+        bucket = (entity.get('text', '').strip().lower(), entity.get('label', ''))
+        
+        # Kept entities of this bucket, in start order; drop those too far behind to match
+        window = windows.get(bucket)
+        if window is None:
+            window = windows[bucket] = deque()
+        while window and window[0][0] < start_char - tolerance:
+            window.popleft()
+        
+        if any(abs(end_char - seen_end) <= tolerance for _, seen_end in window):
+            stats['removed'] += 1
+            i = bisect_right(chunk_starts, start_char) - 1
+            if i >= 1 and start_char < processed_chunks[i - 1]['end_offset']:
+                boundary = processed_chunks[i]['chunk_index']
+                stats['per_boundary'][boundary] = stats['per_boundary'].get(boundary, 0) + 1
+            else:
+                stats['other'] += 1
             continue
         
-        # Check for near-duplicate entities (same text and label, very close positions)
-        is_duplicate = False
-        for seen_start, seen_end, seen_text, seen_label in seen_entities:
-            if (text == seen_text and label == seen_label and
-                abs(start_char - seen_start) <= 5 and abs(end_char - seen_end) <= 5):
-                is_duplicate = True
-                break
-        
-        if not is_duplicate:
-            deduplicated.append(entity)
-            seen_entities.add(entity_id)
+        deduplicated.append(entity)
+        window.append((start_char, end_char))
     
-    return deduplicated
+    return (deduplicated, stats) if return_stats else deduplicated
 
 
 # Dynamic token calculation based on chunk size
@@ -628,55 +892,112 @@ def get_token_recommendations(chunk_size):
     else:
         return 1000, 3000, 1800
     
-def chunk_text(text: str, chunk_size: int, overlap_size: int = None):
+# Sentence ends (punctuation + whitespace before a likely sentence start) and paragraph breaks
+SENTENCE_BOUNDARY_PATTERN = re.compile(r'[.!?]["\')\]]*\s+(?=["\'(\[A-Z0-9])|\n\s*\n\s*')
+
+def build_sentence_index(text: str, max_span: int = None):
     """
-    Splits text into chunks of approximately chunk_size characters with optional overlap.
-    Tries to split on newline or space to avoid cutting words abruptly.
+    Build a sorted array of sentence/paragraph boundary offsets in one pass over the text.
+    
+    The array starts with 0 and ends with len(text); consecutive entries delimit one
+    sentence (or paragraph break). If max_span is given, sentences longer than max_span
+    characters get extra boundaries at word breaks so that every unit fits.
     
     Args:
-        text (str): Text to chunk
-        chunk_size (int): Target size for each chunk
-        overlap_size (int): Number of characters to overlap between chunks (default: 10% of chunk_size)
+        text (str): Text to index
+        max_span (int): Optional maximum length of a unit in characters
+    
+    Returns:
+        list: Sorted boundary offsets
+    """
+    boundaries = [0]
+    for match in SENTENCE_BOUNDARY_PATTERN.finditer(text):
+        if match.end() > boundaries[-1]:
+            boundaries.append(match.end())
+    if boundaries[-1] != len(text):
+        boundaries.append(len(text))
+    
+    if not max_span:
+        return boundaries
+    
+    # Split overly long sentences at the last space that keeps each piece within max_span
+    split_boundaries = [0]
+    for end in boundaries[1:]:
+        start = split_boundaries[-1]
+        while end - start > max_span:
+            split_pos = text.rfind(' ', start + 1, start + max_span)
+            if split_pos == -1:
+                split_pos = start + max_span  # fallback hard cut
+            else:
+                split_pos += 1
+            split_boundaries.append(split_pos)
+            start = split_pos
+        split_boundaries.append(end)
+    return split_boundaries
+
+def pack_sentence_chunks(text, boundaries, sizes, max_size, overlap_size):
+    """
+    Pack whole sentences into chunks using prefix sums of the unit sizes.
+    
+    Args:
+        text (str): Source text
+        boundaries (list): Boundary offsets from build_sentence_index
+        sizes (list): Size of each unit (boundaries[k]..boundaries[k+1]) in the chunk budget's unit
+        max_size (int): Maximum total size of a chunk
+        overlap_size (int): Maximum size of whole sentences repeated at the start of the next chunk
     
     Returns:
         list: List of tuples (chunk_text, start_offset, end_offset)
     """
-    if overlap_size is None:
-        overlap_size = max(50, chunk_size // 10)  # Default: 10% overlap, minimum 50 chars
+    from bisect import bisect_left, bisect_right
     
-    chunks = []
-    start = 0
-    length = len(text)
+    # prefix[k] is the total size of units before boundary k
+    prefix = [0]
+    for size in sizes:
+        prefix.append(prefix[-1] + size)
     
-    while start < length:
-        end = start + chunk_size
-        if end >= length:
+    unit_count = len(boundaries) - 1
+    chunks = []
+    i = 0
+    while i < unit_count:
+        # Furthest boundary j such that units i..j-1 fit in max_size (always take at least one unit)
+        j = max(i + 1, bisect_right(prefix, prefix[i] + max_size) - 1)
+        start_offset = boundaries[i]
+        end_offset = boundaries[j]
+        if j >= unit_count:
             # Last chunk - no overlap needed
-            chunks.append((text[start:], start, length))
+            chunks.append((text[start_offset:], start_offset, end_offset))
             break
-            
-        # Try to split on last newline before end
-        split_pos = text.rfind('\n', start, end)
-        if split_pos == -1 or split_pos <= start:
-            split_pos = text.rfind(' ', start, end)
-        if split_pos == -1 or split_pos <= start:
-            split_pos = end  # fallback hard cut
-
-        chunk_text = text[start:split_pos].strip()
-        chunks.append((chunk_text, start, split_pos))
-        
-        # FIXED: Next chunk starts with overlap, but ensure we advance by a reasonable amount
-        next_start = split_pos - overlap_size
-        
-        # Ensure we advance by at least 25% of chunk_size to prevent infinite loops
-        min_advance = max(chunk_size // 4, 100)
-        if next_start <= start + min_advance:
-            next_start = start + min_advance
+        chunks.append((text[start_offset:end_offset].rstrip(), start_offset, end_offset))
         
-        start = next_start
+        # Overlap: the trailing whole sentences whose total size fits in overlap_size,
+        # while still advancing by at least one unit
+        k = bisect_left(prefix, prefix[j] - overlap_size) if overlap_size > 0 else j
+        i = max(k, i + 1)
     
     return chunks
 
+def chunk_text(text: str, chunk_size: int, overlap_size: int = None):
+    """
+    Splits text into chunks of at most chunk_size characters made of whole sentences,
+    with an overlap of whole sentences between consecutive chunks.
+    Sentences longer than chunk_size are split on spaces to avoid cutting words abruptly.
+    
+    Args:
+        text (str): Text to chunk
+        chunk_size (int): Target size for each chunk
+        overlap_size (int): Maximum number of characters to overlap between chunks (default: 10% of chunk_size)
+    
+    Returns:
+        list: List of tuples (chunk_text, start_offset, end_offset)
+    """
+    if overlap_size is None:
+        overlap_size = max(50, chunk_size // 10)  # Default: 10% overlap, minimum 50 chars
+    
+    boundaries = build_sentence_index(text, max_span=chunk_size)
+    sizes = [boundaries[k + 1] - boundaries[k] for k in range(len(boundaries) - 1)]
+    return pack_sentence_chunks(text, boundaries, sizes, chunk_size, overlap_size)
+
 def chunk_text_simple(text: str, chunk_size: int):
     """
     Legacy simple chunking function for backward compatibility.
@@ -701,6 +1022,44 @@ def chunk_text_simple(text: str, chunk_size: int):
         start = split_pos
     return chunks
 
+def chunk_text_by_tokens(text: str, max_chunk_tokens: int, count_tokens=None, overlap_tokens: int = None):
+    """
+    Splits text into chunks of whole sentences that each fit in max_chunk_tokens tokens,
+    with an overlap of whole sentences between consecutive chunks.
+    Each sentence is tokenized once; chunk boundaries come from prefix sums of the counts.
+    
+    Args:
+        text (str): Text to chunk
+        max_chunk_tokens (int): Token budget for the chunk text of each request
+        count_tokens (callable): Tokenizer returning the token count of a string (default: estimate_tokens)
+        overlap_tokens (int): Maximum tokens to overlap between chunks (default: 10% of max_chunk_tokens)
+    
+    Returns:
+        list: List of tuples (chunk_text, start_offset, end_offset), same as chunk_text
+    """
+    if count_tokens is None:
+        count_tokens = estimate_tokens
+    if overlap_tokens is None:
+        overlap_tokens = max(12, max_chunk_tokens // 10)
+    
+    # A token covers at least about one character, so units of max_chunk_tokens characters fit the budget
+    boundaries = build_sentence_index(text, max_span=max_chunk_tokens)
+    sizes = [count_tokens(text[boundaries[k]:boundaries[k + 1]]) for k in range(len(boundaries) - 1)]
+    return pack_sentence_chunks(text, boundaries, sizes, max_chunk_tokens, overlap_tokens)
+
+def plan_chunks(text, tag_df, chunk_size, max_tokens=None, token_budget=None, count_tokens=None):
+    """
+    Chunk the text for annotation. When token_budget is given, chunks are packed to the
+    per-request token budget (prompt + chunk + completion); otherwise the character-based
+    chunk_text is used.
+    """
+    if token_budget:
+        if count_tokens is None:
+            count_tokens = estimate_tokens
+        chunk_tokens = get_chunk_token_budget(tag_df, token_budget, max_tokens or 0, count_tokens)
+        return chunk_text_by_tokens(text, chunk_tokens, count_tokens)
+    return chunk_text(text, chunk_size)
+
 def aggregate_entities(all_entities, offset):
     """
     Adjust entity character positions by offset (chunk start position in full text).
@@ -741,20 +1100,11 @@ def find_correct_position(text, expected_text, approximate_start):
         actual_end = actual_start + len(expected_text)
         return (actual_start, actual_end)
     
-    # If not found in window, try finding all occurrences and pick the closest
-    all_positions = find_all_occurrences(text, expected_text)
-    if all_positions:
-        # Find the position closest to the approximate start
-        closest_pos = min(all_positions, key=lambda x: abs(x[0] - approximate_start))
-        return closest_pos
-    
-    return None
+    # If not found in window, pick the occurrence closest to the approximate start
+    return get_document_index(text).nearest_occurrence(expected_text, approximate_start)
 
 def highlight_text_with_entities(text: str, entities: list, label_colors: dict) -> str:
     import html
-    used_positions = set()
-    highlighted = []
-    last_pos = 0
 
     # Filter entities that have valid character positions and sort by start position
     valid_entities = []
@@ -776,38 +1126,17 @@ def highlight_text_with_entities(text: str, entities: list, label_colors: dict)
                     ent_copy["end_char"] = corrected_positions[1]
                     valid_entities.append(ent_copy)
 
-    sorted_entities = sorted(valid_entities, key=lambda x: x.get("start_char", 0))
-
-    for ent in sorted_entities:
-        start_char = ent["start_char"]
-        end_char = ent["end_char"]
-        span = ent["text"]
+    def render_open(ent):
         label = ent["label"]
         color = label_colors.get(label, "#e0e0e0")  # fallback if missing
-
-        # Check for overlapping positions
-        if any(i in used_positions for i in range(start_char, end_char)):
-            continue
-
-        # Add text before this entity
-        highlighted.append(html.escape(text[last_pos:start_char]))
-        
-        # Add the highlighted entity
-        highlighted.append(
+        return (
             f'<span style="background-color: {color}; font-weight: bold; padding: 2px 4px; '
             f'border-radius: 3px; cursor: help; display: inline-block; '
             f'border: 1px solid {color};" '
             f'data-tooltip="{html.escape(label)}">'
-            f'{html.escape(span)}</span>'
         )
-        
-        used_positions.update(range(start_char, end_char))
-        last_pos = end_char
-
-    # Append any remaining text after all entities
-    highlighted.append(html.escape(text[last_pos:]))
 
-    return ''.join(highlighted)
+    return render_highlighted_spans(text, valid_entities, render_open)
 
 def display_annotated_entities():
     """
@@ -881,7 +1210,7 @@ def display_annotated_entities():
                     border-color: #333 transparent transparent transparent;
                 }}
                
-                .annotation-container span[data-tooltip]:hover .tooltip {{
+                .annotation-container span[data-tooltip]:hover > .tooltip {{
                     visibility: visible;
                     opacity: 1;
                 }}
@@ -896,7 +1225,7 @@ def display_annotated_entities():
                 document.addEventListener('DOMContentLoaded', function() {{
                     const spans = document.querySelectorAll('span[data-tooltip]');
                     spans.forEach(span => {{
-                        const tooltip = span.querySelector('.tooltip');
+                        const tooltip = span.querySelector(':scope > .tooltip');
                         if (tooltip) {{
                             tooltip.textContent = span.getAttribute('data-tooltip');
                         }}
@@ -1109,44 +1438,118 @@ def validate_annotations_streamlit(text, entities):
     return validation_results
 
 def find_all_occurrences(text, pattern):
-    """Find all occurrences of pattern in text with enhanced matching"""
-    positions = []
-    start = 0
+    """
+    Find all occurrences of pattern in text with enhanced matching:
+    exact matches, else case-insensitive matches, else matches ignoring whitespace differences
+    (and then case too). Positions always refer to the original text.
+    Lookups go through the per-document index, so repeated calls do not rescan the text.
+    """
+    return list(get_document_index(text).occurrences(pattern))
+
+# Boundary tests matching the regex semantics used for similar-word search (IGNORECASE)
+SHORT_PATTERN_LETTER = re.compile(r'[a-zA-Z]', re.IGNORECASE)
+WORD_CHAR = re.compile(r'\w')
+SHORT_PATTERN_SEPARATORS = '.,;:!?()[]{}"\'-='
+
+
+# Letters that re.IGNORECASE treats as equal to an ASCII letter but str.lower() does not
+CASE_INSENSITIVE_FIXES = str.maketrans({'\u0130': 'i', '\u0131': 'i', '\u017f': 's'})
+
+
+def lower_preserving_length(text):
+    """
+    Lowercase text the way re.IGNORECASE compares characters, without changing its
+    length, so offsets into the lowered text are valid in the original.
+    """
+    text = text.translate(CASE_INSENSITIVE_FIXES)
+    lowered = text.lower()
+    if len(lowered) == len(text):
+        return lowered
+    return ''.join(ch.lower() if len(ch.lower()) == 1 else ch for ch in text)
+
+
+def find_similar_words_for_patterns(text, patterns):
+    """
+    Find all case-insensitive occurrences of many patterns in a single pass over the text.
     
-    # Strategy 1: Exact match
-    while True:
-        pos = text.find(pattern, start)
-        if pos == -1:
-            break
-        positions.append((pos, pos + len(pattern)))
-        start = pos + 1
-    
-    # Strategy 2: If no exact matches, try case-insensitive
-    if not positions:
-        text_lower = text.lower()
-        pattern_lower = pattern.lower()
-        start = 0
-        while True:
-            pos = text_lower.find(pattern_lower, start)
-            if pos == -1:
-                break
-            positions.append((pos, pos + len(pattern)))
-            start = pos + 1
-    
-    # Strategy 3: If still no matches, try normalized whitespace
-    if not positions:
-        normalized_pattern = ' '.join(pattern.split())
-        normalized_text = ' '.join(text.split())
-        start = 0
-        while True:
-            pos = normalized_text.find(normalized_pattern, start)
-            if pos == -1:
-                break
-            # Convert back to original text positions (approximate)
-            positions.append((pos, pos + len(normalized_pattern)))
-            start = pos + 1
-    
-    return positions
+    Every distinct pattern is added to one Aho–Corasick automaton, and the boundary
+    rules of find_similar_words_case_insensitive are applied to each occurrence:
+    - patterns of 1-3 characters must not touch letters, and must be surrounded by
+      whitespace, punctuation or the string boundaries
+    - hyphenated words and phrases must not touch word characters
+    - other words must sit on word boundaries
+    Matches of one pattern do not overlap each other (leftmost first, as with re.finditer).
+    
+    Args:
+        text (str): The text to search
+        patterns (list): Patterns to find
+    
+    Returns:
+        dict: pattern -> list of (start_char, end_char, actual_text_found)
+    """
+    from aho_corasick import AhoCorasickAutomaton
+    
+    # Patterns that differ only in case share one automaton entry
+    variants = {}
+    for pattern in patterns:
+        if pattern:
+            variants.setdefault(lower_preserving_length(pattern), []).append(pattern)
+    keys = list(variants)
+    
+    starts = [[] for _ in keys]
+    automaton = AhoCorasickAutomaton(keys)
+    for start_pos, _, index in automaton.iter_matches(lower_preserving_length(text)):
+        starts[index].append(start_pos)
+    
+    def is_word_char(pos):
+        return 0 <= pos < len(text) and WORD_CHAR.match(text[pos]) is not None
+    
+    results = {}
+    for index, key in enumerate(keys):
+        pattern = variants[key][0]
+        length = len(key)
+        is_short = len(pattern.strip()) <= 3
+        is_phrase = '-' in pattern or ' ' in pattern
+        
+        matches = []
+        last_end = 0
+        for start_pos in starts[index]:
+            end_pos = start_pos + length
+            if start_pos < last_end:
+                continue
+            
+            if is_short:
+                # For short patterns like "pH", "CO", "UV", do not match within alphabetic sequences
+                if start_pos > 0 and SHORT_PATTERN_LETTER.match(text[start_pos - 1]):
+                    continue
+                if end_pos < len(text) and SHORT_PATTERN_LETTER.match(text[end_pos]):
+                    continue
+            elif is_phrase:
+                # Hyphenated words or phrases must not sit inside a word
+                if is_word_char(start_pos - 1) or is_word_char(end_pos):
+                    continue
+            else:
+                # Regular single words need word boundaries on both sides
+                if is_word_char(start_pos - 1) == is_word_char(start_pos):
+                    continue
+                if is_word_char(end_pos - 1) == is_word_char(end_pos):
+                    continue
+            last_end = end_pos
+            
+            if is_short:
+                # Only accept standalone scientific terms surrounded by whitespace,
+                # punctuation, or string boundaries
+                before_char = text[start_pos - 1] if start_pos > 0 else ' '
+                after_char = text[end_pos] if end_pos < len(text) else ' '
+                if not ((before_char.isspace() or before_char in SHORT_PATTERN_SEPARATORS) and
+                        (after_char.isspace() or after_char in SHORT_PATTERN_SEPARATORS)):
+                    continue
+            matches.append((start_pos, end_pos, text[start_pos:end_pos]))
+        
+        for pattern in variants[key]:
+            results[pattern] = matches
+    
+    return results
 
 def find_similar_words_case_insensitive(text, pattern):
     """
@@ -1154,50 +1557,9 @@ def find_similar_words_case_insensitive(text, pattern):
     Uses word boundaries to avoid matching substrings within larger words.
     Returns list of tuples with (start_char, end_char, actual_text_found).
     """
-    import re
-    
-    # Escape special regex characters in the pattern
-    escaped_pattern = re.escape(pattern)
-    
-    # For very short patterns (1-3 characters), be more strict about word boundaries
-    # This prevents matching substrings within larger words
-    if len(pattern.strip()) <= 3:
-        # For short patterns like "pH", "CO", "UV", etc., use strict word boundaries
-        # Also check that we're not matching within larger alphabetic sequences
-        regex_pattern = re.compile(r'(?<![a-zA-Z])' + escaped_pattern + r'(?![a-zA-Z])', re.IGNORECASE)
-    else:
-        # For longer patterns, check if it looks like a compound word or phrase
-        if '-' in pattern or ' ' in pattern:
-            # For hyphenated words or phrases, don't require strict word boundaries
-            # but ensure we're not matching within words
-            regex_pattern = re.compile(r'(?<!\w)' + escaped_pattern + r'(?!\w)', re.IGNORECASE)
-        else:
-            # For regular single words, use word boundaries
-            regex_pattern = re.compile(r'\b' + escaped_pattern + r'\b', re.IGNORECASE)
-    
-    matches = []
-    for match in regex_pattern.finditer(text):
-        start_pos = match.start()
-        end_pos = match.end()
-        matched_text = text[start_pos:end_pos]
-        
-        # Additional validation for short patterns to avoid false positives
-        if len(pattern.strip()) <= 3:
-            # Check if this looks like a standalone scientific term
-            # by examining the surrounding context
-            before_char = text[start_pos - 1] if start_pos > 0 else ' '
-            after_char = text[end_pos] if end_pos < len(text) else ' '
-            
-            # Allow if surrounded by whitespace, punctuation, or string boundaries
-            if (before_char.isspace() or before_char in '.,;:!?()[]{}"\'-=' or start_pos == 0) and \
-               (after_char.isspace() or after_char in '.,;:!?()[]{}"\'-=' or end_pos == len(text)):
-                matches.append((start_pos, end_pos, matched_text))
-        else:
-            matches.append((start_pos, end_pos, matched_text))
-    
-    return matches
+    return find_similar_words_for_patterns(text, [pattern]).get(pattern, [])
 
-def create_annotations_for_similar_words(text, word_to_find, label, existing_annotations=None, source_type='manual_auto'):
+def create_annotations_for_similar_words(text, word_to_find, label, existing_annotations=None, source_type='manual_auto', similar_matches=None):
     """
     Create annotations for all similar words (case-insensitive) found in text.
     
@@ -1205,36 +1567,25 @@ def create_annotations_for_similar_words(text, word_to_find, label, existing_ann
         text (str): The source text to search in
         word_to_find (str): The word/phrase to find similar instances of
         label (str): The label to assign to all found instances
-        existing_annotations (list): List of existing annotations to avoid duplicates
+        existing_annotations (list or EntityKeyIndex): Existing annotations to avoid duplicates
         source_type (str): Source type for new annotations ('auto_detected' or 'manual_auto')
+        similar_matches (list): Precomputed occurrences of word_to_find, if already searched
     
     Returns:
         list: List of new annotation dictionaries
     """
-    if existing_annotations is None:
-        existing_annotations = []
+    if not isinstance(existing_annotations, EntityKeyIndex):
+        existing_annotations = EntityKeyIndex(existing_annotations)
     
     # Find all similar words (case-insensitive)
-    similar_matches = find_similar_words_case_insensitive(text, word_to_find)
+    if similar_matches is None:
+        similar_matches = find_similar_words_case_insensitive(text, word_to_find)
     
     new_annotations = []
     
     for start_pos, end_pos, matched_text in similar_matches:
-        # Check if this position already has an annotation
-        overlap_found = False
-        for existing in existing_annotations:
-            existing_start = existing.get('start_char', 0)
-            existing_end = existing.get('end_char', 0)
-            existing_label = existing.get('label', '')
-            existing_text = existing.get('text', '')
-            
-            # Check for exact duplicate (same position, label, and text)
-            if (start_pos == existing_start and end_pos == existing_end and 
-                label == existing_label and matched_text.lower() == existing_text.lower()):
-                overlap_found = True
-                break
-                
-        if not overlap_found:
+        # Skip exact duplicates (same position, label, and text)
+        if not existing_annotations.has_exact(start_pos, end_pos, label, matched_text):
             annotation = {
                 'start_char': start_pos,
                 'end_char': end_pos,
@@ -1268,6 +1619,15 @@ def auto_detect_similar_words_for_llm_annotations(text, llm_entities):
         'by_label': {}
     }
     
+    # Index of all current annotations (LLM + auto-detected so far), extended as words are found
+    existing_index = EntityKeyIndex(llm_entities)
+    
+    # Locate every distinct entity string in one pass over the text
+    matches_by_pattern = find_similar_words_for_patterns(text, [
+        entity.get('text', '').strip() for entity in llm_entities
+        if isinstance(entity, dict) and entity.get('label', '')
+    ])
+    
     # Process each LLM entity to find similar words
     with st.status("🔍 Auto-detecting similar words...", expanded=False) as status:
         for i, entity in enumerate(llm_entities):
@@ -1282,16 +1642,16 @@ def auto_detect_similar_words_for_llm_annotations(text, llm_entities):
             
             # st.write(f"Searching for words similar to: '{entity_text}' ({entity_label})")
             
-            # Get all current annotations (LLM + any existing auto-detected)
-            all_existing = llm_entities + auto_detected
-            
             # Find similar words for this entity
             similar_annotations = create_annotations_for_similar_words(
-                text, entity_text, entity_label, all_existing, 'auto_detected'
+                text, entity_text, entity_label, existing_index, 'auto_detected',
+                similar_matches=matches_by_pattern.get(entity_text, [])
             )
             
             if similar_annotations:
                 auto_detected.extend(similar_annotations)
+                for annotation in similar_annotations:
+                    existing_index.add(annotation)
                 stats['entities_with_similar_words'] += 1
                 stats['total_similar_words_found'] += len(similar_annotations)
                 
@@ -1319,19 +1679,12 @@ def auto_detect_similar_words_for_llm_annotations(text, llm_entities):
     
     # Additional safeguard: Remove any duplicates that might have slipped through
     # This ensures no entity appears in both LLM and auto-detected lists
-    filtered_auto_detected = []
-    for auto_entity in auto_detected:
-        is_duplicate = False
-        for llm_entity in llm_entities:
-            if (auto_entity['start_char'] == llm_entity['start_char'] and 
-                auto_entity['end_char'] == llm_entity['end_char'] and
-                auto_entity['label'] == llm_entity['label'] and
-                auto_entity['text'].lower() == llm_entity['text'].lower()):
-                is_duplicate = True
-                break
-        
-        if not is_duplicate:
-            filtered_auto_detected.append(auto_entity)
+    llm_index = EntityKeyIndex(llm_entities)
+    filtered_auto_detected = [
+        auto_entity for auto_entity in auto_detected
+        if not llm_index.has_exact(auto_entity['start_char'], auto_entity['end_char'],
+                                   auto_entity['label'], auto_entity['text'])
+    ]
     
     if len(filtered_auto_detected) != len(auto_detected):
         removed_count = len(auto_detected) - len(filtered_auto_detected)
@@ -1339,115 +1692,30 @@ def auto_detect_similar_words_for_llm_annotations(text, llm_entities):
     
     return filtered_auto_detected, stats
 
-def try_fuzzy_fix(text, expected_text, original_start, original_end):
-    """Try to fix common annotation errors"""
-    # Try removing/adding whitespace
-    variations = [
-        expected_text.strip(),
-        expected_text.lstrip(),
-        expected_text.rstrip(),
-        ' ' + expected_text,
-        expected_text + ' ',
-        ' ' + expected_text + ' '
-    ]
-    
-    for variation in variations:
-        positions = find_all_occurrences(text, variation)
-        if positions:
-            # Return the closest match to original position
-            closest = min(positions, key=lambda x: abs(x[0] - original_start))
-            return closest
-    
-    # Try case variations
-    case_variations = [
-        expected_text.lower(),
-        expected_text.upper(),
-        expected_text.capitalize()
-    ]
-    
-    for variation in case_variations:
-        positions = find_all_occurrences(text, variation)
-        if positions:
-            closest = min(positions, key=lambda x: abs(x[0] - original_start))
-            return closest
-    
-    return None
-
 def correct_annotation_positions(text, entities, verbose=False):
     """
     Comprehensive function to correct annotation positions.
     
     This function addresses the core issue where character positions don't match the actual text.
-    It uses multiple strategies to find the correct positions.
+    It uses multiple strategies to find the correct positions; the work is done by the
+    UI-free batch corrector and only the summary is rendered here.
     
     Args:
         text (str): The full source text
         entities (list): List of entity dictionaries with potentially incorrect positions
-        verbose (bool): Whether to print detailed information about corrections
+        verbose (bool): Whether to display a summary of the corrections
     
     Returns:
         list: Corrected entities with accurate start_char and end_char
     """
-    corrected_entities = []
-    correction_stats = {
-        'total': len(entities),
-        'already_correct': 0,
-        'corrected': 0,
-        'failed': 0
-    }
-    
     if verbose:
         st.write(f"🔧 Correcting positions for {len(entities)} annotations...")
-        progress_bar = st.progress(0)
-        status_text = st.empty()
     
-    for i, entity in enumerate(entities):
-        if verbose:
-            progress_bar.progress((i + 1) / len(entities))
-            status_text.text(f"Processing: {entity.get('text', 'N/A')[:50]}...")
-        
-        expected_text = entity.get('text', '')
-        start_char = entity.get('start_char')
-        end_char = entity.get('end_char')
-        
-        if not expected_text or start_char is None or end_char is None:
-            if verbose:
-                st.warning(f"Skipping entity with missing data: {entity}")
-            corrected_entities.append(entity)
-            correction_stats['failed'] += 1
-            continue
-        
-        # Strategy 1: Check if current position is already correct
-        if (start_char >= 0 and end_char <= len(text) and 
-            start_char < end_char and text[start_char:end_char] == expected_text):
-            corrected_entities.append(entity)
-            correction_stats['already_correct'] += 1
-            continue
-        
-        # Strategy 2: Search for exact text match
-        correct_position = find_best_position_match(text, expected_text, start_char)
-        
-        if correct_position:
-            corrected_entity = entity.copy()
-            corrected_entity['start_char'] = correct_position[0]
-            corrected_entity['end_char'] = correct_position[1]
-            corrected_entities.append(corrected_entity)
-            correction_stats['corrected'] += 1
-            
-            if verbose:
-                st.info(f"✅ Corrected '{expected_text}': {start_char}-{end_char} → {correct_position[0]}-{correct_position[1]}")
-        else:
-            # Keep original if we can't find a better position
-            corrected_entities.append(entity)
-            correction_stats['failed'] += 1
-            
-            if verbose:
-                st.error(f"❌ Could not correct '{expected_text}' at position {start_char}-{end_char}")
+    corrected_entities, correction_stats = correct_positions(
+        text, entities, method='best_match', workers=default_workers(text)
+    )
     
     if verbose:
-        progress_bar.empty()
-        status_text.empty()
-        
         # Display correction statistics
         st.success(f"✅ Correction complete!")
         col1, col2, col3, col4 = st.columns(4)
@@ -1455,46 +1723,34 @@ def correct_annotation_positions(text, entities, verbose=False):
         col2.metric("Already Correct", correction_stats['already_correct'])
         col3.metric("Corrected", correction_stats['corrected'])
         col4.metric("Failed", correction_stats['failed'])
+        render_correction_details(entities, correction_stats)
     
     return corrected_entities
 
-def find_best_position_match(text, expected_text, approximate_start):
+def render_correction_details(entities, correction_stats, max_rows=200):
     """
-    Find the best matching position for expected_text in the source text.
+    Show the individual corrections and failures of a batch correction in an expander.
     
     Args:
-        text (str): The full source text
-        expected_text (str): The text we're looking for
-        approximate_start (int): The approximate starting position from annotation
-    
-    Returns:
-        tuple: (start, end) positions if found, None otherwise
-    """
-    # Strategy 1: Exact match near the approximate position
-    window_size = 100  # Search within 100 characters of the original position
-    search_start = max(0, approximate_start - window_size)
-    search_end = min(len(text), approximate_start + len(expected_text) + window_size)
-    
-    search_region = text[search_start:search_end]
-    found_pos = search_region.find(expected_text)
-    
-    if found_pos != -1:
-        actual_start = search_start + found_pos
-        actual_end = actual_start + len(expected_text)
-        return (actual_start, actual_end)
-    
-    # Strategy 2: Find all occurrences and pick the closest to approximate_start
-    all_positions = find_all_occurrences(text, expected_text)
-    if all_positions:
-        closest = min(all_positions, key=lambda pos: abs(pos[0] - approximate_start))
-        return closest
-    
-    # Strategy 3: Try fuzzy matching (handle whitespace issues, etc.)
-    fuzzy_match = try_advanced_fuzzy_match(text, expected_text, approximate_start)
-    if fuzzy_match:
-        return fuzzy_match
-    
-    return None
+        entities (list): The entities as they were before correction
+        correction_stats (dict): Stats returned by correct_positions
+        max_rows (int): Maximum number of corrections/failures listed
+    """
+    corrections = correction_stats['corrections']
+    failed_indices = correction_stats['failed_indices']
+    if not corrections and not failed_indices:
+        return
+    
+    with st.expander(f"📋 Correction details ({len(corrections)} corrected, {len(failed_indices)} failed)"):
+        lines = []
+        for entity_index, (old_start, old_end), (new_start, new_end) in corrections[:max_rows]:
+            lines.append(f"- ✅ '{entities[entity_index].get('text', '')}': {old_start}-{old_end} → {new_start}-{new_end}")
+        for entity_index in failed_indices[:max_rows]:
+            entity = entities[entity_index]
+            lines.append(f"- ❌ '{entity.get('text', '')}' at position {entity.get('start_char')}-{entity.get('end_char')}")
+        st.markdown("\n".join(lines))
+        if len(corrections) > max_rows or len(failed_indices) > max_rows:
+            st.caption(f"Showing the first {max_rows} corrections and failures.")
 
 def debug_annotation_positions(text, entities, verbose=True):
     """
@@ -1614,49 +1870,6 @@ def debug_annotation_positions(text, entities, verbose=True):
     
     return debug_results
 
-def try_advanced_fuzzy_match(text, expected_text, approximate_start):
-    """
-    Advanced fuzzy matching to handle common annotation issues.
-    Enhanced to detect LLM hallucinations and phantom annotations.
-    """
-    # Check if this might be a phantom annotation (words exist but not as contiguous text)
-    words = expected_text.split()
-    if len(words) > 1:
-        # Check if all words exist in text but not as a contiguous phrase
-        all_words_exist = all(word in text for word in words)
-        contiguous_exists = expected_text in text
-        
-        if all_words_exist and not contiguous_exists:
-            # This is likely a phantom annotation - LLM combined separate concepts
-            return None
-    
-    # Remove extra whitespace and try again
-    normalized_expected = ' '.join(expected_text.split())
-    
-    # Try variations with different whitespace handling
-    variations = [
-        expected_text.strip(),
-        normalized_expected,
-        expected_text.replace('\n', ' '),
-        expected_text.replace('\t', ' '),
-    ]
-    
-    window_size = 200
-    search_start = max(0, approximate_start - window_size)
-    search_end = min(len(text), approximate_start + len(expected_text) + window_size)
-    search_region = text[search_start:search_end]
-    
-    for variation in variations:
-        if variation and variation != expected_text:
-            found_pos = search_region.find(variation)
-            if found_pos != -1:
-                actual_start = search_start + found_pos
-                actual_end = actual_start + len(variation)
-                # Update the expected text to match what we actually found
-                return (actual_start, actual_end)
-    
-    return None
-
 def detect_phantom_annotations(text, entities):
     """
     Detect phantom annotations - cases where LLM created compound phrases 
@@ -1676,13 +1889,17 @@ def detect_phantom_annotations(text, entities):
         'suspicious_patterns': []
     }
     
+    # Built once: exact checks are index lookups, word checks are set lookups
+    index = get_document_index(text)
+    word_index = index.words()
+    
     for i, entity in enumerate(entities):
         expected_text = entity.get('text', '').strip()
         if not expected_text:
             continue
         
         # Check if the exact text exists in source
-        if expected_text in text:
+        if index.contains(expected_text):
             phantom_analysis['valid_annotations'].append({
                 'index': i,
                 'entity': entity,
@@ -1701,9 +1918,9 @@ def detect_phantom_annotations(text, entities):
         }
         
         # Check 1: All words exist but not contiguously
-        if len(words) > 1:
-            words_in_text = [word for word in words if word in text]
-            if len(words_in_text) == len(words):
+        tokens = tokenize_words(expected_text)
+        if len(words) > 1 and len(tokens) > 1:
+            if word_index.has_all(tokens) and not word_index.contains_phrase(tokens):
                 analysis['issues'].append('words_exist_separately')
                 analysis['status'] = 'phantom_combination'
         
@@ -1720,7 +1937,7 @@ def detect_phantom_annotations(text, entities):
             # Check if these appear separately in text
             parts_exist_separately = False
             for combo in ['drug delivery', 'magnetic', 'phase change', 'release system']:
-                if combo in expected_text.lower() and combo in text.lower():
+                if combo in expected_text.lower() and word_index.contains_phrase(tokenize_words(combo)):
                     parts_exist_separately = True
                     break
             
@@ -1760,7 +1977,8 @@ def detect_phantom_annotations(text, entities):
 def fix_annotation_positions_streamlit(text, entities, strategy='closest'):
     """
     Automatically fix annotation positions by searching for the text.
-    Modified for Streamlit integration.
+    Modified for Streamlit integration: the batch corrector does the work and
+    only the summary is rendered.
     
     Args:
         text (str): The source text
@@ -1770,98 +1988,23 @@ def fix_annotation_positions_streamlit(text, entities, strategy='closest'):
     Returns:
         tuple: (fixed_entities, stats)
     """
-    
-    fixed_entities = []
-    stats = {
-        'total': len(entities),
-        'already_correct': 0,
-        'fixed': 0,
-        'unfixable': 0,
-        'multiple_matches': 0
-    }
-    
     st.write(f"🔧 Attempting to fix {len(entities)} annotations...")
     
-    # Create progress bar for fixing
-    fix_progress = st.progress(0)
-    fix_status = st.empty()
+    fixed_entities, correction_stats = correct_positions(
+        text, entities, method=strategy, workers=default_workers(text)
+    )
     
-    for i, entity in enumerate(entities):
-        # Update progress
-        fix_progress.progress((i + 1) / len(entities))
-        fix_status.text(f"Processing entity {i+1}/{len(entities)}: '{entity.get('text', 'N/A')}'")
-        
-        expected_text = entity.get('text')
-        start_char = entity.get('start_char')
-        end_char = entity.get('end_char')
-        
-        # Skip entities with missing required fields
-        if None in [expected_text, start_char, end_char]:
-            fixed_entities.append(entity)
-            stats['unfixable'] += 1
-            continue
-        
-        # Check if current position is correct
-        try:
-            if start_char >= 0 and end_char <= len(text) and text[start_char:end_char] == expected_text:
-                fixed_entities.append(entity)
-                stats['already_correct'] += 1
-                continue
-        except:
-            pass
-        
-        # Try to find the text in the document
-        found_positions = find_all_occurrences(text, expected_text)
-        
-        if not found_positions:
-            # Try fuzzy matching for common issues
-            fixed_pos = try_fuzzy_fix(text, expected_text, start_char, end_char)
-            if fixed_pos:
-                entity_copy = entity.copy()
-                entity_copy['start_char'] = fixed_pos[0]
-                entity_copy['end_char'] = fixed_pos[1]
-                fixed_entities.append(entity_copy)
-                stats['fixed'] += 1
-            else:
-                # Text not found, keep original but mark as unfixable
-                fixed_entities.append(entity)
-                stats['unfixable'] += 1
-        elif len(found_positions) == 1:
-            # Only one match found, use it
-            new_start, new_end = found_positions[0]
-            entity_copy = entity.copy()
-            entity_copy['start_char'] = new_start
-            entity_copy['end_char'] = new_end
-            fixed_entities.append(entity_copy)
-            stats['fixed'] += 1
-        else:
-            # Multiple matches found
-            stats['multiple_matches'] += 1
-            
-            if strategy == 'closest':
-                # Choose the closest to original position
-                closest_pos = min(found_positions, key=lambda x: abs(x[0] - start_char))
-                entity_copy = entity.copy()
-                entity_copy['start_char'] = closest_pos[0]
-                entity_copy['end_char'] = closest_pos[1]
-                fixed_entities.append(entity_copy)
-                stats['fixed'] += 1
-            elif strategy == 'first':
-                # Use the first occurrence
-                first_pos = found_positions[0]
-                entity_copy = entity.copy()
-                entity_copy['start_char'] = first_pos[0]
-                entity_copy['end_char'] = first_pos[1]
-                fixed_entities.append(entity_copy)
-                stats['fixed'] += 1
-    
-    # Clear progress indicators
-    fix_progress.empty()
-    fix_status.empty()
+    stats = {
+        'total': correction_stats['total'],
+        'already_correct': correction_stats['already_correct'],
+        'fixed': correction_stats['corrected'],
+        'unfixable': correction_stats['failed'],
+        'multiple_matches': correction_stats['multiple_matches']
+    }
+    render_correction_details(entities, correction_stats)
     
     return fixed_entities, stats
 
-
 def evaluate_annotations_with_llm(entities, tag_df, client, temperature=0.1, max_tokens=2000):
     """
     Use LLM to evaluate whether annotations match their label definitions.
@@ -1964,65 +2107,26 @@ def parse_evaluation_response(response_text: str, batch_idx: int = None) -> list
     
     response_text = response_text.strip()
     
-    try:
-        # Method 1: Try direct JSON parsing first
-        evaluations = json.loads(response_text)
+    # Single pass over the response for JSON values (handles code fences and surrounding prose)
+    extraction = extract_json_values(response_text)
+    
+    for value in extraction['values']:
+        evaluations = value
+        if isinstance(value, dict) and not is_valid_evaluation_object(value):
+            # Accept an array wrapped in an object, e.g. {"evaluations": [...]}
+            evaluations = next((v for v in value.values() if isinstance(v, list)), None)
         if isinstance(evaluations, list):
             valid_evaluations = validate_evaluation_structure(evaluations)
             if valid_evaluations:
                 return valid_evaluations
-        else:
-            st.warning(f"Evaluation response is not a list: {type(evaluations)}")
-            
-    except json.JSONDecodeError:
-        pass
-    
-    # Method 2: Try to extract JSON from markdown code blocks
-    try:
-        import re
-        
-        # Look for JSON content between ```json and ``` or ``` and ```
-        json_patterns = [
-            r'```json\s*(\[.*?\])\s*```',
-            r'```\s*(\[.*?\])\s*```',
-            r'(\[(?:[^[\]]*|\[[^[\]]*\])*\])'  # Find any JSON array
-        ]
-        
-        for pattern in json_patterns:
-            matches = re.findall(pattern, response_text, re.DOTALL)
-            for match in matches:
-                try:
-                    evaluations = json.loads(match.strip())
-                    if isinstance(evaluations, list):
-                        valid_evaluations = validate_evaluation_structure(evaluations)
-                        if valid_evaluations:
-                            st.info(f"Recovered {len(valid_evaluations)} evaluations using pattern matching")
-                            return valid_evaluations
-                except json.JSONDecodeError:
-                    continue
-                    
-    except Exception as e:
-        st.warning(f"Pattern matching failed: {e}")
     
-    # Method 3: Try to find and parse individual JSON objects
-    try:
-        import re
-        json_objects = re.findall(r'\{[^{}]*(?:\{[^{}]*\}[^{}]*)*\}', response_text)
-        entities = []
-        for obj_str in json_objects:
-            try:
-                obj = json.loads(obj_str)
-                if is_valid_evaluation_object(obj):
-                    entities.append(obj)
-            except:
-                continue
-        
-        if entities:
-            st.info(f"Recovered {len(entities)} evaluations from individual JSON objects")
-            return entities
-                
-    except Exception:
-        pass
+    # Individual evaluation objects, including ones salvaged from truncated output
+    candidates = [v for v in extraction['values'] if isinstance(v, dict)] + extraction['salvaged']
+    recovered = [obj for obj in candidates if is_valid_evaluation_object(obj)]
+    if recovered:
+        st.info(f"Recovered {len(recovered)} evaluations from individual JSON objects "
+                f"({extraction['recovered_chars']:,} of {len(response_text):,} characters parsed)")
+        return recovered
     
     # Final fallback: Log error and return empty
     st.error(f"❌ Failed to parse evaluation response for batch {batch_idx if batch_idx is not None else 'unknown'}")
@@ -2107,22 +2211,11 @@ def identify_duplicate_llm_annotations(llm_entities, auto_detected_entities):
         'unique_kept': 0
     }
     
+    auto_index = EntityKeyIndex(auto_detected_entities)
+    
     for llm_entity in llm_entities:
-        llm_text = llm_entity.get('text', '').strip().lower()
-        llm_label = llm_entity.get('label', '')
-        
-        # Check if this LLM entity has an auto-detected counterpart
-        has_auto_detected = False
-        for auto_entity in auto_detected_entities:
-            auto_text = auto_entity.get('text', '').strip().lower()
-            auto_label = auto_entity.get('label', '')
-            
-            # Match by text and label (case-insensitive text comparison)
-            if llm_text == auto_text and llm_label == auto_label:
-                has_auto_detected = True
-                break
-        
-        if has_auto_detected:
+        # Match by text and label (case-insensitive text comparison)
+        if auto_index.has_text_label(llm_entity):
             entities_to_delete.append(llm_entity)
             stats['has_duplicates'] += 1
         else:
@@ -2203,16 +2296,17 @@ def apply_evaluation_recommendations(entities, evaluations, selected_indices):
     return updated_entities, changes_made
 
 
-def parse_llm_response(response_text: str, chunk_index: int = None):
+def parse_llm_response(response_text: str, chunk_index: int = None, with_status: bool = False):
     """
     Parse the JSON returned by LLM with improved error handling.
     Returns list of entities preserving nested structure when annotation_mode is nested.
     Includes validation to filter out overly long entities.
-    """
-    # Define maximum entity length (in characters) to prevent over-annotation
-    MAX_ENTITY_LENGTH = 100  # Reasonable limit for scientific entities
-    MAX_WORD_COUNT = 10      # Maximum number of words in an entity
     
+    The response is scanned once for JSON values, so prose or code fences around the
+    array are ignored and complete entities are salvaged from truncated output.
+    With with_status=True, returns (entities, complete) where complete is True only if
+    a JSON array was parsed and the response was not truncated.
+    """
     # Log the raw response for debugging
     if chunk_index is not None:
         st.write(f"**Debug - Chunk {chunk_index} Raw Response:**")
@@ -2222,313 +2316,318 @@ def parse_llm_response(response_text: str, chunk_index: int = None):
     # Check if response is empty or None
     if not response_text or response_text.strip() == "":
         st.warning(f"⚠️ Empty response from LLM for chunk {chunk_index if chunk_index else 'unknown'}")
-        return []
+        return ([], False) if with_status else []
     
     # Clean the response text
     response_text = response_text.strip()
     
-    def validate_entity_length(entity_text, entity_type="main"):
-        """Validate entity length and word count"""
-        if not entity_text:
-            return False, "Empty text"
-        
-        # Check character length
-        if len(entity_text) > MAX_ENTITY_LENGTH:
-            return False, f"Too long ({len(entity_text)} chars > {MAX_ENTITY_LENGTH})"
-        
-        # Check word count
-        word_count = len(entity_text.split())
-        if word_count > MAX_WORD_COUNT:
-            return False, f"Too many words ({word_count} > {MAX_WORD_COUNT})"
-        
-        # Check if it looks like a sentence (contains sentence-ending punctuation)
-        sentence_indicators = ['. ', '? ', '! ']
-        if any(indicator in entity_text for indicator in sentence_indicators):
-            return False, "Contains sentence structure"
+    extraction = extract_json_values(response_text)
+    if not extraction['values'] and not extraction['salvaged']:
+        st.error(f"Failed to parse LLM output JSON for chunk {chunk_index if chunk_index else 'unknown'}")
+        st.error(f"Raw response preview: {response_text[:200]}...")
+        return ([], False) if with_status else []
+    
+    # Entity objects from every top-level array, bare top-level objects,
+    # and objects salvaged from truncated or malformed arrays
+    entities = []
+    for value in extraction['values']:
+        if isinstance(value, list):
+            entities.extend(value)
+        else:
+            entities.append(value)
+    entities.extend(extraction['salvaged'])
+    
+    if extraction['salvaged'] or extraction['truncated'] or extraction['failed']:
+        st.info(f"Recovered {len(entities)} entities from malformed response "
+                f"({extraction['recovered_chars']:,} of {len(response_text):,} characters parsed)")
+    
+    # Apply entity length filtering to prevent over-annotation
+    filtered_entities, filtered_count = filter_entities_by_length(entities, chunk_index)
+    
+    if filtered_count > 0:
+        st.info(f"Filtered out {filtered_count} overly long entities that appeared to be sentences or phrases")
+    
+    # Check annotation mode to determine processing strategy: nested mode keeps children on
+    # their parent and as separate entities, flat mode only as separate entities
+    is_nested_mode = st.session_state.get('annotation_mode', 'Nested (Hierarchical)') == "Nested (Hierarchical)"
+    
+    valid_entities = []
+    for ent in filtered_entities:
+        converted = llm_object_to_entities(ent, is_nested_mode)
+        if not converted and is_nested_mode:
+            st.warning(f"Invalid entity structure: {ent}")
+        valid_entities.extend(converted)
+    if with_status:
+        complete = not extraction['truncated'] and any(isinstance(value, list) for value in extraction['values'])
+        return valid_entities, complete
+    return valid_entities
+
+
+
+def build_chunk_prompt(tag_df, chunk_text_content):
+    """
+    Build the annotation prompt for a single chunk based on the current annotation mode.
+    """
+    if st.session_state.annotation_mode == "Nested (Hierarchical)":
+        return build_nested_annotation_prompt(tag_df, chunk_text_content)
+    return build_annotation_prompt(tag_df, chunk_text_content)
+
+
+def display_chunk_result(chunk_number, entities, overlap_msg=""):
+    """
+    Show the per-chunk completion message with nested/flat entity counts.
+    """
+    if st.session_state.annotation_mode == "Nested (Hierarchical)":
+        # Count entities with nesting
+        entities_with_nesting = len([e for e in entities if e.get('nested_entities')])
+        total_nested_children = sum(len(e.get('nested_entities', [])) for e in entities)
         
-        return True, "Valid"
+        if entities_with_nesting > 0:
+            st.success(f"✅ Chunk {chunk_number} completed! Found {len(entities)} entities ({entities_with_nesting} with nested children, {total_nested_children} total nested entities){overlap_msg}")
+        else:
+            st.success(f"✅ Chunk {chunk_number} completed! Found {len(entities)} entities (no nesting found in this chunk){overlap_msg}")
+    else:
+        # Flat mode - count parent and child entities separately
+        parent_count = len([e for e in entities if 'parent_entity' not in e])
+        nested_count = len([e for e in entities if 'parent_entity' in e])
+        st.success(f"✅ Chunk {chunk_number} completed! Found {len(entities)} entities ({parent_count} main, {nested_count} nested as separate entities){overlap_msg}")
+
+
+def get_chunk_overlap_message(chunks_with_overlap, i):
+    """
+    Describe how many characters chunk i shares with the previous chunk.
+    """
+    if i == 0:
+        return ""
+    start_offset = chunks_with_overlap[i][1]
+    prev_end_offset = chunks_with_overlap[i - 1][2]
+    if start_offset < prev_end_offset:
+        return f" | 🔗 {prev_end_offset - start_offset} chars overlap with previous chunk"
+    return ""
+
+
+def generate_chunk_responses_concurrently(client, prompts, temperature, max_tokens, max_workers):
+    """
+    Send chunk prompts to the LLM using a bounded thread pool.
     
+    Yields (chunk_index, response) pairs as soon as each call finishes, so the
+    caller can report progress per chunk. Results arrive in completion order;
+    the caller is responsible for putting them back into chunk order.
+    
+    Args:
+        client: LLMClient instance (its generate method must be thread-safe)
+        prompts (list): One prompt per chunk
+        temperature (float): Sampling temperature
+        max_tokens (int): Maximum tokens per response
+        max_workers (int): Maximum number of in-flight requests
+    """
+    from concurrent.futures import ThreadPoolExecutor, as_completed
+    import threading
+    from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
+    
+    # Attach the Streamlit script context to worker threads so st.error/st.warning
+    # calls made inside client.generate still render in the app
+    script_ctx = get_script_run_ctx()
+    
+    def attach_script_ctx():
+        add_script_run_ctx(threading.current_thread(), script_ctx)
+    
+    executor = ThreadPoolExecutor(max_workers=max_workers, initializer=attach_script_ctx)
     try:
-        # Method 1: Try direct JSON parsing first
-        entities = json.loads(response_text)
-        if isinstance(entities, list):
-            # Apply entity length filtering to prevent over-annotation
-            filtered_entities, filtered_count = filter_entities_by_length(entities, chunk_index)
-            
-            if filtered_count > 0:
-                st.info(f"Filtered out {filtered_count} overly long entities that appeared to be sentences or phrases")
-            
-            # Check annotation mode to determine processing strategy
-            is_nested_mode = st.session_state.get('annotation_mode', 'Nested (Hierarchical)') == "Nested (Hierarchical)"
-            
-            if is_nested_mode:
-                # Preserve nested structure for nested mode AND create separate entities for nested items
-                valid_entities = []
-                for ent in filtered_entities:
-                    if isinstance(ent, dict) and all(key in ent for key in ["start_char", "end_char", "text", "label"]):
-                        # Add the main entity with preserved nested structure
-                        main_entity = {
-                            'start_char': ent['start_char'],
-                            'end_char': ent['end_char'],
-                            'text': ent['text'],
-                            'label': ent['label'],
-                            'source': 'llm'
-                        }
-                        
-                        # Preserve nested entities if they exist
-                        if 'nested_entities' in ent and isinstance(ent['nested_entities'], list):
-                            valid_nested = []
-                            for nested_ent in ent['nested_entities']:
-                                if isinstance(nested_ent, dict) and all(key in nested_ent for key in ["start_char", "end_char", "text", "label"]):
-                                    # Validate that nested entity is within parent boundaries
-                                    if (nested_ent['start_char'] >= main_entity['start_char'] and 
-                                        nested_ent['end_char'] <= main_entity['end_char'] and
-                                        nested_ent['start_char'] < nested_ent['end_char']):
-                                        
-                                        # Add nested entity info to parent
-                                        valid_nested.append({
-                                            'start_char': nested_ent['start_char'],
-                                            'end_char': nested_ent['end_char'],
-                                            'text': nested_ent['text'],
-                                            'label': nested_ent['label']
-                                        })
-                                        
-                                        # ALSO create a separate entity for the nested item
-                                        nested_entity = {
-                                            'start_char': nested_ent['start_char'],
-                                            'end_char': nested_ent['end_char'],
-                                            'text': nested_ent['text'],
-                                            'label': nested_ent['label'],
-                                            'source': 'llm',
-                                            'parent_entity': main_entity['text'],
-                                            'is_nested': True
-                                        }
-                                        valid_entities.append(nested_entity)
-                                #     else:
-                                #         st.warning(f"Skipped nested entity outside parent boundaries: {nested_ent['text']} not within {main_entity['text']}")
-                                # else:
-                                #     st.warning(f"Invalid nested entity structure: {nested_ent}")
-                            
-                            if valid_nested:
-                                main_entity['nested_entities'] = valid_nested
-                            else:
-                                main_entity['nested_entities'] = []
-                        else:
-                            main_entity['nested_entities'] = []
-                        
-                        valid_entities.append(main_entity)
-                    else:
-                        st.warning(f"Invalid entity structure: {ent}")
-                return valid_entities
-            else:
-                # Flatten entities for flat mode (original behavior)
-                valid_entities = []
-                for ent in filtered_entities:
-                    if isinstance(ent, dict) and all(key in ent for key in ["start_char", "end_char", "text", "label"]):
-                        # Add the main entity
-                        main_entity = {
-                            'start_char': ent['start_char'],
-                            'end_char': ent['end_char'],
-                            'text': ent['text'],
-                            'label': ent['label'],
-                            'source': 'llm'
-                        }
-                        valid_entities.append(main_entity)
-                        
-                        # Process nested entities as separate flat entities
-                        if 'nested_entities' in ent and isinstance(ent['nested_entities'], list):
-                            for nested_ent in ent['nested_entities']:
-                                if isinstance(nested_ent, dict) and all(key in nested_ent for key in ["start_char", "end_char", "text", "label"]):
-                                    # Validate that nested entity is within parent boundaries
-                                    if (nested_ent['start_char'] >= main_entity['start_char'] and 
-                                        nested_ent['end_char'] <= main_entity['end_char'] and
-                                        nested_ent['start_char'] < nested_ent['end_char']):
-                                        
-                                        nested_entity = {
-                                            'start_char': nested_ent['start_char'],
-                                            'end_char': nested_ent['end_char'],
-                                            'text': nested_ent['text'],
-                                            'label': nested_ent['label'],
-                                            'source': 'llm',
-                                            'parent_entity': main_entity['text']  # Reference to parent
-                                        }
-                                        valid_entities.append(nested_entity)
-                                #     else:
-                                #         st.warning(f"Skipped nested entity outside parent boundaries: {nested_ent['text']} not within {main_entity['text']}")
-                                # else:
-                                #     st.warning(f"Invalid nested entity structure: {nested_ent}")
-                    # else:
-                    #     st.warning(f"Invalid entity structure: {ent}")
-                return valid_entities
-        else:
-            st.warning(f"Response is not a list: {type(entities)}")
-            return []
-            
-    except json.JSONDecodeError:
-        # Method 2: Try to extract JSON array from text
-        try:
-            first_bracket = response_text.find('[')
-            last_bracket = response_text.rfind(']')
-            
-            if first_bracket == -1 or last_bracket == -1 or first_bracket >= last_bracket:
-                raise ValueError("No valid JSON array found")
-                
-            json_str = response_text[first_bracket:last_bracket+1]
-            entities = json.loads(json_str)
-            
-            # Apply entity length filtering to prevent over-annotation
-            filtered_entities, filtered_count = filter_entities_by_length(entities, chunk_index)
-            
-            if filtered_count > 0:
-                st.info(f"Filtered out {filtered_count} overly long entities that appeared to be sentences or phrases")
-            
-            # Check annotation mode for processing strategy
-            is_nested_mode = st.session_state.get('annotation_mode', 'Nested (Hierarchical)') == "Nested (Hierarchical)"
+        futures = {
+            executor.submit(client.generate, prompt, temperature=temperature, max_tokens=max_tokens): i
+            for i, prompt in enumerate(prompts)
+        }
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+    finally:
+        # On a rerun/stop (or an early close) drop the queued calls instead of waiting for
+        # every remaining chunk to be sent and billed
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def llm_object_to_entities(ent, is_nested_mode):
+    """
+    Convert one entity object from the LLM response into entity dicts.
+    
+    The main entity is returned together with a separate entity for each valid
+    nested child. In nested mode the children are also kept on the parent under
+    'nested_entities'.
+    
+    Args:
+        ent (dict): Entity object as returned by the LLM
+        is_nested_mode (bool): Whether the app is in nested annotation mode
+    
+    Returns:
+        list: Entity dicts (empty if the object lacks required keys)
+    """
+    required_keys = ["start_char", "end_char", "text", "label"]
+    if not isinstance(ent, dict) or not all(key in ent for key in required_keys):
+        return []
+    
+    main_entity = {
+        'start_char': ent['start_char'],
+        'end_char': ent['end_char'],
+        'text': ent['text'],
+        'label': ent['label'],
+        'source': 'llm'
+    }
+    entities = []
+    valid_nested = []
+    
+    if isinstance(ent.get('nested_entities'), list):
+        for nested_ent in ent['nested_entities']:
+            if not (isinstance(nested_ent, dict) and all(key in nested_ent for key in required_keys)):
+                continue
+            # Nested entity must lie within its parent
+            if not (nested_ent['start_char'] >= main_entity['start_char'] and
+                    nested_ent['end_char'] <= main_entity['end_char'] and
+                    nested_ent['start_char'] < nested_ent['end_char']):
+                continue
             
+            valid_nested.append({
+                'start_char': nested_ent['start_char'],
+                'end_char': nested_ent['end_char'],
+                'text': nested_ent['text'],
+                'label': nested_ent['label']
+            })
+            nested_entity = {
+                'start_char': nested_ent['start_char'],
+                'end_char': nested_ent['end_char'],
+                'text': nested_ent['text'],
+                'label': nested_ent['label'],
+                'source': 'llm',
+                'parent_entity': main_entity['text']
+            }
             if is_nested_mode:
-                # Preserve nested structure for nested mode AND create separate entities for nested items
-                valid_entities = []
-                for ent in filtered_entities:
-                    if isinstance(ent, dict) and all(key in ent for key in ["start_char", "end_char", "text", "label"]):
-                        # Add the main entity with preserved nested structure
-                        main_entity = {
-                            'start_char': ent['start_char'],
-                            'end_char': ent['end_char'],
-                            'text': ent['text'],
-                            'label': ent['label'],
-                            'source': 'llm'
-                        }
-                        
-                        # Preserve nested entities if they exist
-                        if 'nested_entities' in ent and isinstance(ent['nested_entities'], list):
-                            valid_nested = []
-                            for nested_ent in ent['nested_entities']:
-                                if isinstance(nested_ent, dict) and all(key in nested_ent for key in ["start_char", "end_char", "text", "label"]):
-                                    # Validate that nested entity is within parent boundaries
-                                    if (nested_ent['start_char'] >= main_entity['start_char'] and 
-                                        nested_ent['end_char'] <= main_entity['end_char'] and
-                                        nested_ent['start_char'] < nested_ent['end_char']):
-                                        
-                                        # Add nested entity info to parent
-                                        valid_nested.append({
-                                            'start_char': nested_ent['start_char'],
-                                            'end_char': nested_ent['end_char'],
-                                            'text': nested_ent['text'],
-                                            'label': nested_ent['label']
-                                        })
-                                        
-                                        # ALSO create a separate entity for the nested item
-                                        nested_entity = {
-                                            'start_char': nested_ent['start_char'],
-                                            'end_char': nested_ent['end_char'],
-                                            'text': nested_ent['text'],
-                                            'label': nested_ent['label'],
-                                            'source': 'llm',
-                                            'parent_entity': main_entity['text'],
-                                            'is_nested': True
-                                        }
-                                        valid_entities.append(nested_entity)
-                                #     else:
-                                #         st.warning(f"Skipped nested entity outside parent boundaries: {nested_ent['text']} not within {main_entity['text']}")
-                                # else:
-                                #     st.warning(f"Invalid nested entity structure: {nested_ent}")
-                            
-                            if valid_nested:
-                                main_entity['nested_entities'] = valid_nested
-                            else:
-                                main_entity['nested_entities'] = []
-                        else:
-                            main_entity['nested_entities'] = []
-                        
-                        valid_entities.append(main_entity)
-                    else:
-                        st.warning(f"Invalid entity structure: {ent}")
-                return valid_entities
-            else:
-                # Flatten entities for flat mode
-                valid_entities = []
-                for ent in filtered_entities:
-                    if isinstance(ent, dict) and all(key in ent for key in ["start_char", "end_char", "text", "label"]):
-                        # Add the main entity
-                        main_entity = {
-                            'start_char': ent['start_char'],
-                            'end_char': ent['end_char'],
-                            'text': ent['text'],
-                            'label': ent['label'],
-                            'source': 'llm'
-                        }
-                        valid_entities.append(main_entity)
-                        
-                        # Process nested entities as separate flat entities
-                        if 'nested_entities' in ent and isinstance(ent['nested_entities'], list):
-                            for nested_ent in ent['nested_entities']:
-                                if isinstance(nested_ent, dict) and all(key in nested_ent for key in ["start_char", "end_char", "text", "label"]):
-                                    # Validate that nested entity is within parent boundaries
-                                    if (nested_ent['start_char'] >= main_entity['start_char'] and 
-                                        nested_ent['end_char'] <= main_entity['end_char'] and
-                                        nested_ent['start_char'] < nested_ent['end_char']):
-                                        
-                                        nested_entity = {
-                                            'start_char': nested_ent['start_char'],
-                                            'end_char': nested_ent['end_char'],
-                                            'text': nested_ent['text'],
-                                            'label': nested_ent['label'],
-                                            'source': 'llm',
-                                            'parent_entity': main_entity['text']  # Reference to parent
-                                        }
-                                        valid_entities.append(nested_entity)
-                                    else:
-                                        st.warning(f"Skipped nested entity outside parent boundaries: {nested_ent['text']} not within {main_entity['text']}")
-                                else:
-                                    st.warning(f"Invalid nested entity structure: {nested_ent}")
-                    else:
-                        st.warning(f"Invalid entity structure: {ent}")
-                
-                if len(valid_entities) != len(entities):
-                    st.warning(f"Some entities were invalid and filtered out")
-                
-                return valid_entities
-            
-        except (json.JSONDecodeError, ValueError) as e:
-            # Method 3: Try to find and parse multiple JSON objects
-            try:
-                # Look for individual JSON objects
-                import re
-                json_objects = re.findall(r'\{[^{}]*\}', response_text)
-                entities = []
-                for obj_str in json_objects:
-                    try:
-                        obj = json.loads(obj_str)
-                        if all(key in obj for key in ["start_char", "end_char", "text", "label"]):
-                            entities.append(obj)
-                    except:
+                nested_entity['is_nested'] = True
+            entities.append(nested_entity)
+    
+    if is_nested_mode:
+        main_entity['nested_entities'] = valid_nested
+        # Nested mode lists children before their parent
+        entities.append(main_entity)
+        return entities
+    return [main_entity] + entities
+
+
+def stream_chunk_response(client, prompt, temperature, max_tokens, chunk_text_content, start_offset):
+    """
+    Stream one chunk's LLM response and show entities as soon as each one is complete.
+    
+    Each streamed entity is position-corrected against the chunk text and listed
+    live while the model is still generating. The full response text is returned
+    so the caller can parse it exactly as in non-streaming mode.
+    
+    Args:
+        client: LLMClient instance with generate_stream
+        prompt (str): Chunk prompt
+        temperature (float): Sampling temperature
+        max_tokens (int): Maximum tokens in the response
+        chunk_text_content (str): Text of the chunk being annotated
+        start_offset (int): Position of the chunk in the full text
+    
+    Returns:
+        str: Complete response text (None if nothing was received or the stream failed)
+    """
+    from incremental_json import IncrementalJSONArrayParser
+    
+    parser = IncrementalJSONArrayParser()
+    is_nested_mode = st.session_state.get('annotation_mode', 'Nested (Hierarchical)') == "Nested (Hierarchical)"
+    live_placeholder = st.empty()
+    streamed_entities = []
+    parts = []
+    
+    try:
+        for piece in client.generate_stream(prompt, temperature=temperature, max_tokens=max_tokens):
+            parts.append(piece)
+            new_entities = []
+            for obj in parser.feed(piece):
+                for entity in llm_object_to_entities(obj, is_nested_mode):
+                    is_valid, _ = validate_entity_length(entity['text'])
+                    if not is_valid:
                         continue
-                
-                if entities:
-                    st.info(f"Recovered {len(entities)} entities from malformed response")
-                    return entities
-                    
-            except Exception:
-                pass
+                    position = find_correct_position(chunk_text_content, entity['text'], entity['start_char'])
+                    if position:
+                        entity['start_char'], entity['end_char'] = position
+                    new_entities.append(entity)
             
-            # Final fallback: Log error and return empty
-            st.error(f"Failed to parse LLM output JSON for chunk {chunk_index if chunk_index else 'unknown'}: {e}")
-            st.error(f"Raw response preview: {response_text[:200]}...")
-            return []
+            if new_entities:
+                streamed_entities.extend(new_entities)
+                lines = [
+                    f"- `{html.escape(e['text'])}` → **{e['label']}** ({e['start_char'] + start_offset}-{e['end_char'] + start_offset})"
+                    for e in streamed_entities[-15:]
+                ]
+                live_placeholder.markdown(f"📡 **{len(streamed_entities)} entities received so far**\n" + "\n".join(lines))
+    except Exception:
+        # generate_stream has already shown the error; partial text is not a complete response
+        live_placeholder.empty()
+        return None
+    
+    live_placeholder.empty()
+    return "".join(parts) if parts else None
 
 
+@st.cache_resource
+def get_checkpoint_store():
+    """
+    Process-wide chunk checkpoint store shared by all sessions.
+    """
+    return ChunkCheckpointStore(checkpoint_dir=os.getenv("LLM_CHECKPOINT_DIR", ".llm_checkpoints"))
 
-def run_annotation_pipeline(text, tag_df, client, temperature, max_tokens, chunk_size):
+
+def run_annotation_pipeline(text, tag_df, client, temperature, max_tokens, chunk_size, max_workers=1, token_budget=None, stream=False, checkpoint_store=None):
     """
     1. Chunk the text with overlap
     2. For each chunk, generate prompt and call LLM
     3. Parse and adjust entities with offset
     4. Remove duplicates from overlapping regions
     5. Aggregate and return full list of entities
-    """
-    chunks_with_overlap = chunk_text(text, chunk_size)
-    all_entities = []
-    processed_chunks = []
+    
+    With max_workers > 1 the chunk prompts are sent in parallel through a bounded
+    worker pool; results are reassembled in chunk order before deduplication.
+    With token_budget set, chunks are packed to that many tokens per request
+    (prompt + chunk + max_tokens) instead of chunk_size characters.
+    With stream=True each response is streamed and its entities are shown as they
+    arrive; streaming needs serial mode, so with max_workers > 1 a warning is shown
+    and the chunks are sent in parallel without it.
+    With a checkpoint_store, each chunk's entities are saved as soon as it completes
+    and a rerun of the same document, tagset and settings only processes missing chunks.
+    """
+    count_tokens = get_token_counter(client.provider, client.model)
+    chunks_with_overlap = plan_chunks(text, tag_df, chunk_size, max_tokens, token_budget, count_tokens)
+    total_chunks = len(chunks_with_overlap)
+    chunk_results = [None] * total_chunks
+    failed_chunks = 0
+    
+    run_key = None
+    if checkpoint_store is not None:
+        run_key = make_run_key(text, tag_df, {
+            'provider': client.provider,
+            'model': client.model,
+            'temperature': temperature,
+            'max_tokens': max_tokens,
+            'chunk_size': chunk_size,
+            'token_budget': token_budget,
+            'annotation_mode': st.session_state.annotation_mode,
+        })
+        saved_chunks = checkpoint_store.load(run_key)
+        for i, (chunk_text_content, start_offset, end_offset) in enumerate(chunks_with_overlap):
+            saved = saved_chunks.get(i)
+            # Only reuse a checkpoint if the chunk boundaries are unchanged
+            if saved and saved['start_offset'] == start_offset and saved['end_offset'] == end_offset:
+                chunk_results[i] = {
+                    'chunk_index': i,
+                    'start_offset': start_offset,
+                    'end_offset': end_offset,
+                    'entities': saved['entities'],
+                    'chunk_text': chunk_text_content
+                }
+        restored_count = sum(1 for result in chunk_results if result is not None)
+        if restored_count:
+            st.info(f"♻️ Resuming run: {restored_count}/{total_chunks} chunks restored from checkpoint")
+    
+    pending_chunks = [i for i in range(total_chunks) if chunk_results[i] is None]
     
     # Create a container for progress updates
     progress_container = st.container()
@@ -2537,66 +2636,83 @@ def run_annotation_pipeline(text, tag_df, client, temperature, max_tokens, chunk
     
     # st.info(f"🔗 Processing {len(chunks_with_overlap)} overlapping chunks to improve entity detection at boundaries...")
     
-    for i, (chunk_text_content, start_offset, end_offset) in enumerate(chunks_with_overlap):
-        with progress_container:
-            # Clear previous progress display
-            progress_container.empty()
-            
-            # Show current progress with overlap info
-            display_chunk_progress_with_overlap(i + 1, len(chunks_with_overlap), chunk_text_content, start_offset, end_offset, start_time)
-            
-            # Process the chunk
-            with st.spinner(f"🤖 Calling {st.session_state.model_provider} API..."):
-                # Use appropriate prompt based on annotation mode
-                if st.session_state.annotation_mode == "Nested (Hierarchical)":
-                    prompt = build_nested_annotation_prompt(tag_df, chunk_text_content)
-                else:
-                    prompt = build_annotation_prompt(tag_df, chunk_text_content)
-                    
-                response = client.generate(prompt, temperature=temperature, max_tokens=max_tokens)
-                entities = parse_llm_response(response, i + 1)  # Pass chunk index for debugging
-                
-                # Adjust entities with the actual start offset
-                entities = aggregate_entities(entities, start_offset)
-                
-                # Store chunk information for overlap detection
-                processed_chunks.append({
-                    'chunk_index': i,
-                    'start_offset': start_offset,
-                    'end_offset': end_offset,
-                    'entities': entities,
-                    'chunk_text': chunk_text_content
-                })
-                
-                all_entities.extend(entities)
+    def process_chunk_response(i, response):
+        nonlocal failed_chunks
+        chunk_text_content, start_offset, end_offset = chunks_with_overlap[i]
+        entities, complete = parse_llm_response(response, i + 1, with_status=True)  # Pass chunk index for debugging
+        
+        # Adjust entities with the actual start offset
+        entities = aggregate_entities(entities, start_offset)
+        
+        # Store chunk information for overlap detection
+        chunk_results[i] = {
+            'chunk_index': i,
+            'start_offset': start_offset,
+            'end_offset': end_offset,
+            'entities': entities,
+            'chunk_text': chunk_text_content
+        }
+        
+        # Checkpoint the chunk right away. Failed calls and responses without a complete JSON
+        # array (unparseable, or truncated and only salvaged) count as failed, so their chunks
+        # are retried on the next run
+        if not complete:
+            failed_chunks += 1
+        elif run_key is not None:
+            checkpoint_store.save(run_key, i, start_offset, end_offset, entities)
+        
+        # Show chunk results with overlap info
+        display_chunk_result(i + 1, entities, get_chunk_overlap_message(chunks_with_overlap, i))
+    
+    if max_workers <= 1 or len(pending_chunks) <= 1:
+        for i in pending_chunks:
+            chunk_text_content, start_offset, end_offset = chunks_with_overlap[i]
+            with progress_container:
+                # Clear previous progress display
+                progress_container.empty()
                 
-                # Show chunk results with overlap info
-                overlap_msg = ""
-                if i > 0:
-                    prev_chunk = processed_chunks[i-1]
-                    if start_offset < prev_chunk['end_offset']:
-                        overlap_chars = prev_chunk['end_offset'] - start_offset
-                        overlap_msg = f" | 🔗 {overlap_chars} chars overlap with previous chunk"
+                # Show current progress with overlap info
+                display_chunk_progress_with_overlap(i + 1, total_chunks, chunk_text_content, start_offset, end_offset, start_time)
                 
-                # Show chunk results with nested entity info
-                if st.session_state.annotation_mode == "Nested (Hierarchical)":
-                    # Count entities with nesting
-                    entities_with_nesting = len([e for e in entities if e.get('nested_entities')])
-                    total_nested_children = sum(len(e.get('nested_entities', [])) for e in entities)
-                    
-                    if entities_with_nesting > 0:
-                        st.success(f"✅ Chunk {i+1} completed! Found {len(entities)} entities ({entities_with_nesting} with nested children, {total_nested_children} total nested entities){overlap_msg}")
+                # Process the chunk
+                with st.spinner(f"🤖 Calling {st.session_state.model_provider} API..."):
+                    prompt = build_chunk_prompt(tag_df, chunk_text_content)
+                    if stream:
+                        response = stream_chunk_response(client, prompt, temperature, max_tokens, chunk_text_content, start_offset)
                     else:
-                        st.success(f"✅ Chunk {i+1} completed! Found {len(entities)} entities (no nesting found in this chunk){overlap_msg}")
-                else:
-                    # Flat mode - count parent and child entities separately
-                    parent_count = len([e for e in entities if 'parent_entity' not in e])
-                    nested_count = len([e for e in entities if 'parent_entity' in e])
-                    st.success(f"✅ Chunk {i+1} completed! Found {len(entities)} entities ({parent_count} main, {nested_count} nested as separate entities){overlap_msg}")
+                        response = client.generate(prompt, temperature=temperature, max_tokens=max_tokens)
+                    process_chunk_response(i, response)
+    else:
+        if stream:
+            st.warning(f"⚠️ Streaming is only available with 1 parallel request; these {len(pending_chunks)} chunks are sent {max_workers} at a time without streaming.")
+        prompts = [build_chunk_prompt(tag_df, chunks_with_overlap[i][0]) for i in pending_chunks]
+        completed_count = total_chunks - len(pending_chunks)
+        
+        with progress_container:
+            # Single placeholder so the progress panel is replaced rather than stacked
+            progress_placeholder = st.empty()
+            with st.spinner(f"🤖 Calling {st.session_state.model_provider} API with up to {max_workers} parallel requests..."):
+                for j, response in generate_chunk_responses_concurrently(client, prompts, temperature, max_tokens, max_workers):
+                    i = pending_chunks[j]
+                    completed_count += 1
+                    chunk_text_content, start_offset, end_offset = chunks_with_overlap[i]
+                    with progress_placeholder.container():
+                        display_chunk_progress_with_overlap(completed_count, total_chunks, chunk_text_content, start_offset, end_offset, start_time)
+                    process_chunk_response(i, response)
+    
+    # Reassemble results in chunk order so downstream steps see the same ordering as a serial run
+    processed_chunks = [result for result in chunk_results if result is not None]
+    
+    # A fully successful run no longer needs its checkpoints
+    if run_key is not None and failed_chunks == 0:
+        checkpoint_store.clear(run_key)
+    all_entities = []
+    for result in processed_chunks:
+        all_entities.extend(result['entities'])
     
     # Remove duplicates from overlapping regions
     # st.info("🔍 Removing duplicate entities from overlapping regions...")
-    deduplicated_entities = remove_overlapping_duplicates(all_entities, processed_chunks)
+    deduplicated_entities, dedup_stats = remove_overlapping_duplicates(all_entities, processed_chunks, return_stats=True)
     
     removed_count = len(all_entities) - len(deduplicated_entities)
     # if removed_count > 0:
@@ -2652,77 +2768,18 @@ def run_annotation_pipeline(text, tag_df, client, temperature, max_tokens, chunk
         st.info(f"📈 Processing efficiency: Overlapping chunks helped ensure entities at chunk boundaries are properly detected")
         if removed_count > 0:
             st.success(f"🎯 Successfully identified and removed {removed_count} duplicate entities from overlapping regions")
+            boundary_counts = ", ".join(
+                f"chunks {boundary}/{boundary + 1}: {count}"
+                for boundary, count in sorted(dedup_stats['per_boundary'].items())
+            )
+            if boundary_counts:
+                st.caption(f"Duplicates removed per chunk boundary: {boundary_counts}")
+            if dedup_stats['other']:
+                st.caption(f"Duplicates outside overlap regions: {dedup_stats['other']}")
     
     return deduplicated_entities
 
 
-def flatten_entities_for_conll(entities):
-    """
-    Flatten nested entities structure for CoNLL format export.
-    
-    Args:
-        entities (list): List of entities that may contain nested_entities
-    
-    Returns:
-        list: Flat list of entities with start, end, label, text fields
-    """
-    flattened_entities = []
-    
-    def extract_flat_entity(entity):
-        """Extract basic entity information for CoNLL format."""
-        if not isinstance(entity, dict):
-            return None
-            
-        # Handle different field naming conventions
-        start_field = None
-        end_field = None
-        
-        # Check for different start/end field names
-        if 'start' in entity and 'end' in entity:
-            start_field = 'start'
-            end_field = 'end'
-        elif 'start_char' in entity and 'end_char' in entity:
-            start_field = 'start_char'
-            end_field = 'end_char'
-        else:
-            # Check if entity has required fields
-            return None
-            
-        if 'label' not in entity:
-            return None
-            
-        # Create basic entity structure for CoNLL
-        flat_entity = {
-            'start': entity[start_field],
-            'end': entity[end_field],
-            'label': entity['label'],
-            'text': entity.get('text', '')
-        }
-        
-        return flat_entity
-    
-    def process_entity_recursively(entity):
-        """Recursively process entity and its nested entities."""
-        # Add the main entity
-        flat_entity = extract_flat_entity(entity)
-        if flat_entity:
-            flattened_entities.append(flat_entity)
-        
-        # Process nested entities if they exist
-        nested_entities = entity.get('nested_entities', [])
-        if isinstance(nested_entities, list):
-            for nested_entity in nested_entities:
-                if isinstance(nested_entity, dict):
-                    process_entity_recursively(nested_entity)
-    
-    # Process all entities
-    for entity in entities:
-        if isinstance(entity, dict):
-            process_entity_recursively(entity)
-    
-    return flattened_entities
-
-
 def convert_to_conll_format(text, entities, annotation_mode="flat"):
     """
     Convert text and annotations to CoNLL format for NER training.
@@ -2736,82 +2793,22 @@ def convert_to_conll_format(text, entities, annotation_mode="flat"):
     Returns:
         str: Text in CoNLL format (token per line with IOB tags)
     """
-    from spacy.lang.en import English
-    
     if not text or not entities:
         return ""
     
-    # Use a lightweight tokenizer
-    nlp = English()
-    nlp.add_pipe("sentencizer")
-    
-    # Flatten nested entities structure for CoNLL format
-    flattened_entities = flatten_entities_for_conll(entities)
-    
-    # Remove duplicate entities (same start/end/label)
-    unique_entities = []
-    seen = set()
-    for entity in flattened_entities:
-        if (isinstance(entity, dict) and 
-            'start' in entity and 'end' in entity and 'label' in entity and
-            0 <= entity['start'] < entity['end'] <= len(text)):
-            key = (entity['start'], entity['end'], entity['label'])
-            if key not in seen:
-                unique_entities.append(entity)
-                seen.add(key)
-    
-    # Build list of spans (start, end, label) and sort by start position
-    spans = [(ent['start'], ent['end'], ent['label']) for ent in unique_entities]
-    spans.sort()  # Sort by start position to handle overlaps better
-    
-    # Tokenize text using spaCy
-    doc = nlp(text)
-    conll_lines = []
-    
-    for token in doc:
-        start, end = token.idx, token.idx + len(token.text)
-        label = "O"
-        
-        # Find the entity this token belongs to
-        # Priority: exact match > partial overlap, longer spans > shorter spans
-        best_match = None
-        best_score = 0
-        
-        for ent_start, ent_end, ent_label in spans:
-            # Check if token overlaps with entity
-            if start < ent_end and end > ent_start:
-                # Calculate overlap score (prefer complete containment)
-                if start >= ent_start and end <= ent_end:
-                    # Token completely inside entity
-                    score = 100 + (ent_end - ent_start)  # Prefer longer entities
-                else:
-                    # Partial overlap
-                    overlap = min(end, ent_end) - max(start, ent_start)
-                    score = overlap
-                
-                if score > best_score:
-                    best_score = score
-                    best_match = (ent_start, ent_end, ent_label)
-        
-        if best_match:
-            ent_start, ent_end, ent_label = best_match
-            # Determine if this is the beginning of the entity
-            if start == ent_start:
-                label = f"B-{ent_label.strip().upper()}"
-            else:
-                label = f"I-{ent_label.strip().upper()}"
-        
-        conll_lines.append(f"{token.text}\t{label}")
+    # Unique (start, end, label) spans of all entities, including nested ones
+    spans = conll_spans(text, entities)
     
-    # Add sentence breaks (empty lines) after sentence-ending punctuation
-    final_lines = []
-    for line in conll_lines:
-        final_lines.append(line)
-        # Add empty line after sentence-ending punctuation
-        if line.split('\t')[0] in ['.', '!', '?']:
-            final_lines.append("")
+    # The export section runs on every rerun; reuse the last result if nothing changed
+    cache_key = (hash(text), len(text), tuple(spans))
+    cached = st.session_state.get('conll_export_cache')
+    if cached is not None and cached[0] == cache_key:
+        return cached[1]
     
-    return '\n'.join(final_lines)
+    # Tokenize with the cached spaCy tokenizer; empty lines separate sentences
+    conll_content = '\n'.join(iter_conll_lines(text, spans))
+    st.session_state.conll_export_cache = (cache_key, conll_content)
+    return conll_content
 
 
 def create_conll_export_data(text, entities, annotation_mode="flat"):
@@ -0,0 +1,205 @@
+# incremental_json.py
+"""
+Linear-time JSON extraction from LLM responses.
+IncrementalJSONArrayParser takes text as it streams from the provider and returns each
+entity object as soon as its closing brace arrives. extract_json_values pulls every
+complete JSON value out of a finished response in one pass and salvages what it can
+from truncated or malformed arrays.
+"""
+import json
+import re
+
+# Characters that change scanner state; everything else is skipped without inspection
+STRUCTURAL_CHARS = re.compile(r'["\\\[\]{}]')
+CLOSING_BRACKETS = {']': '[', '}': '{'}
+
+
+class IncrementalJSONArrayParser:
+    """
+    Bracket- and string-aware scanner over a growing response.
+
+    Objects directly inside the first top-level array are emitted as dicts.
+    If the model skips the array and writes bare objects, those are emitted instead.
+    Prose or code fences around the JSON are ignored. Each character is scanned
+    once, and text before the current open object is discarded as it is consumed.
+    """
+
+    def __init__(self):
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._item_depth = 0
+        self._object_start = None
+        self._in_string = False
+        self._escaped = False
+        self.finished = False
+        self.objects_parsed = 0
+        self.objects_failed = 0
+
+    def feed(self, text):
+        """
+        Add the next piece of the response.
+
+        Args:
+            text (str): Newly received text
+
+        Returns:
+            list: Entity objects completed by this piece, in order
+        """
+        if self.finished or not text:
+            return []
+
+        self._buffer += text
+        completed = []
+        buffer = self._buffer
+        i = self._pos
+
+        while i < len(buffer):
+            ch = buffer[i]
+
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif ch == '\\':
+                    self._escaped = True
+                elif ch == '"':
+                    self._in_string = False
+            elif ch == '"':
+                # Quotes in surrounding prose are not JSON strings
+                if self._depth > 0:
+                    self._in_string = True
+            elif ch == '[' or ch == '{':
+                if self._depth == 0 and ch == '[':
+                    self._item_depth = 1
+                elif self._depth == self._item_depth and ch == '{':
+                    self._object_start = i
+                self._depth += 1
+            elif ch == ']' or ch == '}':
+                if self._depth > 0:
+                    self._depth -= 1
+                    if ch == '}' and self._depth == self._item_depth and self._object_start is not None:
+                        obj = self._parse_object(buffer[self._object_start:i + 1])
+                        if obj is not None:
+                            completed.append(obj)
+                        self._object_start = None
+                    if self._depth == 0 and self._item_depth == 1:
+                        # The entity array is closed; ignore anything after it
+                        self.finished = True
+                        break
+            i += 1
+
+        # Keep only the part of the buffer still needed for an unfinished object
+        if self._object_start is None:
+            self._buffer = ""
+            self._pos = 0
+        else:
+            self._buffer = buffer[self._object_start:]
+            self._pos = i - self._object_start
+            self._object_start = 0
+        if self.finished:
+            self._buffer = ""
+        return completed
+
+    def _parse_object(self, obj_text):
+        """Decode one complete object, counting failures instead of raising."""
+        try:
+            obj = json.loads(obj_text)
+        except json.JSONDecodeError:
+            self.objects_failed += 1
+            return None
+        if not isinstance(obj, dict):
+            self.objects_failed += 1
+            return None
+        self.objects_parsed += 1
+        return obj
+
+
+def extract_json_values(text):
+    """
+    Extract every complete top-level JSON array or object from a response in one pass.
+
+    The scanner tracks strings, escapes and a bracket stack, so prose, code fences and
+    brackets inside strings are handled without backtracking. Objects directly inside a
+    top-level array are remembered, so when the array is truncated or fails to parse
+    its complete objects are still salvaged.
+
+    Args:
+        text (str): Raw LLM response
+
+    Returns:
+        dict: {
+            'values': parsed top-level arrays/objects, in order,
+            'salvaged': objects recovered from truncated or malformed arrays,
+            'truncated': True if the response ended inside a JSON value,
+            'failed': number of top-level values or objects that could not be parsed,
+            'recovered_chars': characters of the response covered by what was parsed,
+        }
+    """
+    result = {'values': [], 'salvaged': [], 'truncated': False, 'failed': 0, 'recovered_chars': 0}
+    stack = []
+    in_string = False
+    skip_until = -1
+    value_start = None
+    item_start = None
+    items = []
+
+    def salvage_items():
+        for start, end in items:
+            try:
+                obj = json.loads(text[start:end])
+            except json.JSONDecodeError:
+                result['failed'] += 1
+                continue
+            if isinstance(obj, dict):
+                result['salvaged'].append(obj)
+                result['recovered_chars'] += end - start
+
+    for match in STRUCTURAL_CHARS.finditer(text):
+        i = match.start()
+        if i < skip_until:
+            continue
+        ch = text[i]
+
+        if in_string:
+            if ch == '\\':
+                skip_until = i + 2
+            elif ch == '"':
+                in_string = False
+        elif ch == '"':
+            # Quotes in surrounding prose are not JSON strings
+            if stack:
+                in_string = True
+        elif ch == '[' or ch == '{':
+            if not stack:
+                value_start = i
+                items = []
+            elif ch == '{' and len(stack) == 1 and stack[0] == '[':
+                item_start = i
+            stack.append(ch)
+        elif ch == ']' or ch == '}':
+            if not stack:
+                continue
+            if stack[-1] != CLOSING_BRACKETS[ch]:
+                # Mismatched bracket: give up on this value but keep its complete objects
+                result['failed'] += 1
+                salvage_items()
+                stack = []
+                value_start = item_start = None
+                continue
+            stack.pop()
+            if ch == '}' and len(stack) == 1 and item_start is not None:
+                items.append((item_start, i + 1))
+                item_start = None
+            if not stack:
+                try:
+                    result['values'].append(json.loads(text[value_start:i + 1]))
+                    result['recovered_chars'] += i + 1 - value_start
+                except json.JSONDecodeError:
+                    result['failed'] += 1
+                    salvage_items()
+                value_start = None
+
+    if stack:
+        result['truncated'] = True
+        salvage_items()
+    return result
@@ -1,46 +1,182 @@
 # llm_clients.py
 import streamlit as st
 import os
+import time
 import openai
 from typing import Optional
 from openai import AuthenticationError, OpenAIError
+from llm_cache import LLMResponseCache, make_cache_key
+from rate_limiter import get_governor, call_with_rate_limit
+from hedging import get_latency_tracker, run_hedged
 try:
     import anthropic
 except ImportError:
     anthropic = None
 
+
+class PlaceholderResponse(str):
+    """
+    Stand-in reply (e.g. "[]" for an empty completion or a missing SDK). It is returned
+    like a normal response but never cached, so a transient failure is not replayed.
+    """
+
+
+@st.cache_resource
+def get_response_cache():
+    """
+    Process-wide LLM response cache shared by all sessions.
+    """
+    return LLMResponseCache(
+        cache_dir=os.getenv("LLM_CACHE_DIR", ".llm_cache"),
+        max_size_mb=float(os.getenv("LLM_CACHE_MAX_MB", "200")),
+        ttl_seconds=float(os.getenv("LLM_CACHE_TTL_HOURS", "168")) * 3600,
+    )
+
 class LLMClient:
-    def __init__(self, api_key, provider, model):  # Fixed: __init__ instead of **init**
+    def __init__(self, api_key, provider, model, cache=None, requests_per_minute=None, tokens_per_minute=None, max_retries=5, hedging_policy=None):  # Fixed: __init__ instead of **init**
         self.api_key = api_key
         self.provider = provider
         self.model = model
+        self.cache = cache
+        self.max_retries = max_retries
+        self.hedging_policy = hedging_policy
+        # Shared with every client using the same provider, model and key
+        self.governor = get_governor(provider, model, api_key or "", requests_per_minute, tokens_per_minute)
+        self.latency_tracker = get_latency_tracker(provider, model)
+    
+    def _estimate_request_tokens(self, prompt, max_tokens):
+        """Tokens charged against the tokens-per-minute quota (prompt + completion)."""
+        return len(prompt) // 4 + max_tokens
        
     def generate(self, prompt, temperature=0.1, max_tokens=1000):
         """
-        Enhanced generate method with better error handling
+        Enhanced generate method with better error handling.
+        Deterministic calls are served from the response cache when one is configured.
         """
         try:
             if not prompt or prompt.strip() == "":
                 raise ValueError("Empty prompt provided")
+            
+            cache_key = None
+            if self.cache is not None and self.cache.is_cacheable(temperature):
+                cache_key = make_cache_key(self.provider, self.model, prompt, temperature, max_tokens)
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    return cached
                
-            if self.provider == "OpenAI":
-                return self._call_openai(prompt, temperature, max_tokens)
-            elif self.provider == "Claude":
-                return self._call_claude(prompt, temperature, max_tokens)
+            if self.hedging_policy is not None:
+                response, answered_by_primary = self._generate_hedged(prompt, temperature, max_tokens)
             else:
-                raise ValueError(f"Unsupported provider: {self.provider}")
+                response, answered_by_primary = self._dispatch(prompt, temperature, max_tokens), True
+            
+            # A backup model's answer is cached under the backup's own key, not ours
+            if (cache_key is not None and response is not None and answered_by_primary
+                    and not isinstance(response, PlaceholderResponse)):
+                self.cache.set(cache_key, response)
+            return response
                
         except Exception as e:
             st.error(f"❌ LLM API call failed: {e}")
             return None  # <--- Return None instead of "[]"
    
-    def _call_openai(self, prompt, temperature, max_tokens):  # Fixed: _call_openai instead of *call*openai
-        import openai
-       
+    def _dispatch(self, prompt, temperature, max_tokens):
+        """
+        Call the configured provider and record the call's latency for hedging.
+        """
+        if self.provider not in ("OpenAI", "Claude"):
+            raise ValueError(f"Unsupported provider: {self.provider}")
+        
+        start = time.monotonic()
+        if self.provider == "OpenAI":
+            response = self._call_openai(prompt, temperature, max_tokens)
+        else:
+            response = self._call_claude(prompt, temperature, max_tokens)
+        self.latency_tracker.record(time.monotonic() - start, response is not None)
+        return response
+    
+    def _generate_hedged(self, prompt, temperature, max_tokens):
+        """
+        Run the call under the hedging policy: a slow call is duplicated to the backup
+        client (or to this client again) and the first answer wins.
+        Returns (response, answered_by_primary).
+        """
+        backup_client = self.hedging_policy.backup_client
+        if backup_client is not None and (backup_client.provider, backup_client.model) == (self.provider, self.model):
+            backup_client = None
+        
+        def backup():
+            if backup_client is None:
+                return self._dispatch(prompt, temperature, max_tokens)
+            return backup_client.generate(prompt, temperature=temperature, max_tokens=max_tokens)
+        
+        response, answered_by_primary = run_hedged(
+            lambda: self._dispatch(prompt, temperature, max_tokens),
+            backup,
+            self.hedging_policy,
+            self.latency_tracker,
+            can_fail_over=backup_client is not None,
+        )
+        return response, answered_by_primary or backup_client is None
+    
+    def generate_stream(self, prompt, temperature=0.1, max_tokens=1000):
+        """
+        Streaming variant of generate: yields the completion text piece by piece
+        as the provider produces it. A cached response is yielded in one piece,
+        and a completed stream is written to the cache like a normal call.
+        On error the error is shown and re-raised, so a stream that fails partway
+        is never mistaken for a complete response.
+        """
         try:
-            client = openai.OpenAI(api_key=self.api_key)
-           
-            response = client.chat.completions.create(
+            if not prompt or prompt.strip() == "":
+                raise ValueError("Empty prompt provided")
+            
+            cache_key = None
+            if self.cache is not None and self.cache.is_cacheable(temperature):
+                cache_key = make_cache_key(self.provider, self.model, prompt, temperature, max_tokens)
+                cached = self.cache.get(cache_key)
+                if cached is not None:
+                    yield cached
+                    return
+            
+            if self.provider == "OpenAI":
+                pieces = self._stream_openai(prompt, temperature, max_tokens)
+            elif self.provider == "Claude":
+                pieces = self._stream_claude(prompt, temperature, max_tokens)
+            else:
+                raise ValueError(f"Unsupported provider: {self.provider}")
+            
+            parts = []
+            for piece in pieces:
+                parts.append(piece)
+                yield piece
+            
+            response = "".join(parts).strip()
+            if cache_key is not None and response:
+                self.cache.set(cache_key, response)
+        
+        except openai.RateLimitError:
+            st.error(f"OpenAI rate limit exceeded after {self.max_retries} retries. Please wait and try again.")
+            raise
+        except openai.AuthenticationError:
+            st.error("OpenAI authentication failed. Please check your API key. Have a look at the [OpenAI API Key Guide](https://platform.openai.com/api-keys) for more details.")
+            raise
+        except Exception as e:
+            if anthropic is not None and isinstance(e, anthropic.RateLimitError):
+                st.error(f"Claude rate limit exceeded after {self.max_retries} retries. Please wait and try again.")
+            elif anthropic is not None and isinstance(e, anthropic.AuthenticationError):
+                st.error("Claude authentication failed. Please check your API key. Have a look at the [Claude API Key Guide](https://docs.anthropic.com/en/api/overview) for more details.")
+            else:
+                st.error(f"❌ LLM streaming call failed: {e}")
+            raise
+    
+    def _stream_openai(self, prompt, temperature, max_tokens):
+        """Yield content deltas from an OpenAI chat completion stream."""
+        client = openai.OpenAI(api_key=self.api_key, max_retries=0)
+        
+        # Only opening the stream is retried; once tokens arrive they are passed through
+        stream = call_with_rate_limit(
+            self.governor,
+            lambda: client.chat.completions.create(
                 model=self.model,
                 messages=[
                     {"role": "system", "content": "You are a scientific text annotation expert. Always respond with valid JSON array format."},
@@ -48,22 +184,87 @@ class LLMClient:
                 ],
                 temperature=temperature,
                 max_tokens=max_tokens,
-                timeout=60  # Add timeout
+                stream=True,
+                timeout=60
+            ),
+            self._estimate_request_tokens(prompt, max_tokens),
+            is_retryable=lambda e: isinstance(e, (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)),
+            max_retries=self.max_retries,
+        )
+        
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    
+    def _stream_claude(self, prompt, temperature, max_tokens):
+        """Yield text deltas from a Claude message stream."""
+        if anthropic is None:
+            raise ImportError("Anthropic library not installed. Please install it with: pip install anthropic")
+        
+        client = anthropic.Anthropic(api_key=self.api_key, max_retries=0)
+        
+        # Only opening the stream is retried; once tokens arrive they are passed through
+        stream = call_with_rate_limit(
+            self.governor,
+            lambda: client.messages.create(
+                model=self.model,
+                max_tokens=max_tokens,
+                temperature=temperature,
+                messages=[
+                    {"role": "user", "content": prompt}
+                ],
+                stream=True,
+                timeout=60
+            ),
+            self._estimate_request_tokens(prompt, max_tokens),
+            is_retryable=lambda e: isinstance(e, (anthropic.RateLimitError, anthropic.APITimeoutError, anthropic.APIConnectionError, anthropic.InternalServerError)),
+            max_retries=self.max_retries,
+        )
+        
+        for event in stream:
+            if event.type == "content_block_delta" and getattr(event.delta, "text", None):
+                yield event.delta.text
+   
+    def _call_openai(self, prompt, temperature, max_tokens):  # Fixed: _call_openai instead of *call*openai
+        import openai
+       
+        try:
+            # SDK retries are disabled; the rate-limit governor handles retries and backoff
+            client = openai.OpenAI(api_key=self.api_key, max_retries=0)
+           
+            def request():
+                return client.chat.completions.create(
+                    model=self.model,
+                    messages=[
+                        {"role": "system", "content": "You are a scientific text annotation expert. Always respond with valid JSON array format."},
+                        {"role": "user", "content": prompt}
+                    ],
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    timeout=60  # Add timeout
+                )
+            
+            response = call_with_rate_limit(
+                self.governor,
+                request,
+                self._estimate_request_tokens(prompt, max_tokens),
+                is_retryable=lambda e: isinstance(e, (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError, openai.InternalServerError)),
+                max_retries=self.max_retries,
             )
            
             content = response.choices[0].message.content
            
             if not content:
                 st.warning("OpenAI returned empty response")
-                return "[]"
+                return PlaceholderResponse("[]")
                
             return content.strip()
            
         except openai.RateLimitError:
-            st.error("OpenAI rate limit exceeded. Please wait and try again.")
+            st.error(f"OpenAI rate limit exceeded after {self.max_retries} retries. Please wait and try again.")
             return None
         except openai.APITimeoutError:
-            st.error("OpenAI API timeout. Please try again.")
+            st.error(f"OpenAI API timeout after {self.max_retries} retries. Please try again.")
             return None
         except openai.AuthenticationError:
             st.error("OpenAI authentication failed. Please check your API key. Have a look at the [OpenAI API Key Guide](https://platform.openai.com/api-keys) for more details.")
@@ -75,34 +276,44 @@ class LLMClient:
     def _call_claude(self, prompt, temperature, max_tokens):  # Fixed: _call_claude instead of *call*claude
         if anthropic is None:
             st.error("Anthropic library not installed. Please install it with: pip install anthropic")
-            return "[]"
+            return PlaceholderResponse("[]")
        
         try:
-            client = anthropic.Anthropic(api_key=self.api_key)
+            # SDK retries are disabled; the rate-limit governor handles retries and backoff
+            client = anthropic.Anthropic(api_key=self.api_key, max_retries=0)
            
-            response = client.messages.create(
-                model=self.model,
-                max_tokens=max_tokens,
-                temperature=temperature,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ],
-                timeout=60  # Add timeout
+            def request():
+                return client.messages.create(
+                    model=self.model,
+                    max_tokens=max_tokens,
+                    temperature=temperature,
+                    messages=[
+                        {"role": "user", "content": prompt}
+                    ],
+                    timeout=60  # Add timeout
+                )
+            
+            response = call_with_rate_limit(
+                self.governor,
+                request,
+                self._estimate_request_tokens(prompt, max_tokens),
+                is_retryable=lambda e: isinstance(e, (anthropic.RateLimitError, anthropic.APITimeoutError, anthropic.APIConnectionError, anthropic.InternalServerError)),
+                max_retries=self.max_retries,
             )
            
             content = response.content[0].text if response.content else ""
            
             if not content:
                 st.warning("Claude returned empty response")
-                return "[]"
+                return PlaceholderResponse("[]")
                
             return content.strip()
            
         except anthropic.RateLimitError:
-            st.error("Claude rate limit exceeded. Please wait and try again.")
+            st.error(f"Claude rate limit exceeded after {self.max_retries} retries. Please wait and try again.")
             return None
         except anthropic.APITimeoutError:
-            st.error("Claude API timeout. Please try again.")
+            st.error(f"Claude API timeout after {self.max_retries} retries. Please try again.")
             return None
         except anthropic.AuthenticationError:
             st.error("Claude authentication failed. Please check your API key. Have a look at the [Claude API Key Guide](https://docs.anthropic.com/en/api/overview) for more details.")
@@ -0,0 +1,314 @@
+# position_corrector.py
+"""
+UI-free batch correction of annotation positions.
+Entities are grouped by their text so each distinct string is looked up once in the
+shared DocumentIndex; per-entity work is then a binary search over its occurrences.
+For multi-megabyte documents the text groups can optionally be sharded across a
+process pool, each worker resolving its share of the groups against its own copy of the text.
+The Streamlit wrappers in helper.py only render the summary.
+"""
+import multiprocessing
+import os
+from bisect import bisect_left
+from concurrent.futures import ProcessPoolExecutor
+
+from document_index import get_document_index, nearest_span, tokenize_words
+from fuzzy_locator import locate_approximate
+
+# Only documents at least this long are sharded across processes
+PROCESS_POOL_MIN_CHARS = 2_000_000
+
+# 'best_match': exact match near the old position, else the closest occurrence, else fuzzy
+# 'closest' / 'first': the only occurrence, else the closest / first of several, else fuzzy variants
+CORRECTION_METHODS = ('best_match', 'closest', 'first')
+
+BEST_MATCH_WINDOW = 100
+FUZZY_MATCH_WINDOW = 200
+
+
+def first_in_window(spans, window_start, window_end):
+    """First span of a sorted list of equal-length spans that lies inside [window_start, window_end]."""
+    i = bisect_left(spans, (window_start,))
+    if i < len(spans) and spans[i][1] <= window_end:
+        return spans[i]
+    return None
+
+
+def try_fuzzy_fix(text, expected_text, original_start, original_end):
+    """Try to fix common annotation errors"""
+    # Try removing/adding whitespace
+    variations = [
+        expected_text.strip(),
+        expected_text.lstrip(),
+        expected_text.rstrip(),
+        ' ' + expected_text,
+        expected_text + ' ',
+        ' ' + expected_text + ' '
+    ]
+
+    index = get_document_index(text)
+    for variation in variations:
+        closest = index.nearest_occurrence(variation, original_start)
+        if closest:
+            # Return the closest match to original position
+            return closest
+
+    # Try case variations
+    case_variations = [
+        expected_text.lower(),
+        expected_text.upper(),
+        expected_text.capitalize()
+    ]
+
+    for variation in case_variations:
+        closest = index.nearest_occurrence(variation, original_start)
+        if closest:
+            return closest
+
+    # Allow a few edits (OCR errors, hyphenation) near the original position
+    located = locate_approximate(text, expected_text.strip(), original_start, window=FUZZY_MATCH_WINDOW)
+    if located:
+        return located[:2]
+
+    return None
+
+
+def find_best_position_match(text, expected_text, approximate_start):
+    """
+    Find the best matching position for expected_text in the source text.
+
+    Args:
+        text (str): The full source text
+        expected_text (str): The text we're looking for
+        approximate_start (int): The approximate starting position from annotation
+
+    Returns:
+        tuple: (start, end) positions if found, None otherwise
+    """
+    index = get_document_index(text)
+
+    # Strategy 1: Exact match near the approximate position
+    search_start = max(0, approximate_start - BEST_MATCH_WINDOW)
+    search_end = min(len(text), approximate_start + len(expected_text) + BEST_MATCH_WINDOW)
+    in_window = first_in_window(index.find_all(expected_text), search_start, search_end)
+    if in_window:
+        return in_window
+
+    # Strategy 2: Find all occurrences and pick the closest to approximate_start
+    closest = index.nearest_occurrence(expected_text, approximate_start)
+    if closest:
+        return closest
+
+    # Strategy 3: Try fuzzy matching (handle whitespace issues, etc.)
+    fuzzy_match = try_advanced_fuzzy_match(text, expected_text, approximate_start)
+    if fuzzy_match:
+        return fuzzy_match
+
+    return None
+
+
+def try_advanced_fuzzy_match(text, expected_text, approximate_start):
+    """
+    Advanced fuzzy matching to handle common annotation issues.
+    Enhanced to detect LLM hallucinations and phantom annotations.
+    """
+    # Check if this might be a phantom annotation (words exist but not as contiguous text)
+    words = expected_text.split()
+    if len(words) > 1:
+        # Check if all words exist in text but not as a contiguous phrase
+        index = get_document_index(text)
+        tokens = tokenize_words(expected_text)
+        word_index = index.words()
+        all_words_exist = word_index.has_all(tokens)
+        contiguous_exists = index.contains(expected_text) or word_index.contains_phrase(tokens)
+
+        if all_words_exist and not contiguous_exists:
+            # This is likely a phantom annotation - LLM combined separate concepts
+            return None
+
+    # Match ignoring whitespace differences; spans come back in original-text positions
+    search_start = max(0, approximate_start - FUZZY_MATCH_WINDOW)
+    search_end = min(len(text), approximate_start + len(expected_text) + FUZZY_MATCH_WINDOW)
+
+    in_window = [
+        span for span in get_document_index(text).find_all(expected_text, ignore_whitespace=True)
+        if span[0] >= search_start and span[1] <= search_end
+    ]
+    if in_window:
+        return nearest_span(in_window, approximate_start)
+
+    # Allow a few edits (OCR errors, hyphenation) near the expected position
+    located = locate_approximate(text, expected_text.strip(), approximate_start, window=FUZZY_MATCH_WINDOW)
+    if located:
+        return located[:2]
+
+    return None
+
+
+def _resolve_groups(text, groups, method):
+    """
+    Correct every entity of the given text groups.
+
+    Args:
+        text (str): The full source text
+        groups (list): (expected_text, [(entity_index, start_char, end_char), ...]) pairs
+        method (str): One of CORRECTION_METHODS
+
+    Returns:
+        list: (entity_index, outcome, span, multiple_matches) per entity, where outcome is
+            'already_correct', 'corrected' or 'failed' and span the new (start, end) or None
+    """
+    index = get_document_index(text)
+    text_length = len(text)
+    results = []
+
+    for expected_text, members in groups:
+        # Looked up once for the whole group
+        exact = index.find_all(expected_text)
+        occurrences = index.occurrences(expected_text)
+        multiple = method != 'best_match' and len(occurrences) > 1
+
+        for entity_index, start_char, end_char in members:
+            if 0 <= start_char < end_char <= text_length and text[start_char:end_char] == expected_text:
+                results.append((entity_index, 'already_correct', None, False))
+                continue
+
+            if method == 'best_match':
+                search_start = max(0, start_char - BEST_MATCH_WINDOW)
+                search_end = min(text_length, start_char + len(expected_text) + BEST_MATCH_WINDOW)
+                span = (
+                    first_in_window(exact, search_start, search_end)
+                    or nearest_span(occurrences, start_char)
+                    or try_advanced_fuzzy_match(text, expected_text, start_char)
+                )
+            elif not occurrences:
+                span = try_fuzzy_fix(text, expected_text, start_char, end_char)
+            elif method == 'first':
+                span = occurrences[0]
+            else:
+                span = nearest_span(occurrences, start_char)
+
+            results.append((entity_index, 'corrected' if span else 'failed', span, multiple))
+
+    return results
+
+
+_worker_text = None
+
+
+def _init_worker(text):
+    """Process-pool initializer: receive the document once per worker."""
+    global _worker_text
+    _worker_text = text
+
+
+def _resolve_in_worker(groups, method):
+    """Process-pool task: resolve a share of the text groups against the worker's copy of the document."""
+    return _resolve_groups(_worker_text, groups, method)
+
+
+def _resolve_groups_sharded(text, groups, method, workers):
+    """
+    _resolve_groups across a process pool. Each worker takes every workers-th text group, so
+    the whole lookup (exact, normalized and fuzzy) for a group runs in one worker.
+    """
+    shares = [groups[i::workers] for i in range(min(workers, len(groups)))]
+    # Spawned, not forked: the Streamlit server that calls this is multi-threaded
+    context = multiprocessing.get_context('spawn')
+    results = []
+    with ProcessPoolExecutor(max_workers=len(shares), mp_context=context, initializer=_init_worker, initargs=(text,)) as pool:
+        futures = [pool.submit(_resolve_in_worker, share, method) for share in shares]
+        for future in futures:
+            results.extend(future.result())
+    return results
+
+
+def default_workers(text):
+    """Worker processes for correct_positions: one per CPU for very long documents, else 1."""
+    if len(text) < PROCESS_POOL_MIN_CHARS:
+        return 1
+    return os.cpu_count() or 1
+
+
+def _as_position(value):
+    """An entity offset as an int, or None if it is missing or not a whole number."""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return int(number) if number.is_integer() else None
+
+
+def correct_positions(text, entities, method='best_match', workers=1):
+    """
+    Correct the character positions of many entities at once, without any UI calls.
+
+    Args:
+        text (str): The full source text
+        entities (list): Entity dictionaries with potentially incorrect positions
+        method (str): One of CORRECTION_METHODS
+        workers (int): Processes to shard the work across; only used for documents
+            of at least PROCESS_POOL_MIN_CHARS characters
+
+    Returns:
+        tuple: (corrected_entities, stats) where corrected_entities is in input order
+            (corrected ones are copies) and stats holds the counts 'total', 'already_correct',
+            'corrected', 'failed' and 'multiple_matches', plus 'corrections' as
+            (entity_index, old_span, new_span) tuples and the 'failed_indices'
+    """
+    if method not in CORRECTION_METHODS:
+        raise ValueError(f"Unknown correction method: {method}")
+
+    stats = {
+        'total': len(entities),
+        'already_correct': 0,
+        'corrected': 0,
+        'failed': 0,
+        'multiple_matches': 0,
+        'corrections': [],
+        'failed_indices': []
+    }
+    corrected_entities = list(entities)
+
+    # Group by text so each distinct string is searched once
+    groups = {}
+    for i, entity in enumerate(entities):
+        expected_text = entity.get('text', '')
+        # LLM output may give offsets as strings (or garbage); only whole numbers are usable
+        start_char = _as_position(entity.get('start_char'))
+        end_char = _as_position(entity.get('end_char'))
+        if not isinstance(expected_text, str) or not expected_text or start_char is None or end_char is None:
+            stats['failed'] += 1
+            stats['failed_indices'].append(i)
+            continue
+        groups.setdefault(expected_text, []).append((i, start_char, end_char))
+    group_items = list(groups.items())
+
+    if workers > 1 and len(text) >= PROCESS_POOL_MIN_CHARS and len(group_items) > 1:
+        results = _resolve_groups_sharded(text, group_items, method, workers)
+    else:
+        results = _resolve_groups(text, group_items, method)
+
+    for entity_index, outcome, span, multiple in results:
+        stats[outcome] += 1
+        if multiple:
+            stats['multiple_matches'] += 1
+        if outcome == 'corrected':
+            entity = entities[entity_index]
+            corrected_entity = entity.copy()
+            corrected_entity['start_char'] = span[0]
+            corrected_entity['end_char'] = span[1]
+            corrected_entities[entity_index] = corrected_entity
+            stats['corrections'].append(
+                (entity_index, (entity.get('start_char'), entity.get('end_char')), span)
+            )
+        elif outcome == 'failed':
+            stats['failed_indices'].append(entity_index)
+
+    stats['corrections'].sort()
+    stats['failed_indices'].sort()
+    return corrected_entities, stats
@@ -0,0 +1,183 @@
+# rate_limiter.py
+"""
+Shared rate-limit governor for LLM calls.
+Each provider/model/API key gets token buckets for requests and tokens per minute.
+Calls queue on the buckets, and rate-limited calls are retried with jittered exponential
+backoff that honours Retry-After headers, so chunks are not dropped when a quota is hit.
+"""
+import email.utils
+import hashlib
+import random
+import threading
+import time
+
+# Default quotas (requests per minute, tokens per minute) per provider
+DEFAULT_RATE_LIMITS = {
+    "OpenAI": (500, 200000),
+    "Claude": (50, 40000),
+}
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at rate_per_minute.
+    Callers reserve capacity up front (the balance may go negative), so waiting
+    callers are served in the order they arrived.
+    """
+
+    def __init__(self, rate_per_minute):
+        self.capacity = float(rate_per_minute)
+        self.fill_rate = self.capacity / 60.0
+        self.available = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, amount):
+        """Reserve amount and return how many seconds the caller must wait before using it."""
+        with self._lock:
+            now = time.monotonic()
+            self.available = min(self.capacity, self.available + (now - self.updated) * self.fill_rate)
+            self.updated = now
+            # A single call larger than the bucket can never fit; let it through at full capacity
+            self.available -= min(float(amount), self.capacity)
+            if self.available >= 0:
+                return 0.0
+            return -self.available / self.fill_rate
+
+
+class RateLimitGovernor:
+    """
+    Requests-per-minute and tokens-per-minute limits for one provider/model,
+    plus a shared pause used when the provider tells us to back off.
+    """
+
+    def __init__(self, requests_per_minute=None, tokens_per_minute=None):
+        self.limits = (requests_per_minute, tokens_per_minute)
+        self.request_bucket = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.token_bucket = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.blocked_until = 0.0
+        self.total_wait = 0.0
+        self.retries = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, estimated_tokens):
+        """Block until a call of estimated_tokens may be sent. Returns the time waited."""
+        wait = 0.0
+        if self.request_bucket is not None:
+            wait = max(wait, self.request_bucket.reserve(1))
+        if self.token_bucket is not None:
+            wait = max(wait, self.token_bucket.reserve(estimated_tokens))
+
+        waited = 0.0
+        if wait > 0:
+            time.sleep(wait)
+            waited += wait
+
+        # Honour any provider-requested pause (may be extended while we sleep)
+        while True:
+            remaining = self.blocked_until - time.monotonic()
+            if remaining <= 0:
+                break
+            time.sleep(remaining)
+            waited += remaining
+
+        with self._lock:
+            self.total_wait += waited
+        return waited
+
+    def pause(self, seconds):
+        """Hold back every caller of this governor for the given number of seconds."""
+        with self._lock:
+            self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+
+    def record_retry(self):
+        """Count a retried call (shown in the UI)."""
+        with self._lock:
+            self.retries += 1
+
+
+_governors = {}
+_governors_lock = threading.Lock()
+
+
+def get_governor(provider, model, api_key="", requests_per_minute=None, tokens_per_minute=None):
+    """
+    Get the shared governor for a provider, model and API key (quotas are per key).
+    Limits default to DEFAULT_RATE_LIMITS; passing new limits updates the existing governor.
+    """
+    default_rpm, default_tpm = DEFAULT_RATE_LIMITS.get(provider, (None, None))
+    requests_per_minute = requests_per_minute or default_rpm
+    tokens_per_minute = tokens_per_minute or default_tpm
+    key = (provider, model, hashlib.sha256(api_key.encode("utf-8")).hexdigest())
+
+    with _governors_lock:
+        governor = _governors.get(key)
+        limits = (requests_per_minute, tokens_per_minute)
+        if governor is None or governor.limits != limits:
+            governor = RateLimitGovernor(requests_per_minute, tokens_per_minute)
+            _governors[key] = governor
+        return governor
+
+
+def get_retry_after(error):
+    """
+    Read the Retry-After delay (in seconds) from an API error's HTTP response, if present.
+    Supports retry-after-ms, delta-seconds and HTTP-date values.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return max(0.0, float(retry_after_ms) / 1000.0)
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return max(0.0, float(retry_after))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(retry_after)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def compute_backoff(attempt, retry_after=None, base_delay=1.0, max_delay=60.0):
+    """
+    Delay before retry number attempt (0-based): the server's Retry-After plus a little
+    jitter when given, otherwise full-jitter exponential backoff.
+    """
+    if retry_after is not None:
+        # Small jitter so callers released by the same Retry-After do not stampede
+        return min(max_delay, retry_after) + random.uniform(0, 0.1 * max(retry_after, base_delay))
+    return random.uniform(0, min(max_delay, base_delay * (2 ** attempt)))
+
+
+def call_with_rate_limit(governor, request, estimated_tokens, is_retryable, max_retries=5):
+    """
+    Run request() under the governor, retrying retryable errors with backoff.
+    The last error is re-raised once max_retries is exhausted.
+    """
+    for attempt in range(max_retries + 1):
+        governor.acquire(estimated_tokens)
+        try:
+            return request()
+        except Exception as e:
+            if not is_retryable(e) or attempt >= max_retries:
+                raise
+            retry_after = get_retry_after(e)
+            delay = compute_backoff(attempt, retry_after)
+            governor.record_retry()
+            if retry_after is not None:
+                # The quota is shared, so every caller for this model backs off together
+                governor.pause(delay)
+            else:
+                time.sleep(delay)
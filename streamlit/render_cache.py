@@ -0,0 +1,138 @@
+# render_cache.py
+"""
+Memoized rendering of the highlighted document.
+Whole pages are cached by text hash, entity-set fingerprint, label colours and annotation mode,
+so reruns that change none of them reuse the HTML as is. When entities do change, the document
+is split into independent clusters of overlapping spans, and only the clusters whose entities
+changed are rendered again; the rest of the HTML is reused.
+"""
+import html
+
+from span_renderer import render_highlighted_spans
+
+
+def entity_set_fingerprint(entities):
+    """
+    Hashable value identifying everything about a list of entities that affects rendering,
+    including their nested entities.
+    """
+    return tuple(
+        (
+            ent.get('start_char'), ent.get('end_char'), ent.get('text'), ent.get('label'),
+            ent.get('source'), ent.get('is_nested', False),
+            tuple(
+                (nested.get('start_char'), nested.get('end_char'), nested.get('text'), nested.get('label'))
+                for nested in ent.get('nested_entities') or ()
+            )
+        )
+        for ent in entities
+    )
+
+
+def _display_key(ent):
+    """What render_open and the renderer read from a display entity."""
+    return (
+        ent['start_char'], ent['end_char'], ent.get('label'), ent.get('source'),
+        ent.get('is_nested', False), ent.get('parent_text')
+    )
+
+
+class HighlightRenderCache:
+    """
+    Per-session cache of the highlighted document.
+
+    Args:
+        max_pages (int): Number of complete pages kept for get_page/set_page
+    """
+
+    def __init__(self, max_pages=4):
+        self.max_pages = max_pages
+        self._pages = {}
+        self._context = None
+        self._clusters = {}
+        self._gaps = {}
+        self.clusters_rendered = 0
+        self.clusters_reused = 0
+
+    def get_page(self, key):
+        """Cached page HTML for key, or None."""
+        return self._pages.get(key)
+
+    def set_page(self, key, page_html):
+        """Store page HTML, dropping the oldest page beyond max_pages."""
+        self._pages.pop(key, None)
+        self._pages[key] = page_html
+        while len(self._pages) > self.max_pages:
+            self._pages.pop(next(iter(self._pages)))
+
+    def render(self, text, display_entities, render_open, close_tag, context):
+        """
+        Render display entities over text like render_highlighted_spans, reusing the HTML of
+        every cluster of overlapping spans that is unchanged since the last call.
+
+        Args:
+            text (str): The document text
+            display_entities (list): Entities with verified positions, in display order
+            render_open (callable): entity -> opening HTML of its highlight
+            close_tag (str): HTML that closes a highlight
+            context (tuple): Hashable label colours / annotation mode the markup depends on
+
+        Returns:
+            str: The highlighted HTML
+        """
+        if self._context is None or self._context[1] != context or self._context[0] is not text and self._context[0] != text:
+            self._clusters = {}
+            self._gaps = {}
+        self._context = (text, context)
+
+        # Clusters of overlapping spans; each renders independently of the others
+        order = sorted(
+            range(len(display_entities)),
+            key=lambda i: (display_entities[i]['start_char'], -display_entities[i]['end_char'])
+        )
+        clusters = []
+        cluster_end = -1
+        for i in order:
+            ent = display_entities[i]
+            if ent['start_char'] >= cluster_end:
+                clusters.append([ent['start_char'], ent['end_char'], []])
+                cluster_end = ent['end_char']
+            elif ent['end_char'] > cluster_end:
+                cluster_end = ent['end_char']
+                clusters[-1][1] = cluster_end
+            clusters[-1][2].append(i)
+
+        pieces = []
+        clusters_html = {}
+        gaps_html = {}
+        cursor = 0
+        # The closing sentinel covers the text after the last cluster
+        for start, end, indices in clusters + [[len(text), len(text), None]]:
+            # Plain text between clusters
+            gap = (cursor, start)
+            gap_html = self._gaps.get(gap)
+            if gap_html is None:
+                gap_html = html.escape(text[cursor:start])
+            gaps_html[gap] = gap_html
+            pieces.append(gap_html)
+            if indices is None:
+                break
+
+            # Input order inside a cluster keeps the renderer's tie-breaking
+            indices.sort()
+            members = [display_entities[i] for i in indices]
+            key = (start, end, tuple(_display_key(ent) for ent in members))
+            cluster_html = self._clusters.get(key)
+            if cluster_html is None:
+                cluster_html = render_highlighted_spans(text, members, render_open, close_tag, bounds=(start, end))
+                self.clusters_rendered += 1
+            else:
+                self.clusters_reused += 1
+            clusters_html[key] = cluster_html
+            pieces.append(cluster_html)
+            cursor = end
+
+        # Keep only what the current document uses
+        self._clusters = clusters_html
+        self._gaps = gaps_html
+        return ''.join(pieces)
@@ -0,0 +1,85 @@
+# span_renderer.py
+"""
+HTML rendering of highlighted entity spans over a document.
+Spans are walked once in sorted order with a "covered-until" cursor (and a stack of open
+spans for nested rendering) instead of tracking every covered character offset.
+"""
+import heapq
+import html
+from itertools import count
+
+
+def render_highlighted_spans(text, entities, render_open, close_tag='</span>', nested=True, bounds=None):
+    """
+    Render text as HTML with every entity span wrapped in a highlight.
+
+    Args:
+        text (str): The document text
+        entities (list): Entity dicts whose 'start_char'/'end_char' are valid offsets into text
+        render_open (callable): entity -> opening HTML of its highlight
+        close_tag (str): HTML that closes a highlight
+        nested (bool): Render a span that overlaps an earlier one inside it, splitting it at
+            the earlier span's end if it crosses it; otherwise overlapping spans are skipped
+        bounds (tuple): (start, end) to render only that part of the text; every entity
+            must lie inside it
+
+    Returns:
+        str: The escaped text with highlight markup
+    """
+    pieces = []
+    cursor, text_end = bounds if bounds else (0, len(text))
+
+    if not nested:
+        for ent in sorted(entities, key=lambda x: x["start_char"]):
+            start_char = ent["start_char"]
+            end_char = ent["end_char"]
+            if start_char < cursor:
+                continue
+            pieces.append(html.escape(text[cursor:start_char]))
+            pieces.append(render_open(ent))
+            pieces.append(html.escape(text[start_char:end_char]))
+            pieces.append(close_tag)
+            cursor = end_char
+        pieces.append(html.escape(text[cursor:text_end]))
+        return ''.join(pieces)
+
+    # Outer spans first at equal starts; the sequence number keeps ties stable
+    sequence = count()
+    pending = [(ent["start_char"], -ent["end_char"], next(sequence), ent) for ent in entities]
+    heapq.heapify(pending)
+    # (end, start, label) of the currently open spans, innermost last
+    open_spans = []
+
+    while pending:
+        start_char, negative_end, _, ent = heapq.heappop(pending)
+        end_char = -negative_end
+
+        # Close the spans that end before this one starts
+        while open_spans and open_spans[-1][0] <= start_char:
+            close_end = open_spans.pop()[0]
+            pieces.append(html.escape(text[cursor:close_end]))
+            pieces.append(close_tag)
+            cursor = close_end
+
+        if open_spans:
+            parent_end, parent_start, parent_label = open_spans[-1]
+            if (start_char, end_char, ent.get("label")) == (parent_start, parent_end, parent_label):
+                # Same span and label as its parent: a duplicate, not a layer
+                continue
+            if end_char > parent_end:
+                # Crosses the parent's end: render the inside part now and the rest after it
+                heapq.heappush(pending, (parent_end, -end_char, next(sequence), ent))
+                end_char = parent_end
+
+        pieces.append(html.escape(text[cursor:start_char]))
+        pieces.append(render_open(ent))
+        cursor = start_char
+        open_spans.append((end_char, start_char, ent.get("label")))
+
+    while open_spans:
+        close_end = open_spans.pop()[0]
+        pieces.append(html.escape(text[cursor:close_end]))
+        pieces.append(close_tag)
+        cursor = close_end
+    pieces.append(html.escape(text[cursor:text_end]))
+    return ''.join(pieces)
@@ -0,0 +1,30 @@
+# conftest.py
+"""
+Make the app's flat modules (corpus_export, span_renderer, ...) importable from the tests,
+and provide the fakes shared between test files.
+"""
+import os
+import re
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class _Token:
+    def __init__(self, text, idx):
+        self.text = text
+        self.idx = idx
+
+
+class _RegexTokenizer:
+    """Stand-in for spaCy's tokenizer: words and single punctuation marks."""
+
+    def make_doc(self, text):
+        return [_Token(match.group(), match.start()) for match in re.finditer(r"\w+|[^\w\s]", text)]
+
+
+@pytest.fixture
+def regex_tokenizer():
+    return _RegexTokenizer()
@@ -0,0 +1,34 @@
+# test_aho_corasick.py
+import random
+
+from aho_corasick import AhoCorasickAutomaton
+
+
+def _matches_by_find(text, patterns):
+    found = []
+    for index, pattern in enumerate(patterns):
+        pos = text.find(pattern)
+        while pos != -1:
+            found.append((pos, pos + len(pattern), index))
+            pos = text.find(pattern, pos + 1)
+    return found
+
+
+def test_finds_overlapping_and_nested_patterns():
+    automaton = AhoCorasickAutomaton(['he', 'she', 'his', 'hers'])
+    assert sorted(automaton.iter_matches('ushers')) == [(1, 4, 1), (2, 4, 0), (2, 6, 3)]
+
+
+def test_matches_come_in_end_order():
+    automaton = AhoCorasickAutomaton(['ab', 'b', 'abc'])
+    ends = [end for _, end, _ in automaton.iter_matches('xabcab')]
+    assert ends == sorted(ends)
+
+
+def test_agrees_with_str_find():
+    rng = random.Random(7)
+    for _ in range(300):
+        text = ''.join(rng.choice('abc') for _ in range(rng.randint(0, 40)))
+        patterns = list({''.join(rng.choice('abc') for _ in range(rng.randint(1, 4))) for _ in range(5)})
+        automaton = AhoCorasickAutomaton(patterns)
+        assert sorted(automaton.iter_matches(text)) == sorted(_matches_by_find(text, patterns))
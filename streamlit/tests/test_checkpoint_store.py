@@ -0,0 +1,48 @@
+# test_checkpoint_store.py
+import time
+
+from checkpoint_store import ChunkCheckpointStore, make_run_key
+
+
+class _Tagset:
+    """Minimal stand-in for the tagset DataFrame: only to_json is used."""
+
+    def __init__(self, records):
+        self.records = records
+
+    def to_json(self, orient):
+        return repr(self.records)
+
+
+def test_saved_chunks_are_loaded_back(tmp_path):
+    store = ChunkCheckpointStore(checkpoint_dir=str(tmp_path))
+    store.save('run', 0, 0, 10, [{'text': 'a', 'label': 'X'}])
+    store.save('run', 1, 8, 20, [])
+    store.save('other', 0, 0, 10, [])
+    assert store.load('run') == {
+        0: {'start_offset': 0, 'end_offset': 10, 'entities': [{'text': 'a', 'label': 'X'}]},
+        1: {'start_offset': 8, 'end_offset': 20, 'entities': []},
+    }
+
+
+def test_checkpoints_survive_reopening_and_clear(tmp_path):
+    ChunkCheckpointStore(checkpoint_dir=str(tmp_path)).save('run', 0, 0, 10, [])
+    store = ChunkCheckpointStore(checkpoint_dir=str(tmp_path))
+    assert list(store.load('run')) == [0]
+    store.clear('run')
+    assert store.load('run') == {}
+
+
+def test_expired_checkpoints_are_dropped_on_open(tmp_path):
+    ChunkCheckpointStore(checkpoint_dir=str(tmp_path)).save('run', 0, 0, 10, [])
+    time.sleep(0.05)
+    assert ChunkCheckpointStore(checkpoint_dir=str(tmp_path), ttl_seconds=0.01).load('run') == {}
+
+
+def test_run_key_depends_on_text_tagset_and_params():
+    tagset = _Tagset([{'tag_name': 'GENE'}])
+    key = make_run_key('text', tagset, {'model': 'a'})
+    assert key == make_run_key('text', tagset, {'model': 'a'})
+    assert key != make_run_key('other text', tagset, {'model': 'a'})
+    assert key != make_run_key('text', _Tagset([{'tag_name': 'DRUG'}]), {'model': 'a'})
+    assert key != make_run_key('text', tagset, {'model': 'b'})
@@ -0,0 +1,66 @@
+# test_conll_export.py
+import random
+import re
+
+from corpus_export import assign_conll_labels, conll_spans, iter_conll_lines
+
+
+def _labels_by_scanning(tokens, spans):
+    """The previous O(tokens x spans) labelling that assign_conll_labels must reproduce."""
+    labels = []
+    for start, end in tokens:
+        best_match = None
+        best_score = 0
+        for ent_start, ent_end, ent_label in spans:
+            if start < ent_end and end > ent_start:
+                if start >= ent_start and end <= ent_end:
+                    score = 100 + (ent_end - ent_start)
+                else:
+                    score = min(end, ent_end) - max(start, ent_start)
+                if score > best_score:
+                    best_score = score
+                    best_match = (ent_start, ent_end, ent_label)
+        if best_match:
+            prefix = "B-" if start == best_match[0] else "I-"
+            labels.append(prefix + best_match[2].strip().upper())
+        else:
+            labels.append("O")
+    return labels
+
+
+def test_assign_conll_labels_matches_scanning_labeller():
+    rng = random.Random(24)
+    for _ in range(3000):
+        text = ''.join(rng.choice('ab c.') for _ in range(rng.randint(1, 80)))
+        tokens = [match.span() for match in re.finditer(r'\S+', text)]
+        spans = set()
+        for _ in range(rng.randint(0, 10)):
+            start = rng.randint(0, len(text) - 1)
+            spans.add((start, rng.randint(start + 1, len(text)), rng.choice(['x', 'y ', 'z'])))
+        spans = sorted(spans)
+        assert assign_conll_labels(tokens, spans) == _labels_by_scanning(tokens, spans)
+
+
+def test_assign_conll_labels_prefers_longest_containing_span():
+    tokens = [(0, 3), (4, 8)]
+    spans = [(0, 3, 'short'), (0, 8, 'long')]
+    assert assign_conll_labels(tokens, spans) == ['B-LONG', 'I-LONG']
+
+
+def test_conll_spans_flattens_dedupes_and_drops_out_of_range():
+    entities = [
+        {'start_char': 0, 'end_char': 3, 'label': 'A', 'nested_entities': [{'start_char': 0, 'end_char': 1, 'label': 'B'}]},
+        {'start': 0, 'end': 3, 'label': 'A'},
+        {'start_char': 5, 'end_char': 99, 'label': 'C'},
+    ]
+    assert conll_spans('abcdefg', entities) == [(0, 1, 'B'), (0, 3, 'A')]
+
+
+def test_iter_conll_lines_breaks_sentences(regex_tokenizer):
+    text = 'Ann met Bob. Then left!'
+    spans = [(0, 3, 'per'), (8, 11, 'per')]
+    lines = list(iter_conll_lines(text, spans, regex_tokenizer))
+    assert lines == [
+        'Ann\tB-PER', 'met\tO', 'Bob\tB-PER', '.\tO', '',
+        'Then\tO', 'left\tO', '!\tO', '',
+    ]
@@ -0,0 +1,86 @@
+# test_corpus_export.py
+import io
+import json
+
+import pytest
+
+from corpus_export import (
+    export_corpus,
+    filter_overlapping_spans,
+    iter_export_records,
+    iter_uploaded_annotations,
+    json_download,
+    render_document,
+)
+
+
+def test_filter_overlapping_spans_keeps_longest_then_earliest():
+    spans = [(0, 5, 'a'), (3, 9, 'b'), (9, 10, 'c'), (0, 5, 'z')]
+    assert filter_overlapping_spans(spans) == [(3, 9, 'b'), (9, 10, 'c')]
+
+
+def test_spacy_record_moves_overlapping_spans_to_span_group():
+    document = {
+        'text': 'New York City hall',
+        'entities': [
+            {'start_char': 0, 'end_char': 13, 'label': 'LOC',
+             'nested_entities': [{'start_char': 0, 'end_char': 8, 'label': 'CITY'}]},
+        ],
+    }
+    record, stats = render_document(document, 'spacy')
+    text, annotations = json.loads(record)
+    assert text == document['text']
+    assert annotations['entities'] == [[0, 13, 'LOC']]
+    assert annotations['spans'] == {'sc': [[0, 8, 'CITY'], [0, 13, 'LOC']]}
+    assert stats == {'entities': 2, 'tokens': 0}
+
+
+def test_spacy_record_without_overlaps_has_no_span_group():
+    record, _ = render_document({'text': 'a b', 'entities': [{'start_char': 0, 'end_char': 1, 'label': 'X'}]}, 'spacy')
+    assert json.loads(record) == ['a b', {'entities': [[0, 1, 'X']]}]
+
+
+def test_conll_record_ends_with_document_break(regex_tokenizer):
+    record, stats = render_document(
+        {'text': 'Ann left.', 'entities': [{'start_char': 0, 'end_char': 3, 'label': 'PER'}]},
+        'conll', tokenizer=regex_tokenizer
+    )
+    assert record == 'Ann\tB-PER\nleft\tO\n.\tO\n\n'
+    assert stats == {'entities': 1, 'tokens': 3}
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        list(iter_export_records([{'text': 'a', 'entities': []}], 'xml'))
+
+
+def test_export_corpus_writes_one_jsonl_line_per_document():
+    documents = ({'id': i, 'text': f'doc {i}', 'entities': []} for i in range(3))
+    stream = io.StringIO()
+    totals = export_corpus(documents, stream, 'jsonl')
+    lines = stream.getvalue().splitlines()
+    assert totals == {'documents': 3, 'entities': 0, 'tokens': 0}
+    assert [json.loads(line)['id'] for line in lines] == [0, 1, 2]
+
+
+def test_export_corpus_in_process_pool_keeps_order():
+    documents = [{'id': i, 'text': f'doc {i}', 'entities': []} for i in range(20)]
+    serial = io.StringIO()
+    pooled = io.StringIO()
+    export_corpus(iter(documents), serial, 'jsonl')
+    export_corpus(iter(documents), pooled, 'jsonl', workers=2)
+    assert pooled.getvalue() == serial.getvalue()
+
+
+def test_iter_uploaded_annotations_skips_files_without_text():
+    with_text = io.BytesIO(json.dumps({'text': 'héllo', 'entities': [1]}).encode('utf-8'))
+    with_text.name = 'exports/first.json'
+    without_text = io.BytesIO(b'{"entities": []}')
+    without_text.name = 'second.json'
+    documents = list(iter_uploaded_annotations([with_text, without_text]))
+    assert documents == [{'id': 'first', 'text': 'héllo', 'entities': [1]}]
+
+
+def test_json_download_round_trips():
+    value = {'text': 'é', 'entities': [{'label': 'X'}]}
+    assert json.load(json_download(value)) == value
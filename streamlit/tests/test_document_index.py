@@ -0,0 +1,95 @@
+# test_document_index.py
+import random
+import threading
+
+import document_index
+from document_index import DocumentIndex, NormalizedView
+
+
+def test_find_all_matches_naive_scan():
+    text = 'aaa banana bandana'
+    index = DocumentIndex(text)
+    for pattern in ('a', 'aa', 'ana', 'band', 'x'):
+        expected = [(i, i + len(pattern)) for i in range(len(text)) if text.startswith(pattern, i)]
+        assert index.find_all(pattern) == expected
+
+
+def test_pattern_caches_are_bounded_lru(monkeypatch):
+    monkeypatch.setattr(document_index, 'MAX_CACHED_PATTERNS', 3)
+    index = DocumentIndex('alpha beta gamma delta')
+    for pattern in ('alpha', 'beta', 'gamma'):
+        index.occurrences(pattern)
+    index.find_all('alpha')  # most recently used again
+    index.occurrences('delta')
+    assert len(index._spans_cache) <= 3 and len(index._occurrences_cache) <= 3
+    assert ('alpha', False, False) in index._spans_cache
+    assert 'alpha' not in index._occurrences_cache
+
+
+def test_memory_estimate_counts_cached_results():
+    index = DocumentIndex('word ' * 2000)
+    before = index.memory_estimate()
+    index.find_all('word')
+    assert index.memory_estimate() - before >= 2000 * document_index.SPAN_BYTES
+
+
+def test_concurrent_lookups_agree():
+    text = ' '.join(f'token{i % 50}' for i in range(5000))
+    index = DocumentIndex(text)
+    patterns = [f'token{i}' for i in range(50)]
+    expected = {pattern: DocumentIndex(text).occurrences(pattern) for pattern in patterns}
+    errors = []
+
+    def worker():
+        for pattern in patterns * 4:
+            if index.occurrences(pattern) != expected[pattern]:
+                errors.append(pattern)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors
+
+
+def test_normalized_matches_map_back_to_original_text():
+    rng = random.Random(16)
+    words = ['Heart', 'rate', 'RATE', 'İstanbul', 'x']
+    for _ in range(300):
+        text = ''.join(rng.choice(words) + rng.choice([' ', '  ', '\n', '\t ']) for _ in range(rng.randint(1, 12)))
+        index = DocumentIndex(text)
+        pattern = ' '.join(rng.sample(words, 2))
+        for ignore_case in (False, True):
+            for ignore_whitespace in (False, True):
+                for start, end in index.find_all(pattern, ignore_case, ignore_whitespace):
+                    found = text[start:end]
+                    if ignore_whitespace:
+                        found, expected = ' '.join(found.split()), ' '.join(pattern.split())
+                    else:
+                        expected = pattern
+                    if ignore_case:
+                        found, expected = found.lower(), expected.lower()
+                    assert found == expected
+
+
+def test_lowercase_expansion_maps_to_its_source_character():
+    view = NormalizedView('İx', collapse_whitespace=False, fold_case=True)
+    assert view.text == 'i̇x'
+    assert view.to_original(0, 2) == (0, 1)
+    assert view.to_original(2, 3) == (1, 2)
+
+
+def test_case_only_view_needs_no_offset_map():
+    view = NormalizedView('Hello World', collapse_whitespace=False, fold_case=True)
+    assert view.text == 'hello world' and view.offsets is None
+    assert view.to_original(6, 11) == (6, 11)
+
+
+def test_occurrences_prefer_the_strictest_match():
+    index = DocumentIndex('Heart rate, heart\nRate, HEART RATE')
+    assert index.occurrences('HEART RATE') == [(24, 34)]
+    assert index.occurrences('heart rate') == [(0, 10), (24, 34)]
+    assert index.occurrences('heart  Rate') == [(12, 22)]
+    assert index.occurrences('HEART  rate') == [(0, 10), (12, 22), (24, 34)]
+    assert index.occurrences('pulse') == []
@@ -0,0 +1,54 @@
+# test_document_pages.py
+import random
+
+from document_pages import EntityPager, compute_page_bounds
+
+
+def test_pages_cover_text_and_end_at_sentence_breaks():
+    text = ' '.join(f'Sentence number {i} is here.' for i in range(400))
+    bounds = compute_page_bounds(text, page_chars=500)
+    assert bounds[0][0] == 0 and bounds[-1][1] == len(text)
+    for (_, end), (next_start, _) in zip(bounds, bounds[1:]):
+        assert end == next_start
+        assert text[end - 2] == '.'
+
+
+def test_page_falls_back_to_last_space_without_sentence_break():
+    text = 'word ' * 300
+    bounds = compute_page_bounds(text, page_chars=100)
+    assert all(text[end - 1] == ' ' for _, end in bounds[:-1])
+
+
+def test_short_text_is_one_page():
+    assert compute_page_bounds('short', page_chars=100) == ((0, 5),)
+
+
+def test_entities_in_clips_to_page():
+    entities = [
+        {'start_char': 0, 'end_char': 5, 'label': 'A'},
+        {'start_char': 8, 'end_char': 15, 'label': 'B'},
+        {'start_char': 20, 'end_char': 22, 'label': 'C'},
+    ]
+    pager = EntityPager(entities)
+    page = pager.entities_in(10, 21)
+    assert [(ent['label'], ent['start_char'], ent['end_char']) for ent in page] == [('B', 10, 15), ('C', 20, 21)]
+    # Clipped entities are copies
+    assert entities[1]['start_char'] == 8
+
+
+def test_entities_in_matches_scan():
+    rng = random.Random(3)
+    entities = []
+    for _ in range(200):
+        start = rng.randint(0, 1000)
+        entities.append({'start_char': start, 'end_char': start + rng.randint(1, 60), 'label': 'X'})
+    pager = EntityPager(entities)
+    for _ in range(50):
+        start = rng.randint(0, 1000)
+        end = start + rng.randint(1, 200)
+        expected = sorted(
+            (max(ent['start_char'], start), min(ent['end_char'], end))
+            for ent in entities if ent['start_char'] < end and ent['end_char'] > start
+        )
+        got = sorted((ent['start_char'], ent['end_char']) for ent in pager.entities_in(start, end))
+        assert got == expected
@@ -0,0 +1,31 @@
+# test_entity_index.py
+from entity_index import EntityKeyIndex
+
+
+def test_text_label_lookup_ignores_case_and_surrounding_space():
+    index = EntityKeyIndex([{'text': 'EGFR ', 'label': 'GENE', 'start_char': 0, 'end_char': 5}])
+    assert index.has_text_label({'text': 'egfr', 'label': 'GENE'})
+    assert not index.has_text_label({'text': 'egfr', 'label': 'PROTEIN'})
+
+
+def test_span_and_exact_lookups():
+    index = EntityKeyIndex([{'text': 'EGFR', 'label': 'GENE', 'start_char': 3, 'end_char': 7}])
+    assert index.has_span(3, 7, 'GENE')
+    assert not index.has_span(3, 8, 'GENE')
+    assert index.has_exact(3, 7, 'GENE', 'egfr')
+    assert not index.has_exact(3, 7, 'GENE', 'HER1')
+
+
+def test_entities_added_later_are_indexed_and_non_dicts_skipped():
+    index = EntityKeyIndex(['not an entity', None])
+    assert not index.has_span(0, 4, 'GENE')
+    index.add({'text': 'KRAS', 'label': 'GENE', 'start_char': 0, 'end_char': 4})
+    assert index.has_span(0, 4, 'GENE') and index.has_text_label({'text': 'kras', 'label': 'GENE'})
+
+
+def test_same_span_keeps_every_text():
+    index = EntityKeyIndex([
+        {'text': 'EGFR', 'label': 'GENE', 'start_char': 0, 'end_char': 4},
+        {'text': 'ErbB', 'label': 'GENE', 'start_char': 0, 'end_char': 4},
+    ])
+    assert index.has_exact(0, 4, 'GENE', 'EGFR') and index.has_exact(0, 4, 'GENE', 'erbb')
@@ -0,0 +1,48 @@
+# test_fuzzy_locator.py
+from fuzzy_locator import default_max_distance, locate_approximate
+
+TEXT = 'The patients received acetaminophen twice daily for pain relief.'
+
+
+def test_default_max_distance():
+    assert default_max_distance(4) == 0
+    assert default_max_distance(5) == 1
+    assert default_max_distance(24) == 3
+
+
+def test_exact_match_has_distance_zero():
+    start = TEXT.index('acetaminophen')
+    assert locate_approximate(TEXT, 'acetaminophen', start + 5) == (start, start + 13, 0)
+
+
+def test_substituted_letter():
+    start = TEXT.index('acetaminophen')
+    assert locate_approximate(TEXT, 'acetaminophan', start) == (start, start + 13, 1)
+
+
+def test_edits_beyond_the_budget():
+    # Two edits, but 12 characters only allow one by default
+    start = TEXT.index('acetaminophen')
+    assert locate_approximate(TEXT, 'acetaminofen', start) is None
+    assert locate_approximate(TEXT, 'acetaminofen', start, max_distance=2) == (start, start + 13, 2)
+
+
+def test_dropped_letter():
+    start = TEXT.index('patients')
+    assert locate_approximate(TEXT, 'patents', start) == (start, start + 8, 1)
+
+
+def test_case_is_ignored_by_default():
+    start = TEXT.index('relief')
+    assert locate_approximate(TEXT, 'RELIEF', start) == (start, start + 6, 0)
+    assert locate_approximate(TEXT, 'RELIEF', start, ignore_case=False) is None
+
+
+def test_too_many_edits_is_not_a_match():
+    assert locate_approximate(TEXT, 'ibuprofen', 20) is None
+
+
+def test_search_is_limited_to_the_window():
+    start = TEXT.index('relief')
+    assert locate_approximate(TEXT, 'relief', 0, window=10) is None
+    assert locate_approximate(TEXT, 'relief', 0, window=len(TEXT))[:2] == (start, start + 6)
@@ -0,0 +1,80 @@
+# test_hedging.py
+import threading
+import time
+
+import pytest
+
+import hedging
+from hedging import HedgingPolicy, LatencyTracker, run_hedged
+
+
+@pytest.fixture(autouse=True)
+def no_script_context(monkeypatch):
+    # Hedged calls attach the Streamlit script context, which tests do not have
+    monkeypatch.setattr(hedging, '_submit_with_script_ctx', hedging._hedge_executor.submit)
+
+
+def failing_primary(tracker):
+    def call():
+        tracker.record(0.01, False)
+        return None
+    return call
+
+
+def test_percentile_waits_for_min_samples():
+    tracker = LatencyTracker()
+    for seconds in range(9):
+        tracker.record(seconds, True)
+    assert tracker.percentile(0.5, min_samples=10) is None
+    tracker.record(9, True)
+    assert tracker.percentile(0.5, min_samples=10) == 5
+
+
+def test_repeated_failures_fail_over_to_distinct_backup():
+    tracker = LatencyTracker()
+    policy = HedgingPolicy(failover_after=2, failover_cooldown=60)
+    backup_calls = []
+
+    def backup():
+        backup_calls.append(1)
+        return 'backup answer'
+
+    assert run_hedged(failing_primary(tracker), backup, policy, tracker) == (None, True)
+    assert run_hedged(failing_primary(tracker), backup, policy, tracker) == ('backup answer', False)
+    assert tracker.in_failover() and policy.failovers == 1
+    # During the cool-down the primary is skipped
+    assert run_hedged(lambda: pytest.fail('primary called'), backup, policy, tracker) == ('backup answer', False)
+    assert len(backup_calls) == 2
+
+
+def test_without_distinct_backup_failures_are_surfaced():
+    tracker = LatencyTracker()
+    policy = HedgingPolicy(failover_after=2, failover_cooldown=60)
+
+    def backup():
+        pytest.fail('same route retried as failover')
+
+    for _ in range(5):
+        assert run_hedged(failing_primary(tracker), backup, policy, tracker, can_fail_over=False) == (None, True)
+    assert not tracker.in_failover()
+    assert tracker.consecutive_failures == 5 and policy.failovers == 0
+
+
+def test_slow_primary_is_hedged_and_hedge_wins():
+    tracker = LatencyTracker()
+    for _ in range(10):
+        tracker.record(0.01, True)
+    policy = HedgingPolicy(min_samples=10, min_delay=0.05)
+    release = threading.Event()
+
+    def slow_primary():
+        release.wait(5)
+        return 'primary answer'
+
+    try:
+        started = time.monotonic()
+        assert run_hedged(slow_primary, lambda: 'hedge answer', policy, tracker) == ('hedge answer', False)
+        assert time.monotonic() - started < 1
+        assert policy.hedges_sent == 1 and policy.hedges_won == 1
+    finally:
+        release.set()
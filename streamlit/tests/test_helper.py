@@ -0,0 +1,155 @@
+# test_helper.py
+"""
+Tests for the pipeline functions in helper.py. helper imports the full app stack
+(Streamlit, pandas, the stop-word filter), so these are skipped where it cannot be imported.
+"""
+import random
+from html.parser import HTMLParser
+
+import pytest
+
+from span_renderer import render_highlighted_spans
+
+helper = pytest.importorskip("helper")
+
+
+def test_parse_status_complete_array():
+    entities, complete = helper.parse_llm_response('[{"start_char": 0, "end_char": 4, "text": "EGFR", "label": "GENE"}]', with_status=True)
+    assert complete
+    assert [(e['text'], e['label']) for e in entities] == [('EGFR', 'GENE')]
+
+
+def test_parse_status_truncated_or_unparseable_is_incomplete():
+    _, truncated = helper.parse_llm_response('[{"start_char": 0, "end_char": 4, "text": "EGFR", "label": "GENE"}, {"te', with_status=True)
+    _, unparseable = helper.parse_llm_response('Sorry, I cannot help with that.', with_status=True)
+    _, empty = helper.parse_llm_response('', with_status=True)
+    assert not truncated and not unparseable and not empty
+
+
+def test_parse_without_status_returns_entities():
+    assert helper.parse_llm_response('[]') == []
+
+
+class _SpanTree(HTMLParser):
+    """Records, for every highlight span, the classes of its direct child spans."""
+
+    def __init__(self):
+        super().__init__()
+        self.stack = []
+        self.highlights = []
+
+    def handle_starttag(self, tag, attrs):
+        if tag != 'span':
+            return
+        attrs = dict(attrs)
+        node = {'tooltip': attrs.get('data-tooltip'), 'class': attrs.get('class'), 'children': []}
+        if self.stack:
+            self.stack[-1]['children'].append(node)
+        if node['tooltip'] is not None:
+            self.highlights.append(node)
+        self.stack.append(node)
+
+    def handle_endtag(self, tag):
+        if tag == 'span':
+            self.stack.pop()
+
+
+def test_overlapping_highlights_each_own_a_direct_child_tooltip():
+    text = 'EGFR kinase domain mutations'
+    entities = [
+        {'start_char': 0, 'end_char': 18, 'text': 'EGFR kinase domain', 'label': 'DOMAIN'},
+        {'start_char': 0, 'end_char': 4, 'text': 'EGFR', 'label': 'GENE', 'is_nested': True, 'parent_text': 'EGFR kinase domain'},
+        {'start_char': 5, 'end_char': 28, 'text': 'kinase domain mutations', 'label': 'VARIANT'},
+    ]
+    colors = {'DOMAIN': '#aaa', 'GENE': '#bbb', 'VARIANT': '#ccc'}
+    page = render_highlighted_spans(
+        text, entities, lambda ent: helper.selection_open_tag(ent, colors), close_tag=helper.SELECTION_CLOSE_TAG
+    )
+
+    tree = _SpanTree()
+    tree.feed(page)
+    # The crossing VARIANT span is split where it leaves DOMAIN
+    assert {h['tooltip'].split(' (')[0] for h in tree.highlights} == {'DOMAIN', 'GENE', 'VARIANT'}
+    for highlight in tree.highlights:
+        tooltips = [child for child in highlight['children'] if child['class'] == 'tooltip']
+        assert len(tooltips) == 1, highlight['tooltip']
+
+    # The page script and hover rule only ever reach a highlight's own tooltip
+    html_page = helper.build_selection_page_html(page)
+    assert "span.querySelector(':scope > .tooltip')" in html_page
+    assert 'span[data-tooltip]:hover > .tooltip' in html_page
+    assert "querySelector('.tooltip')" not in html_page
+
+
+def test_chunks_are_whole_sentences_that_cover_the_text():
+    rng = random.Random(6)
+    words = ['alpha', 'Beta.', 'gamma!', '\n\n', 'Delta?', 'x' * 30, 'E=mc2.', '(Fig.', '1)', 'Zeta']
+    for _ in range(500):
+        text = ' '.join(rng.choice(words) for _ in range(rng.randint(1, 200)))
+        chunk_size = rng.randint(20, 300)
+        chunks = helper.chunk_text(text, chunk_size)
+        assert chunks[0][1] == 0 and chunks[-1][2] == len(text)
+        for chunk, start, end in chunks:
+            assert chunk == text[start:end].rstrip() or chunk == text[start:]
+            assert end - start <= chunk_size
+        for (_, start, end), (_, next_start, _) in zip(chunks, chunks[1:]):
+            # Consecutive chunks overlap or touch, and always move forward
+            assert start < next_start <= end
+
+
+def test_chunks_break_after_sentence_ends():
+    text = 'First sentence here. Second one follows. Third ends it.'
+    chunks = helper.chunk_text(text, 25, overlap_size=0)
+    assert [chunk for chunk, _, _ in chunks] == ['First sentence here.', 'Second one follows.', 'Third ends it.']
+
+
+def test_sentence_index_splits_long_sentences_at_spaces():
+    text = 'word ' * 20
+    boundaries = helper.build_sentence_index(text, max_span=12)
+    assert boundaries[0] == 0 and boundaries[-1] == len(text)
+    assert all(b - a <= 12 for a, b in zip(boundaries, boundaries[1:]))
+    assert all(text[b - 1] == ' ' for b in boundaries[1:-1])
+
+
+def _dedupe_pairwise(all_entities, tolerance=5):
+    """The previous all-pairs deduplication that remove_overlapping_duplicates must reproduce."""
+    deduplicated = []
+    seen = set()
+    for entity in sorted(all_entities, key=lambda x: (x.get('start_char', 0), x.get('end_char', 0))):
+        start, end = entity.get('start_char', 0), entity.get('end_char', 0)
+        text, label = entity.get('text', '').strip().lower(), entity.get('label', '')
+        if any(text == seen_text and label == seen_label and abs(start - seen_start) <= tolerance
+               and abs(end - seen_end) <= tolerance for seen_start, seen_end, seen_text, seen_label in seen):
+            continue
+        deduplicated.append(entity)
+        seen.add((start, end, text, label))
+    return deduplicated
+
+
+CHUNKS = [
+    {'chunk_index': 0, 'start_offset': 0, 'end_offset': 40},
+    {'chunk_index': 1, 'start_offset': 30, 'end_offset': 80},
+]
+
+
+def test_dedupe_matches_pairwise_comparison():
+    rng = random.Random(12)
+    for _ in range(2000):
+        entities = []
+        for _ in range(rng.randint(0, 25)):
+            start = rng.randint(0, 60)
+            entities.append({'start_char': start, 'end_char': start + rng.randint(1, 12),
+                             'text': rng.choice(['a', 'A ', 'b']), 'label': rng.choice('XY')})
+        assert helper.remove_overlapping_duplicates(entities, CHUNKS) == _dedupe_pairwise(entities)
+
+
+def test_dedupe_stats_attribute_removals_to_chunk_boundaries():
+    entities = [
+        {'start_char': 32, 'end_char': 36, 'text': 'EGFR', 'label': 'GENE'},
+        {'start_char': 33, 'end_char': 37, 'text': 'egfr', 'label': 'GENE'},
+        {'start_char': 60, 'end_char': 64, 'text': 'KRAS', 'label': 'GENE'},
+        {'start_char': 61, 'end_char': 65, 'text': 'KRAS', 'label': 'GENE'},
+    ]
+    kept, stats = helper.remove_overlapping_duplicates(entities, CHUNKS, return_stats=True)
+    assert [e['start_char'] for e in kept] == [32, 60]
+    assert stats == {'removed': 2, 'per_boundary': {1: 1}, 'other': 1}
@@ -0,0 +1,50 @@
+# test_incremental_json.py
+from incremental_json import IncrementalJSONArrayParser, extract_json_values
+
+RESPONSE = 'Here you go:\n```json\n[{"text": "a [b]", "label": "X"}, {"text": "c\\"}", "label": "Y"}]\n```'
+
+
+def test_parser_emits_objects_as_they_complete():
+    parser = IncrementalJSONArrayParser()
+    emitted = []
+    for i in range(0, len(RESPONSE), 7):
+        emitted.extend(parser.feed(RESPONSE[i:i + 7]))
+    assert emitted == [{'text': 'a [b]', 'label': 'X'}, {'text': 'c"}', 'label': 'Y'}]
+    assert parser.finished
+    assert parser.objects_parsed == 2
+
+
+def test_parser_ignores_text_after_the_array():
+    parser = IncrementalJSONArrayParser()
+    assert parser.feed('[{"a": 1}] then {"b": 2}') == [{'a': 1}]
+    assert parser.feed('{"c": 3}') == []
+
+
+def test_parser_accepts_bare_objects():
+    parser = IncrementalJSONArrayParser()
+    assert parser.feed('{"a": 1}\n{"b": 2}') == [{'a': 1}, {'b': 2}]
+
+
+def test_parser_counts_malformed_objects():
+    parser = IncrementalJSONArrayParser()
+    assert parser.feed('[{"a": 1,}, {"b": 2}]') == [{'b': 2}]
+    assert parser.objects_failed == 1
+
+
+def test_extract_complete_array():
+    result = extract_json_values(RESPONSE)
+    assert result['values'] == [[{'text': 'a [b]', 'label': 'X'}, {'text': 'c"}', 'label': 'Y'}]]
+    assert result['salvaged'] == []
+    assert not result['truncated']
+
+
+def test_extract_salvages_truncated_array():
+    result = extract_json_values('[{"text": "a", "label": "X"}, {"text": "b", "lab')
+    assert result['values'] == []
+    assert result['salvaged'] == [{'text': 'a', 'label': 'X'}]
+    assert result['truncated']
+
+
+def test_extract_without_json():
+    result = extract_json_values('no entities found')
+    assert result['values'] == [] and result['salvaged'] == []
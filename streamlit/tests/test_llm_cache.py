@@ -0,0 +1,63 @@
+# test_llm_cache.py
+from llm_cache import LLMResponseCache, make_cache_key
+
+
+def test_cache_key_depends_on_every_call_setting():
+    base = make_cache_key('OpenAI', 'gpt-4', 'prompt', 0.1, 1000)
+    assert base == make_cache_key('OpenAI', 'gpt-4', 'prompt', 0.10000001, 1000)
+    variants = [
+        make_cache_key('Claude', 'gpt-4', 'prompt', 0.1, 1000),
+        make_cache_key('OpenAI', 'gpt-4o', 'prompt', 0.1, 1000),
+        make_cache_key('OpenAI', 'gpt-4', 'prompt!', 0.1, 1000),
+        make_cache_key('OpenAI', 'gpt-4', 'prompt', 0.0, 1000),
+        make_cache_key('OpenAI', 'gpt-4', 'prompt', 0.1, 999),
+    ]
+    assert base not in variants and len(set(variants)) == len(variants)
+
+
+def test_hit_miss_and_persistence(tmp_path):
+    cache = LLMResponseCache(cache_dir=str(tmp_path))
+    assert cache.get('k') is None
+    cache.set('k', '[{"text": "EGFR"}]')
+    assert cache.get('k') == '[{"text": "EGFR"}]'
+    assert cache.stats()['hits'] == 1 and cache.stats()['misses'] == 1
+    # A new cache over the same directory sees the stored response
+    assert LLMResponseCache(cache_dir=str(tmp_path)).get('k') == '[{"text": "EGFR"}]'
+
+
+def test_only_low_temperature_calls_are_cacheable(tmp_path):
+    cache = LLMResponseCache(cache_dir=str(tmp_path), max_temperature=0.1)
+    assert cache.is_cacheable(0.0) and cache.is_cacheable(0.1)
+    assert not cache.is_cacheable(0.7) and not cache.is_cacheable(None)
+
+
+def test_expired_entries_are_misses(tmp_path, monkeypatch):
+    cache = LLMResponseCache(cache_dir=str(tmp_path), ttl_seconds=10)
+    now = [1000.0]
+    monkeypatch.setattr('llm_cache.time.time', lambda: now[0])
+    cache.set('k', 'v')
+    now[0] += 11
+    assert cache.get('k') is None
+    assert cache.stats()['entries'] == 0
+
+
+def test_least_recently_used_is_evicted_over_size_limit(tmp_path, monkeypatch):
+    cache = LLMResponseCache(cache_dir=str(tmp_path), max_size_mb=25 / (1024 * 1024))
+    now = [1000.0]
+    monkeypatch.setattr('llm_cache.time.time', lambda: now[0])
+    for key in ('a', 'b'):
+        cache.set(key, 'x' * 10)
+        now[0] += 1
+    cache.get('a')
+    now[0] += 1
+    cache.set('c', 'x' * 10)
+    assert cache.get('b') is None
+    assert cache.get('a') == 'x' * 10 and cache.get('c') == 'x' * 10
+    assert cache.stats()['evictions'] == 1
+
+
+def test_oversized_and_empty_responses_are_not_stored(tmp_path):
+    cache = LLMResponseCache(cache_dir=str(tmp_path), max_size_mb=5 / (1024 * 1024))
+    cache.set('big', 'x' * 6)
+    cache.set('none', None)
+    assert cache.stats()['entries'] == 0
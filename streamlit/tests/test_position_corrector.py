@@ -0,0 +1,82 @@
+# test_position_corrector.py
+import os
+import random
+import time
+
+import pytest
+
+import document_index
+import position_corrector
+from position_corrector import correct_positions
+
+
+def _document(rng, words, length):
+    vocabulary = [''.join(rng.choice('abcdefghij') for _ in range(rng.randint(3, 9))) for _ in range(words)]
+    return ' '.join(rng.choice(vocabulary) for _ in range(length // 5))[:length]
+
+
+def _entities(rng, text, count):
+    entities = []
+    for _ in range(count):
+        start = rng.randint(0, len(text) - 40)
+        entity_text = text[start:start + rng.randint(5, 30)].strip()
+        if rng.random() < 0.3:
+            entity_text = entity_text.upper()
+        entities.append({'text': entity_text, 'start_char': start + rng.randint(-50, 50), 'end_char': start, 'label': 'X'})
+    return entities
+
+
+def test_already_correct_corrected_and_failed():
+    text = 'alpha beta gamma beta'
+    entities = [
+        {'text': 'beta', 'start_char': 6, 'end_char': 10},
+        {'text': 'gamma', 'start_char': 0, 'end_char': 5},
+        {'text': 'omega', 'start_char': 0, 'end_char': 5},
+        {'text': 'beta', 'start_char': 'x', 'end_char': None},
+    ]
+    corrected, stats = correct_positions(text, entities)
+    assert (stats['already_correct'], stats['corrected'], stats['failed']) == (1, 1, 2)
+    assert (corrected[1]['start_char'], corrected[1]['end_char']) == (11, 16)
+    assert stats['failed_indices'] == [2, 3]
+    # The input entities are not modified
+    assert entities[1]['start_char'] == 0
+
+
+def test_string_offsets_are_accepted():
+    _, stats = correct_positions('alpha beta', [{'text': 'beta', 'start_char': '6', 'end_char': '10'}])
+    assert stats['already_correct'] == 1
+
+
+def test_unknown_method_is_rejected():
+    with pytest.raises(ValueError):
+        correct_positions('text', [], method='nearest')
+
+
+def test_pool_matches_serial(monkeypatch):
+    rng = random.Random(17)
+    text = _document(rng, 500, 50_000)
+    entities = _entities(rng, text, 120)
+    serial = correct_positions(text, entities, workers=1)
+    monkeypatch.setattr(position_corrector, 'PROCESS_POOL_MIN_CHARS', 0)
+    document_index._recent_indexes.clear()
+    assert correct_positions(text, entities, workers=2) == serial
+
+
+@pytest.mark.skipif((os.cpu_count() or 1) < 2, reason="needs at least two CPUs")
+def test_pool_beats_serial_on_large_documents():
+    rng = random.Random(1)
+    text = _document(rng, 30_000, position_corrector.PROCESS_POOL_MIN_CHARS + 800_000)
+    entities = _entities(rng, text, 800)
+
+    document_index._recent_indexes.clear()
+    start = time.perf_counter()
+    serial = correct_positions(text, entities, workers=1)
+    serial_seconds = time.perf_counter() - start
+
+    document_index._recent_indexes.clear()
+    start = time.perf_counter()
+    pooled = correct_positions(text, entities, workers=min(4, os.cpu_count()))
+    pooled_seconds = time.perf_counter() - start
+
+    assert pooled == serial
+    assert pooled_seconds < serial_seconds
@@ -0,0 +1,93 @@
+# test_rate_limiter.py
+import pytest
+
+import rate_limiter
+from rate_limiter import (
+    RateLimitGovernor,
+    TokenBucket,
+    call_with_rate_limit,
+    compute_backoff,
+    get_governor,
+    get_retry_after,
+)
+
+
+class _Response:
+    def __init__(self, headers):
+        self.headers = headers
+
+
+class _APIError(Exception):
+    def __init__(self, headers=None):
+        super().__init__('rate limited')
+        self.response = _Response(headers or {})
+
+
+def test_token_bucket_waits_once_capacity_is_used():
+    bucket = TokenBucket(60)
+    assert bucket.reserve(60) == 0.0
+    # Refills at one token per second
+    assert bucket.reserve(1) == pytest.approx(1.0, abs=0.05)
+
+
+def test_token_bucket_lets_oversized_calls_through_at_capacity():
+    bucket = TokenBucket(10)
+    assert bucket.reserve(1000) == 0.0
+
+
+def test_get_retry_after_headers():
+    assert get_retry_after(_APIError({'retry-after-ms': '1500'})) == 1.5
+    assert get_retry_after(_APIError({'retry-after': '3'})) == 3.0
+    assert get_retry_after(_APIError({})) is None
+    assert get_retry_after(ValueError()) is None
+
+
+def test_compute_backoff_bounds():
+    for attempt in range(6):
+        assert 0 <= compute_backoff(attempt, base_delay=1.0, max_delay=8.0) <= 8.0
+    assert 2.0 <= compute_backoff(0, retry_after=2.0) <= 2.2
+
+
+def test_get_governor_is_shared_per_key_and_limits():
+    first = get_governor('OpenAI', 'model-a', 'key', 100, 1000)
+    assert get_governor('OpenAI', 'model-a', 'key', 100, 1000) is first
+    assert get_governor('OpenAI', 'model-a', 'other-key', 100, 1000) is not first
+    assert get_governor('OpenAI', 'model-a', 'key', 200, 1000) is not first
+
+
+def test_call_with_rate_limit_retries_then_succeeds(monkeypatch):
+    monkeypatch.setattr(rate_limiter.time, 'sleep', lambda seconds: None)
+    governor = RateLimitGovernor()
+    calls = []
+
+    def request():
+        calls.append(1)
+        if len(calls) < 3:
+            raise _APIError()
+        return 'ok'
+
+    assert call_with_rate_limit(governor, request, 10, lambda e: isinstance(e, _APIError)) == 'ok'
+    assert governor.retries == 2
+
+
+def test_call_with_rate_limit_does_not_retry_other_errors():
+    governor = RateLimitGovernor()
+
+    def request():
+        raise KeyError('bad')
+
+    with pytest.raises(KeyError):
+        call_with_rate_limit(governor, request, 10, lambda e: isinstance(e, _APIError))
+    assert governor.retries == 0
+
+
+def test_call_with_rate_limit_reraises_after_max_retries(monkeypatch):
+    monkeypatch.setattr(rate_limiter.time, 'sleep', lambda seconds: None)
+    governor = RateLimitGovernor()
+
+    def request():
+        raise _APIError()
+
+    with pytest.raises(_APIError):
+        call_with_rate_limit(governor, request, 10, lambda e: True, max_retries=2)
+    assert governor.retries == 2
@@ -0,0 +1,74 @@
+# test_render_cache.py
+import random
+
+from render_cache import HighlightRenderCache, entity_set_fingerprint
+from span_renderer import render_highlighted_spans
+
+CLOSE_TAG = '</mark>'
+
+
+def render_open(ent):
+    return f'<mark title="{ent["label"]}">'
+
+
+def random_entities(rng, text):
+    entities = []
+    for _ in range(rng.randint(0, 12)):
+        start = rng.randrange(len(text))
+        end = rng.randint(start + 1, min(len(text), start + 15))
+        entities.append({'start_char': start, 'end_char': end, 'label': rng.choice('ABC')})
+    return entities
+
+
+def test_incremental_render_matches_full_render():
+    rng = random.Random(22)
+    cache = HighlightRenderCache()
+    text = ''.join(rng.choice('abc <&>\n') for _ in range(200))
+    entities = random_entities(rng, text)
+    for _ in range(300):
+        # Edit a few entities at a time, as annotating does
+        for _ in range(rng.randint(1, 3)):
+            if entities and rng.random() < 0.5:
+                entities.pop(rng.randrange(len(entities)))
+            else:
+                entities.extend(random_entities(rng, text)[:1])
+        expected = render_highlighted_spans(text, entities, render_open, close_tag=CLOSE_TAG)
+        assert cache.render(text, entities, render_open, CLOSE_TAG, ('colors',)) == expected
+
+
+def test_unchanged_clusters_are_reused():
+    text = 'alpha beta gamma delta'
+    entities = [
+        {'start_char': 0, 'end_char': 5, 'label': 'A'},
+        {'start_char': 11, 'end_char': 16, 'label': 'B'},
+    ]
+    cache = HighlightRenderCache()
+    cache.render(text, entities, render_open, CLOSE_TAG, ())
+    assert (cache.clusters_rendered, cache.clusters_reused) == (2, 0)
+    entities.append({'start_char': 17, 'end_char': 22, 'label': 'C'})
+    cache.render(text, entities, render_open, CLOSE_TAG, ())
+    assert (cache.clusters_rendered, cache.clusters_reused) == (3, 2)
+
+
+def test_new_context_or_text_renders_everything_again():
+    entities = [{'start_char': 0, 'end_char': 5, 'label': 'A'}]
+    cache = HighlightRenderCache()
+    cache.render('alpha beta', entities, render_open, CLOSE_TAG, ('red',))
+    cache.render('alpha beta', entities, render_open, CLOSE_TAG, ('blue',))
+    cache.render('alpha gamma', entities, render_open, CLOSE_TAG, ('blue',))
+    assert (cache.clusters_rendered, cache.clusters_reused) == (3, 0)
+
+
+def test_fingerprint_covers_nested_entities():
+    outer = {'start_char': 0, 'end_char': 5, 'text': 'alpha', 'label': 'A', 'nested_entities': []}
+    with_nested = dict(outer, nested_entities=[{'start_char': 0, 'end_char': 2, 'text': 'al', 'label': 'B'}])
+    assert entity_set_fingerprint([outer]) != entity_set_fingerprint([with_nested])
+    assert entity_set_fingerprint([outer]) == entity_set_fingerprint([dict(outer)])
+
+
+def test_page_cache_keeps_most_recent_pages():
+    cache = HighlightRenderCache(max_pages=2)
+    for key in ('a', 'b', 'c'):
+        cache.set_page(key, key.upper())
+    assert cache.get_page('a') is None
+    assert cache.get_page('b') == 'B' and cache.get_page('c') == 'C'
@@ -0,0 +1,40 @@
+# test_span_renderer.py
+from span_renderer import render_highlighted_spans
+
+
+def _open(ent):
+    return f'<{ent["label"]}>'
+
+
+def _ent(start, end, label):
+    return {'start_char': start, 'end_char': end, 'label': label}
+
+
+def test_flat_spans_are_wrapped_and_text_escaped():
+    html = render_highlighted_spans('a<b c', [_ent(0, 3, 'x')], _open, close_tag='</>')
+    assert html == '<x>a&lt;b</> c'
+
+
+def test_nested_span_renders_inside_parent():
+    html = render_highlighted_spans('abcdef', [_ent(2, 4, 'in'), _ent(0, 6, 'out')], _open, close_tag='</>')
+    assert html == '<out>ab<in>cd</>ef</>'
+
+
+def test_crossing_span_is_split_at_parent_end():
+    html = render_highlighted_spans('abcdef', [_ent(0, 4, 'a'), _ent(2, 6, 'b')], _open, close_tag='</>')
+    assert html == '<a>ab<b>cd</></><b>ef</>'
+
+
+def test_duplicate_span_is_rendered_once():
+    html = render_highlighted_spans('abc', [_ent(0, 3, 'x'), _ent(0, 3, 'x')], _open, close_tag='</>')
+    assert html == '<x>abc</>'
+
+
+def test_non_nested_mode_skips_overlaps():
+    html = render_highlighted_spans('abcdef', [_ent(0, 4, 'a'), _ent(2, 6, 'b')], _open, close_tag='</>', nested=False)
+    assert html == '<a>abcd</>ef'
+
+
+def test_bounds_render_only_that_part():
+    html = render_highlighted_spans('abcdef', [_ent(2, 3, 'x')], _open, close_tag='</>', bounds=(1, 4))
+    assert html == 'b<x>c</>d'